@@ -20,8 +20,10 @@ try:
     
     # 1. Timeline of Worker Performance
     st.subheader("Worker Batch Times (ms)")
+    # One row per loader window: mean, batch count and sketch quantiles
     df_workers = pd.read_sql(
-        "SELECT timestamp, worker_id, batch_time_ms FROM worker_metrics ORDER BY timestamp DESC LIMIT 500", 
+        "SELECT timestamp, worker_id, batch_time_ms, batch_count, batch_p95_ms, batch_p99_ms "
+        "FROM worker_metrics ORDER BY timestamp DESC LIMIT 500", 
         conn
     )
     if not df_workers.empty:
@@ -29,30 +31,47 @@ try:
         start_time = df_workers["timestamp"].min()
         df_workers["Time (s)"] = df_workers["timestamp"] - start_time
         
+        metric = st.radio("Statistic", ["batch_time_ms", "batch_p95_ms", "batch_p99_ms"], horizontal=True)
         chart = alt.Chart(df_workers).mark_line().encode(
             x='Time (s)',
-            y='batch_time_ms',
+            y=metric,
             color='worker_id:N'
         ).interactive()
         st.altair_chart(chart, use_container_width=True)
     else:
         st.warning("No worker metrics found yet.")
 
-    # 2. Current Assignment Distribution
+    # 2. Whole-job history from the per-minute rollup (kept after raw rows are compacted)
+    st.subheader("Job History (per-minute mean, last 24h)")
+    df_minutes = pd.read_sql(
+        "SELECT minute, worker_id, batch_time_ms_sum / batches AS mean_batch_time_ms, "
+        "batch_p99_ms_max FROM worker_metrics_minute "
+        "WHERE minute >= (SELECT MAX(minute) FROM worker_metrics_minute) - 1440",
+        conn
+    )
+    if not df_minutes.empty:
+        df_minutes["Time (min)"] = df_minutes["minute"] - df_minutes["minute"].min()
+        history_chart = alt.Chart(df_minutes).mark_line().encode(
+            x='Time (min)',
+            y='mean_batch_time_ms',
+            color='worker_id:N'
+        ).interactive()
+        st.altair_chart(history_chart, use_container_width=True)
+
+    # 3. Current Assignment Distribution
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Current Shard Distribution")
         df_assign = pd.read_sql(
-            "SELECT epoch, worker_id, COUNT(shard_id) as shard_count "
-            "FROM assignments GROUP BY epoch, worker_id ORDER BY epoch DESC", 
+            "SELECT epoch, worker_id, shards AS shard_count FROM assignment_epochs "
+            "WHERE epoch = (SELECT MAX(epoch) FROM assignment_epochs)", 
             conn
         )
         
         if not df_assign.empty:
             latest_epoch = df_assign["epoch"].max()
-            current_dist = df_assign[df_assign["epoch"] == latest_epoch]
-            st.bar_chart(current_dist.set_index("worker_id")["shard_count"])
+            st.bar_chart(df_assign.set_index("worker_id")["shard_count"])
             st.caption(f"Epoch {latest_epoch}")
         else:
             st.info("No assignments logged yet.")
@@ -60,8 +79,16 @@ try:
     with col2:
         st.subheader("Straggler Analysis")
         if not df_workers.empty:
-             recent = df_workers.head(100)
-             avg_times = recent.groupby("worker_id")["batch_time_ms"].mean().reset_index()
+             recent = df_workers.head(100).copy()
+             recent["batch_count"] = recent["batch_count"].fillna(1)
+             recent["total_ms"] = recent["batch_time_ms"] * recent["batch_count"]
+             per_worker = recent.groupby("worker_id").agg(
+                 total_ms=("total_ms", "sum"), batches=("batch_count", "sum"),
+                 p95_ms=("batch_p95_ms", "max"), p99_ms=("batch_p99_ms", "max")
+             )
+             # Batch-weighted mean; the worst window's tail quantiles
+             per_worker["mean_ms"] = per_worker["total_ms"] / per_worker["batches"]
+             avg_times = per_worker[["mean_ms", "p95_ms", "p99_ms"]].reset_index()
              st.dataframe(avg_times.style.highlight_max(axis=0, color='red'), hide_index=True)
     
     conn.close()
@@ -99,5 +99,8 @@ def run_parallel_demo():
             counts = {w: len(s) for w, s in runtime.assignments.items()}
             print(f"Shard Counts: {counts}")
 
+    # Flush buffered telemetry to shardsense.db
+    runtime.close()
+
 if __name__ == "__main__":
     run_parallel_demo()
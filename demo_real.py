@@ -84,5 +84,8 @@ def run_real_demo():
         counts = {w: len(s) for w, s in runtime.assignments.items()}
         print(f"Shard Distribution: {counts}")
 
+    # Flush buffered telemetry to shardsense.db
+    runtime.close()
+
 if __name__ == "__main__":
     run_real_demo()
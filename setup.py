@@ -16,6 +16,9 @@ setup(
         "altair>=5.0.0"
     ],
     extras_require={
+        "archive": [
+            "pyarrow>=10.0.0"
+        ],
         "dev": [
             "pytest>=7.0.0",
             "ruff>=0.1.0",
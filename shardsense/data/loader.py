@@ -1,44 +1,105 @@
+import math
 import time
-from typing import Any, Iterator
+from typing import Any, Dict, Iterator, Optional
 
 from torch.utils.data import DataLoader
 
-from shardsense.telemetry.collector import MetricsCollector, WorkerMetrics
+from shardsense.telemetry.collector import WorkerMetrics
+from shardsense.telemetry.sampler import SystemSampler
+from shardsense.telemetry.sketch import DDSketch
+from shardsense.telemetry.transport import TelemetrySink
 
 
 class MeasurableDataLoader:
     """
     Wraps a standard PyTorch DataLoader.
     Iterating over this records timing metrics.
+    ``collector`` is a ``MetricsCollector`` in the planner's process, or a
+    ``ShmRing`` / ``SocketSender`` when the loader runs in another process.
+
+    Batch times are aggregated locally into windows. A window closes after
+    ``window_batches`` batches or ``window_s`` seconds, whichever comes
+    first, and at the end of the iteration. Each closed window is pushed to
+    the collector as one ``WorkerMetrics`` record: the mean batch time, the
+    batch count, and p50/p95/p99 from a ``DDSketch``. ``window_batches=1``
+    pushes one record per batch.
+
+    With a ``SystemSampler``, each record also carries the sampler's
+    smoothed CPU share and read throughput, and the bytes read per batch
+    during the window. The sampler measures the whole process (and its
+    DataLoader subprocesses), not just this loader. Without one, those
+    fields stay 0.
     """
-    def __init__(self, loader: DataLoader, worker_id: int, collector: MetricsCollector):
+    def __init__(
+        self,
+        loader: DataLoader,
+        worker_id: int,
+        collector: TelemetrySink,
+        window_batches: int = 1,
+        window_s: Optional[float] = None,
+        relative_accuracy: float = 0.01,
+        sampler: Optional[SystemSampler] = None
+    ):
         self.loader = loader
         self.worker_id = worker_id
         self.collector = collector
+        self.window_batches = window_batches
+        self.window_s = window_s
+        self._sketch = DDSketch(relative_accuracy)
+        self._window_start = time.perf_counter()
+        self.sampler = sampler
+        self._window_bytes = 0.0
         self._iterator = None
 
     def __iter__(self) -> Iterator[Any]:
         self._iterator = iter(self.loader)
+        self._sketch.clear()
+        self._window_start = time.perf_counter()
+        if self.sampler is not None:
+            self._window_bytes = self.sampler.snapshot()["read_bytes"]
         return self
 
+    def _system(self) -> Dict[str, float]:
+        if self.sampler is None:
+            return {"cpu_util": 0.0, "io_read_mb_s": 0.0, "read_bytes": 0.0}
+        # Fresh reading so the window's byte count ends at its last batch
+        return self.sampler.snapshot(refresh=True)
+
+    def _emit(self):
+        sketch = self._sketch
+        system = self._system()
+        self.collector.push_worker_metrics(WorkerMetrics(
+            timestamp=time.time(),
+            worker_id=self.worker_id,
+            cpu_util=system["cpu_util"],
+            io_read_mb_s=system["io_read_mb_s"],
+            net_rtt_ms=0.0,
+            cache_hit_rate=math.nan,  # not measured here
+            batch_time_ms=sketch.mean,
+            batch_count=sketch.count,
+            batch_p50_ms=sketch.quantile(0.5),
+            batch_p95_ms=sketch.quantile(0.95),
+            batch_p99_ms=sketch.quantile(0.99),
+            bytes_per_batch=(system["read_bytes"] - self._window_bytes) / sketch.count
+        ))
+        self._window_bytes = system["read_bytes"]
+        sketch.clear()
+        self._window_start = time.perf_counter()
+
     def __next__(self) -> Any:
         start_t = time.perf_counter()
         try:
             batch = next(self._iterator)
-            end_t = time.perf_counter()
-            duration_ms = (end_t - start_t) * 1000.0
-            
-            # Log immediate batch time (simplified; in prod we might average over N batches or send raw stream)
-            self.collector.push_worker_metrics(WorkerMetrics(
-                timestamp=time.time(),
-                worker_id=self.worker_id,
-                cpu_util=0.0, # Placeholder or need psutil
-                io_read_mb_s=0.0,
-                net_rtt_ms=0.0,
-                cache_hit_rate=0.0,
-                batch_time_ms=duration_ms
-            ))
-            
-            return batch
         except StopIteration:
+            # Flush the partial last window
+            if self._sketch.count:
+                self._emit()
             raise
+        end_t = time.perf_counter()
+        self._sketch.add((end_t - start_t) * 1000.0)
+
+        if self._sketch.count >= self.window_batches or (
+            self.window_s is not None and end_t - self._window_start >= self.window_s
+        ):
+            self._emit()
+        return batch
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    LRU memo of model outputs, bounded by an approximate byte budget.
+
+    Values are floats (single pairs) or float32 rows (one worker against a
+    list of shards). Keys are built by ``RuntimePredictor`` and always start
+    with the model version, so a retrained model never sees stale entries.
+    """
+    # Rough per-entry overhead of the key tuple and dict slot
+    ENTRY_OVERHEAD_BYTES = 200
+
+    def __init__(self, max_bytes: int = 64 << 20):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def _size(cls, value: Any) -> int:
+        if isinstance(value, np.ndarray):
+            return value.nbytes + cls.ENTRY_OVERHEAD_BYTES
+        return cls.ENTRY_OVERHEAD_BYTES
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= self._size(old)
+        self.entries[key] = value
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= self._size(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        """Drops all entries; counters are kept."""
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+        }
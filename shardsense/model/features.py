@@ -1,31 +1,73 @@
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Union
 
-import pandas as pd
+import numpy as np
+
+from shardsense.telemetry.store import ColumnTable
+
+# Training input: the collector's column table or plain row dicts
+TrainingData = Union[ColumnTable, List[Dict[str, Any]]]
 
 
 class FeatureBuilder:
     def __init__(self):
         self.feature_columns = [
             "worker_id",
-            "worker_io", "worker_cpu", 
+            "worker_io", "worker_cpu",
             "shard_size", "shard_difficulty",
             "interaction_io_size"
         ]
+        # Inputs read from the training data (interaction features are derived)
+        self.raw_columns = self.feature_columns[:-1]
+
+    def columns(self, raw_data: TrainingData, names: List[str]) -> Dict[str, np.ndarray]:
+        if isinstance(raw_data, ColumnTable):
+            return {name: raw_data[name] for name in names}
+        return {
+            name: np.fromiter((d[name] for d in raw_data), dtype=np.float64, count=len(raw_data))
+            for name in names
+        }
+
+    def build_features(self, raw_data: TrainingData, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        float32 ``rows x feature_columns`` matrix, C-contiguous so XGBoost
+        takes it without another copy. ``out`` (right shape, float32) is
+        filled instead of a new array, e.g. one slice per archived part.
+        """
+        cols = self.columns(raw_data, self.raw_columns)
+        X = np.empty((len(raw_data), len(self.feature_columns)), dtype=np.float32) if out is None else out
+        for j, name in enumerate(self.raw_columns):
+            X[:, j] = cols[name]
 
-    def build_features(self, raw_data: List[Dict]) -> pd.DataFrame:
-        if not raw_data:
-            return pd.DataFrame(columns=self.feature_columns)
-            
-        df = pd.DataFrame(raw_data)
-        
         # Interaction features
         # Heuristic: Larger shards hurt IO-bound workers more
-        df["interaction_io_size"] = df["shard_size"] / (df["worker_io"] + 1e-6)
-        
-        # Ensure column order
-        return df[self.feature_columns]
-
-    def build_labels(self, raw_data: List[Dict]) -> pd.Series:
-        if not raw_data:
-            return pd.Series()
-        return pd.Series([d["target_batch_time"] for d in raw_data])
+        X[:, -1] = cols["shard_size"] / (cols["worker_io"] + 1e-6)
+        return X
+
+    def build_feature_matrix(
+        self,
+        worker_states: List[Dict[str, Any]],
+        shard_states: List[Dict[str, Any]]
+    ) -> np.ndarray:
+        """
+        Features for every (worker, shard) pair as one dense block.
+        Rows are worker-major: row ``w * len(shard_states) + s``.
+        Columns follow ``feature_columns``.
+        """
+        n_w, n_s = len(worker_states), len(shard_states)
+        worker_id = np.array([w["worker_id"] for w in worker_states], dtype=np.float64)
+        worker_io = np.array([w["io_read_mb_s"] for w in worker_states], dtype=np.float64)
+        worker_cpu = np.array([w["cpu_util"] for w in worker_states], dtype=np.float64)
+        shard_size = np.array([s["size_mb"] for s in shard_states], dtype=np.float64)
+        shard_diff = np.array([s["mean_decode_ms"] for s in shard_states], dtype=np.float64)
+
+        X = np.empty((n_w, n_s, len(self.feature_columns)), dtype=np.float32)
+        X[:, :, 0] = worker_id[:, None]
+        X[:, :, 1] = worker_io[:, None]
+        X[:, :, 2] = worker_cpu[:, None]
+        X[:, :, 3] = shard_size[None, :]
+        X[:, :, 4] = shard_diff[None, :]
+        X[:, :, 5] = shard_size[None, :] / (worker_io[:, None] + 1e-6)
+        return X.reshape(n_w * n_s, len(self.feature_columns))
+
+    def build_labels(self, raw_data: TrainingData) -> np.ndarray:
+        return self.columns(raw_data, ["target_batch_time"])["target_batch_time"]
@@ -0,0 +1,127 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from shardsense.model.features import FeatureBuilder, TrainingData
+from shardsense.model.tail import ResidualQuantiles
+
+
+class OnlinePredictor:
+    """
+    Pure-NumPy batch-time model trained by recursive least squares.
+
+    The prediction is linear in five pair features. Each feature is a
+    worker factor times a shard factor:
+
+        t = th0 + th1 * size/io + th2 * difficulty + th3 * cpu*difficulty + th4 * size
+
+    So a whole ``workers x shards`` cost matrix is one matrix product
+    ``(A * theta) @ B.T``. The weights start at the heuristic ``RuntimePredictor``
+    uses when untrained, ``size/io * 1000 + 100 * difficulty``. Each new row
+    updates them in O(k^2) for k = 5 features. ``forgetting`` < 1 discounts
+    old rows so the model tracks drifting workers.
+
+    Every row is also scored against the prediction made just before it was
+    learned. Those out-of-sample ratios give the ``quantile`` (tail) estimates.
+    """
+    N_FEATURES = 5
+    # Tags checkpoints; read by the runtime without building a state_dict
+    kind = "online"
+
+    def __init__(self, forgetting: float = 0.999, prior_strength: float = 1e-3):
+        self.forgetting = forgetting
+        self.theta = np.array([0.0, 1000.0, 100.0, 0.0, 0.0])
+        # Small prior_strength -> large initial covariance -> data overrides the prior quickly
+        self.P = np.eye(self.N_FEATURES) / prior_strength
+        self.is_trained = False
+        self.n_updates = 0
+        self._rows_seen = 0
+        self.features = FeatureBuilder()
+        self.tails = ResidualQuantiles()
+
+    @staticmethod
+    def _worker_factors(io: np.ndarray, cpu: np.ndarray) -> np.ndarray:
+        # Unreported io (0) gets the same 100 MB/s default the runtime uses
+        io = np.where(io > 0, io, 100.0)
+        ones = np.ones_like(io)
+        return np.stack([ones, 1.0 / io, ones, cpu, ones], axis=-1)
+
+    @staticmethod
+    def _shard_factors(size: np.ndarray, diff: np.ndarray) -> np.ndarray:
+        ones = np.ones_like(size)
+        return np.stack([ones, size, diff, diff, size], axis=-1)
+
+    def _step(self, x: np.ndarray, target: float):
+        Px = self.P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        self.theta = self.theta + gain * (target - x @ self.theta)
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+        self.n_updates += 1
+        self.is_trained = True
+
+    def update(self, row: Dict[str, Any]):
+        """One RLS step on a single training row."""
+        self.train_rows([row])
+
+    def train_rows(self, rows: TrainingData):
+        """RLS steps over ``rows`` in order; pair features are built column-wise up front."""
+        cols = self.features.columns(
+            rows, ["worker_id", "worker_io", "worker_cpu", "shard_size", "shard_difficulty", "target_batch_time"]
+        )
+        x = self._worker_factors(cols["worker_io"], cols["worker_cpu"]) * self._shard_factors(
+            cols["shard_size"], cols["shard_difficulty"]
+        )
+        before = np.empty(len(x))
+        for i, (x_i, target) in enumerate(zip(x, cols["target_batch_time"].tolist())):
+            before[i] = max(float(x_i @ self.theta), 1.0)
+            self._step(x_i, target)
+        self.tails.record(cols["worker_id"].astype(np.int64), cols["target_batch_time"], before)
+
+    def train(self, training_data: TrainingData):
+        """
+        ``training_data`` is the collector's full, append-only training table
+        (or row list); only rows past those seen by earlier calls are applied.
+        """
+        if len(training_data) > self._rows_seen:
+            self.train_rows(training_data[self._rows_seen:])
+        self._rows_seen = max(self._rows_seen, len(training_data))
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "theta": self.theta,
+            "P": self.P,
+            "n_updates": self.n_updates,
+            "tails": self.tails.state_dict(),
+        }
+
+    def load_state_dict(self, state: Dict[str, Any], rows_seen: int = 0):
+        """``rows_seen`` as in ``RuntimePredictor.load_state_dict``."""
+        self.theta = np.asarray(state["theta"], dtype=np.float64)
+        self.P = np.asarray(state["P"], dtype=np.float64)
+        self.n_updates = state["n_updates"]
+        self.is_trained = self.n_updates > 0
+        self._rows_seen = rows_seen
+        self.tails.load_state_dict(state["tails"])
+
+    def predict_batch_time(
+        self, worker_state: Dict[str, Any], shard_state: Dict[str, Any], quantile: Optional[float] = None
+    ) -> float:
+        return float(self.predict_matrix([worker_state], [shard_state], quantile)[0, 0])
+
+    def predict_matrix(
+        self,
+        worker_states: List[Dict[str, Any]],
+        shard_states: List[Dict[str, Any]],
+        quantile: Optional[float] = None
+    ) -> np.ndarray:
+        io = np.array([w["io_read_mb_s"] for w in worker_states], dtype=np.float64)
+        cpu = np.array([w["cpu_util"] for w in worker_states], dtype=np.float64)
+        size = np.array([s["size_mb"] for s in shard_states], dtype=np.float64)
+        diff = np.array([s["mean_decode_ms"] for s in shard_states], dtype=np.float64)
+        A = self._worker_factors(io, cpu).reshape(len(worker_states), self.N_FEATURES)
+        B = self._shard_factors(size, diff).reshape(len(shard_states), self.N_FEATURES)
+        if quantile is not None:
+            A = A * self.tails.factors([w["worker_id"] for w in worker_states], quantile)[:, None]
+        costs: np.ndarray = np.maximum((A * self.theta) @ B.T, 1.0).astype(np.float32)
+        return costs
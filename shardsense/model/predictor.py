@@ -1,6 +1,11 @@
-from typing import Any, Dict, List
+import hashlib
+from typing import Any, Dict, List, Optional, Protocol, Tuple
 
-from shardsense.model.features import FeatureBuilder
+import numpy as np
+
+from shardsense.model.cache import PredictionCache
+from shardsense.model.features import FeatureBuilder, TrainingData
+from shardsense.model.tail import ResidualQuantiles
 
 try:
     import xgboost as xgb  # type: ignore
@@ -9,12 +14,68 @@ except ImportError:
     HAS_XGB = False
     print("Warning: XGBoost not found. Falling back to heuristic model.")
 
+class Predictor(Protocol):
+    """What the planners and the runtime need from a batch-time model."""
+    is_trained: bool
+
+    def train(self, training_data: TrainingData): ...
+
+    def predict_batch_time(
+        self, worker_state: Dict[str, Any], shard_state: Dict[str, Any], quantile: Optional[float] = None
+    ) -> float: ...
+
+    def predict_matrix(
+        self,
+        worker_states: List[Dict[str, Any]],
+        shard_states: List[Dict[str, Any]],
+        quantile: Optional[float] = None
+    ) -> np.ndarray: ...
+
+
 class RuntimePredictor:
-    def __init__(self):
+    """
+    Predicts per-batch time (ms) of a shard on a worker.
+
+    By default every ``train`` call refits the model from scratch on the rows
+    it is given (only the newest ``window`` rows if a window is set). With
+    ``incremental=True`` a trained model instead grows ``incremental_rounds``
+    more trees, fitted only on rows it has not seen yet. Every
+    ``full_refit_every`` incremental updates it falls back to a full refit
+    over the window. In that refit a row's weight is ``sample_decay`` raised
+    to the number of train calls since the row first appeared.
+
+    Trained-model outputs are memoized in a ``PredictionCache`` of at most
+    ``cache_max_bytes`` (0 disables it). Keys combine the model version, the
+    worker's features and the shard, so every ``train`` invalidates the cache.
+    Worker features are exact by default. With ``worker_bucket`` set, io and
+    cpu are rounded to multiples of it, so similar workers share entries at
+    the cost of exactness.
+
+    Passing ``quantile`` to the predict methods scales each worker's mean by
+    the upper quantile of its recent observed/predicted ratios (see
+    ``ResidualQuantiles``), giving a tail estimate for noisy workers. Each
+    ratio compares a row with the model from before that row was trained
+    on, so the first fit has no tail yet and quantile predictions equal
+    the mean until the next ``train``.
+    """
+    # Tags checkpoints; read by the runtime without building a state_dict
+    kind = "xgboost"
+
+    def __init__(
+        self,
+        incremental: bool = False,
+        incremental_rounds: int = 10,
+        window: Optional[int] = None,
+        sample_decay: Optional[float] = None,
+        full_refit_every: int = 20,
+        cache_max_bytes: int = 64 << 20,
+        worker_bucket: Optional[float] = None
+    ):
         self.model = None
+        self.n_estimators = 100
         if HAS_XGB:
             self.model = xgb.XGBRegressor(
-                n_estimators=100, 
+                n_estimators=self.n_estimators, 
                 max_depth=3, 
                 learning_rate=0.1, 
                 n_jobs=1
@@ -22,24 +83,150 @@ class RuntimePredictor:
         self.features = FeatureBuilder()
         self.is_trained = False
 
-    def train(self, training_data: List[Dict[str, Any]]):
+        self.incremental = incremental
+        self.incremental_rounds = incremental_rounds
+        self.window = window
+        self.sample_decay = sample_decay
+        self.full_refit_every = full_refit_every
+        # Train call in which each training row (by position) was first seen
+        self._row_generation = np.zeros(0, dtype=np.int64)
+        self._generation = 0
+        self._updates_since_refit = 0
+        self.last_fit: Dict[str, Any] = {}
+
+        # Bumped by every fit; part of every cache key
+        self.model_version = 0
+        self.cache = PredictionCache(cache_max_bytes) if cache_max_bytes > 0 else None
+        self.worker_bucket = worker_bucket
+        self.tails = ResidualQuantiles()
+
+    def train(self, training_data: TrainingData):
+        """
+        ``training_data`` is the collector's full, append-only training table
+        (or row list); rows past those seen by earlier calls count as new.
+        """
         if len(training_data) < 50:
             # print("Not enough data to train (need 50+ samples).")
             return
             
+        n_seen = len(self._row_generation)
+        self._generation += 1
+        if len(training_data) > n_seen:
+            fresh = np.full(len(training_data) - n_seen, self._generation, dtype=np.int64)
+            self._row_generation = np.concatenate([self._row_generation, fresh])
+
+        new_rows = training_data[n_seen:]
+        # Misses of the model that has not seen these rows yet (the heuristic before
+        # the first fit); in-sample residuals would understate each worker's tail
+        if self.is_trained or not HAS_XGB:
+            self._record_residuals(new_rows)
         if not HAS_XGB:
             return
 
-        X = self.features.build_features(training_data)
-        y = self.features.build_labels(training_data)
-        
-        self.model.fit(X, y)
+        refit_due = self._updates_since_refit >= self.full_refit_every
+        if self.incremental and self.is_trained and not refit_due:
+            if not new_rows:
+                return
+            # A few more boosting rounds on top of the previous booster
+            X = self.features.build_features(new_rows)
+            y = self.features.build_labels(new_rows)
+            self.model.set_params(n_estimators=self.incremental_rounds)
+            self.model.fit(X, y, xgb_model=self.model.get_booster())
+            self._updates_since_refit += 1
+            self.last_fit = {"mode": "incremental", "rows": len(new_rows)}
+            self._new_model_version()
+            return
+
+        start = 0 if self.window is None else max(0, len(training_data) - self.window)
+        rows = training_data[start:]
+        X = self.features.build_features(rows)
+        y = self.features.build_labels(rows)
+        weights = None
+        if self.sample_decay is not None:
+            age = self._generation - self._row_generation[start:len(training_data)]
+            weights = np.power(self.sample_decay, age)
+        self.model.set_params(n_estimators=self.n_estimators)
+        self.model.fit(X, y, sample_weight=weights)
         self.is_trained = True
+        self._updates_since_refit = 0
+        self.last_fit = {"mode": "full", "rows": len(rows)}
+        self._new_model_version()
+
+    def state_dict(self) -> Dict[str, Any]:
+        """Trained booster (raw UBJSON bytes) plus the bookkeeping needed to keep training."""
+        booster = None
+        if self.is_trained and self.model is not None:
+            booster = bytes(self.model.get_booster().save_raw("ubj"))
+        return {
+            "kind": self.kind,
+            "booster": booster,
+            "model_version": self.model_version,
+            "updates_since_refit": self._updates_since_refit,
+            "tails": self.tails.state_dict(),
+        }
 
-    def predict_batch_time(self, worker_state: Dict[str, Any], shard_state: Dict[str, Any]) -> float:
+    def load_state_dict(self, state: Dict[str, Any], rows_seen: int = 0):
+        """
+        ``rows_seen``: length of the (restored) training table this model has
+        already learned from; later rows count as new.
+        """
+        if state["booster"] is not None and self.model is not None:
+            self.model.load_model(bytearray(state["booster"]))
+            self.is_trained = True
+        self.model_version = state["model_version"]
+        if self.cache is not None:
+            self.cache.clear()
+        self._updates_since_refit = state["updates_since_refit"]
+        self._row_generation = np.zeros(rows_seen, dtype=np.int64)
+        self._generation = 0
+        self.tails.load_state_dict(state["tails"])
+
+    def _record_residuals(self, rows: TrainingData):
+        if not len(rows):
+            return
+        X = self.features.build_features(rows)
+        y = self.features.build_labels(rows)
+        if self.is_trained and self.model is not None:
+            pred = np.maximum(self.model.predict(X), 1.0)
+        else:
+            # Same heuristic as the untrained predict path, on feature columns
+            pred = X[:, 5] * 1000 + 100 * X[:, 4]
+        self.tails.record(X[:, 0].astype(np.int64), y, pred)
+
+    def _new_model_version(self):
+        self.model_version += 1
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _worker_key(self, worker_state: Dict[str, Any]) -> Tuple[Any, ...]:
+        io, cpu = worker_state["io_read_mb_s"], worker_state["cpu_util"]
+        if self.worker_bucket:
+            io, cpu = round(io / self.worker_bucket), round(cpu / self.worker_bucket)
+        return (worker_state["worker_id"], io, cpu)
+
+    @staticmethod
+    def _shard_key(shard_state: Dict[str, Any]) -> Tuple[Any, ...]:
+        return (shard_state["shard_id"], shard_state["size_mb"], shard_state["mean_decode_ms"])
+
+    @staticmethod
+    def _shard_list_key(shard_states: List[Dict[str, Any]]) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        for field in ("shard_id", "size_mb", "mean_decode_ms"):
+            digest.update(np.array([s[field] for s in shard_states], dtype=np.float64).tobytes())
+        return digest.digest()
+
+    def predict_batch_time(
+        self, worker_state: Dict[str, Any], shard_state: Dict[str, Any], quantile: Optional[float] = None
+    ) -> float:
         """
         Returns predicted ms for a single pairing.
         """
+        pred = self._mean_batch_time(worker_state, shard_state)
+        if quantile is not None:
+            pred *= float(self.tails.factors([worker_state["worker_id"]], quantile)[0])
+        return pred
+
+    def _mean_batch_time(self, worker_state: Dict[str, Any], shard_state: Dict[str, Any]) -> float:
         if not self.is_trained:
             # Fallback heuristic if untrained
             # Time = Size / IO + 100 * Diff
@@ -47,6 +234,13 @@ class RuntimePredictor:
                 100 * shard_state["mean_decode_ms"]
             )
 
+        key = None
+        if self.cache is not None:
+            key = (self.model_version, self._worker_key(worker_state), self._shard_key(shard_state))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
         # Construct single row
         row = {
             "worker_id": worker_state["worker_id"],
@@ -60,5 +254,63 @@ class RuntimePredictor:
         }
         
         X = self.features.build_features([row])
-        pred = self.model.predict(X)[0]
-        return max(1.0, float(pred))
+        pred = max(1.0, float(self.model.predict(X)[0]))
+        if key is not None:
+            self.cache.put(key, pred)
+        return pred
+
+    def predict_matrix(
+        self,
+        worker_states: List[Dict[str, Any]],
+        shard_states: List[Dict[str, Any]],
+        quantile: Optional[float] = None
+    ) -> np.ndarray:
+        """
+        Returns predicted ms for every pairing as a dense ``workers x shards``
+        float32 matrix, using a single model call.
+        Entries match ``predict_batch_time`` for the same pair.
+        With the cache on, only workers whose row against this exact shard
+        list is not cached go to the model.
+        """
+        costs = self._mean_matrix(worker_states, shard_states)
+        if quantile is not None and len(costs):
+            factors = self.tails.factors([w["worker_id"] for w in worker_states], quantile)
+            costs = (costs * factors[:, None]).astype(np.float32)
+        return costs
+
+    def _mean_matrix(self, worker_states: List[Dict[str, Any]], shard_states: List[Dict[str, Any]]) -> np.ndarray:
+        n_w, n_s = len(worker_states), len(shard_states)
+        if n_w == 0 or n_s == 0:
+            return np.zeros((n_w, n_s), dtype=np.float32)
+
+        if not self.is_trained:
+            io = np.array([w["io_read_mb_s"] for w in worker_states], dtype=np.float64)
+            size = np.array([s["size_mb"] for s in shard_states], dtype=np.float64)
+            diff = np.array([s["mean_decode_ms"] for s in shard_states], dtype=np.float64)
+            costs = (size[None, :] / io[:, None]) * 1000 + (100 * diff[None, :])
+            return costs.astype(np.float32)
+
+        if self.cache is None:
+            return self._predict_rows(worker_states, shard_states)
+
+        shards_key = self._shard_list_key(shard_states)
+        keys = [(self.model_version, self._worker_key(w), shards_key) for w in worker_states]
+        out = np.empty((n_w, n_s), dtype=np.float32)
+        missing = []
+        for r, key in enumerate(keys):
+            row = self.cache.get(key)
+            if row is None:
+                missing.append(r)
+            else:
+                out[r] = row
+        if missing:
+            fresh = self._predict_rows([worker_states[r] for r in missing], shard_states)
+            out[missing] = fresh
+            for r, row in zip(missing, fresh):
+                self.cache.put(keys[r], row.copy())
+        return out
+
+    def _predict_rows(self, worker_states: List[Dict[str, Any]], shard_states: List[Dict[str, Any]]) -> np.ndarray:
+        X = self.features.build_feature_matrix(worker_states, shard_states)
+        pred = self.model.predict(X)
+        return np.maximum(pred, 1.0).astype(np.float32).reshape(len(worker_states), len(shard_states))
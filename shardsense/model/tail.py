@@ -0,0 +1,54 @@
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+class ResidualQuantiles:
+    """
+    Per-worker distribution of ``observed / predicted`` batch time.
+
+    The ``q``-quantile of a worker's recent ratios turns a mean prediction
+    into an upper-quantile one. A worker that is usually on time but
+    sometimes 1.5x slow gets a factor near 1.5 at q=0.95. Workers with too
+    few samples fall back to the quantile pooled over all workers. Factors
+    never go below 1, so a tail estimate is never below the mean.
+    """
+    def __init__(self, window: int = 512, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self.ratios: Dict[int, np.ndarray] = {}
+        self.pooled = np.zeros(0)
+
+    def clear(self):
+        self.ratios = {}
+        self.pooled = np.zeros(0)
+
+    def record(self, worker_ids: np.ndarray, observed: np.ndarray, predicted: np.ndarray):
+        ratio = np.asarray(observed, dtype=np.float64) / np.maximum(np.asarray(predicted, dtype=np.float64), 1e-6)
+        worker_ids = np.asarray(worker_ids)
+        for wid in np.unique(worker_ids).tolist():
+            joined = np.concatenate([self.ratios.get(int(wid), np.zeros(0)), ratio[worker_ids == wid]])
+            self.ratios[int(wid)] = joined[-self.window:]
+        self.pooled = np.concatenate([self.pooled, ratio])[-4 * self.window:]
+
+    def factors(self, worker_ids: List[int], q: float) -> np.ndarray:
+        pooled = float(np.quantile(self.pooled, q)) if len(self.pooled) else 1.0
+        out = np.empty(len(worker_ids))
+        for r, wid in enumerate(worker_ids):
+            ratios = self.ratios.get(wid)
+            if ratios is not None and len(ratios) >= self.min_samples:
+                out[r] = np.quantile(ratios, q)
+            else:
+                out[r] = pooled
+        return np.maximum(out, 1.0)
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {
+            "workers": list(self.ratios),
+            "ratios": list(self.ratios.values()),
+            "pooled": self.pooled,
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]):
+        self.ratios = {int(w): np.asarray(r, dtype=np.float64) for w, r in zip(state["workers"], state["ratios"])}
+        self.pooled = np.asarray(state["pooled"], dtype=np.float64)
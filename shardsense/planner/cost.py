@@ -1,4 +1,7 @@
-from typing import Dict, List
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
 
 
 def calculate_imbalance_cost(worker_times: Dict[int, float]) -> float:
@@ -35,3 +38,147 @@ def calculate_movement_cost(
                 moved_mb += shard_sizes.get(sid, 0.0)
                 
     return moved_mb
+
+
+class ShardLocationIndex:
+    """
+    Array-backed shard -> worker index with running movement accounting.
+
+    Rows follow the input map (worker order, then list order). ``owner`` is
+    where each shard started, ``location`` where it is now, and ``moved_mb``
+    equals ``calculate_movement_cost(input_map, to_map(), sizes)`` at all
+    times. Trial moves are priced in O(1); sending a shard back to its owner
+    cancels its cost.
+
+    ``move_cost`` is the locality-aware price of the same moves (see
+    ``fetch_cost``). Without ``worker_states`` it equals ``moved_mb``.
+    """
+    def __init__(
+        self,
+        current_map: Dict[int, List[int]],
+        shard_states: Dict[int, Dict[str, Any]],
+        worker_states: Optional[Dict[int, Dict[str, Any]]] = None,
+        rtt_scale_ms: float = 10.0
+    ):
+        self.workers: List[int] = list(current_map)
+        self.worker_index = {wid: i for i, wid in enumerate(self.workers)}
+        self.shard_ids: List[int] = [sid for wid in self.workers for sid in current_map[wid]]
+        self.row = {sid: i for i, sid in enumerate(self.shard_ids)}
+        # Column of each shard in a predict_matrix(..., shard_states.values()) cost matrix
+        column = {sid: j for j, sid in enumerate(shard_states)}
+        self.cols = np.array([column[sid] for sid in self.shard_ids], dtype=np.int64)
+        self.sizes = np.array([float(shard_states[sid]["size_mb"]) for sid in self.shard_ids])
+        self.owner = np.array(
+            [self.worker_index[wid] for wid in self.workers for _ in current_map[wid]], dtype=np.int64
+        )
+        self.location = self.owner.copy()
+        self.moved_mb = 0.0
+        self.move_cost = 0.0
+        self._init_locality(worker_states or {}, rtt_scale_ms)
+
+    def _init_locality(self, worker_states: Dict[int, Dict[str, Any]], rtt_scale_ms: float):
+        """
+        Cold fetches scale with the receiver's network RTT; shards the
+        receiver still holds (``resident_shards``: sid -> warmth in [0, 1])
+        are discounted by their warmth times its ``cache_hit_rate``. A hit
+        rate that isn't reported (missing, None or NaN) trusts residency
+        alone; a measured 0.0 means no discount.
+        """
+        self.fetch_factor = np.ones(len(self.workers))
+        self._warm: Dict[Tuple[int, int], float] = {}
+        for w, wid in enumerate(self.workers):
+            state = worker_states.get(wid, {})
+            self.fetch_factor[w] = 1.0 + max(0.0, float(state.get("net_rtt_ms", 0.0))) / rtt_scale_ms
+            reported = state.get("cache_hit_rate")
+            hit_rate = 1.0 if reported is None or math.isnan(reported) else float(reported)
+            for sid, warmth in state.get("resident_shards", {}).items():
+                i = self.row.get(sid)
+                if i is not None and warmth > 0:
+                    self._warm[(w, i)] = min(1.0, warmth * hit_rate)
+        self.warm_by_row: Dict[int, List[Tuple[int, float]]] = {}
+        for (w, i), warmth in self._warm.items():
+            self.warm_by_row.setdefault(i, []).append((w, warmth))
+        # Sorted (worker * n_rows + row) keys for vectorized warmth lookups
+        keys = np.array([w * len(self) + i for w, i in self._warm], dtype=np.int64)
+        order = np.argsort(keys)
+        self._warm_keys = keys[order]
+        self._warm_vals = np.array(list(self._warm.values()), dtype=np.float64)[order]
+
+    def __len__(self) -> int:
+        return len(self.shard_ids)
+
+    def fetch_cost(self, i: int, w: int) -> float:
+        """Locality-aware cost of shard row ``i`` arriving at worker index ``w``."""
+        warmth = self._warm.get((w, i), 0.0)
+        return float(self.sizes[i]) * float(self.fetch_factor[w]) * (1.0 - warmth)
+
+    def fetch_costs(self, rows: np.ndarray, dst: Any) -> np.ndarray:
+        """Vectorized ``fetch_cost``; ``dst`` broadcasts against ``rows``."""
+        cost = self.sizes[rows] * self.fetch_factor[dst]
+        if len(self._warm_keys):
+            keys = np.asarray(dst, dtype=np.int64) * len(self) + rows
+            pos = np.minimum(np.searchsorted(self._warm_keys, keys), len(self._warm_keys) - 1)
+            warmth = np.where(self._warm_keys[pos] == keys, self._warm_vals[pos], 0.0)
+            cost = cost * (1.0 - warmth)
+        return cost
+
+    def move_delta(self, i: int, dst: int) -> float:
+        """Change in moved MB if shard row ``i`` went to worker index ``dst``."""
+        owner = self.owner[i]
+        return float(self.sizes[i]) * (float(owner != dst) - float(owner != self.location[i]))
+
+    def move_deltas(self, rows: np.ndarray, dst: Any) -> np.ndarray:
+        """
+        Vectorized ``move_delta``. ``dst`` broadcasts against ``rows``, e.g. a
+        column of receivers gives a receivers x rows matrix.
+        """
+        leaves_owner = (self.owner[rows] != dst).astype(np.float64)
+        return self.sizes[rows] * (leaves_owner - (self.owner[rows] != self.location[rows]))
+
+    def move_cost_delta(self, i: int, dst: int) -> float:
+        """Change in ``move_cost`` if shard row ``i`` went to worker index ``dst``."""
+        owner, loc = self.owner[i], self.location[i]
+        arrive = self.fetch_cost(i, dst) if owner != dst else 0.0
+        current = self.fetch_cost(i, loc) if owner != loc else 0.0
+        return arrive - current
+
+    def move_cost_deltas(self, rows: np.ndarray, dst: Any) -> np.ndarray:
+        """Vectorized ``move_cost_delta``; ``dst`` broadcasts against ``rows``."""
+        loc = self.location[rows]
+        arrive = self.fetch_costs(rows, dst) * (self.owner[rows] != dst)
+        current = self.fetch_costs(rows, loc) * (self.owner[rows] != loc)
+        return arrive - current
+
+    def move(self, i: int, dst: int) -> float:
+        """Moves shard row ``i`` to worker index ``dst``; returns the moved-MB delta."""
+        delta = self.move_delta(i, dst)
+        self.move_cost += self.move_cost_delta(i, dst)
+        self.location[i] = dst
+        self.moved_mb += delta
+        return delta
+
+    def restore(self, location: np.ndarray):
+        """Resets to a previously saved ``location`` snapshot."""
+        self.location = location.copy()
+        away = np.flatnonzero(self.location != self.owner)
+        self.moved_mb = float(self.sizes[away].sum())
+        self.move_cost = float(self.fetch_costs(away, self.location[away]).sum())
+
+    def shards_on(self, w: int) -> np.ndarray:
+        return np.flatnonzero(self.location == w)
+
+    def to_map(self) -> Dict[int, List[int]]:
+        """
+        Assignment map for the current locations.
+        Shards that stayed keep their order; incoming shards are appended.
+        """
+        new_map: Dict[int, List[int]] = {wid: [] for wid in self.workers}
+        owner_l = self.owner.tolist()
+        location_l = self.location.tolist()
+        for i, sid in enumerate(self.shard_ids):
+            if location_l[i] == owner_l[i]:
+                new_map[self.workers[owner_l[i]]].append(sid)
+        for i, sid in enumerate(self.shard_ids):
+            if location_l[i] != owner_l[i]:
+                new_map[self.workers[location_l[i]]].append(sid)
+        return new_map
@@ -0,0 +1,157 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from shardsense.model.predictor import Predictor
+from shardsense.planner.cost import ShardLocationIndex
+from shardsense.planner.solver import LPTResharder
+
+
+def _mean_reported(values: List[Optional[float]]) -> float:
+    """Mean of the reported (not None/NaN) values; NaN when none is."""
+    reported = [v for v in values if v is not None and not math.isnan(v)]
+    return float(np.mean(reported)) if reported else math.nan
+
+
+class HierarchicalResharder:
+    """
+    Two-level planner for node/device topologies.
+
+    Level 1 balances shards across nodes. Each node is planned as one worker
+    whose state is the average of its devices and whose predicted time is
+    divided by its device count. Cross-node moves pay
+    ``inter_node_penalty_per_mb`` and count against ``max_move_mb``.
+
+    Level 2 balances each node's shards over its own devices, one node per
+    thread. Device-to-device moves pay the much smaller
+    ``intra_node_penalty_per_mb``. Shards that arrive from another node are
+    first list-scheduled onto the least-loaded devices.
+
+    Prediction work is nodes x shards + devices x shards-per-node, instead
+    of every worker against every shard.
+
+    ``quantile`` makes level 2 plan against per-device upper-quantile
+    predictions; level 1 keeps node means, as a node's tail is the
+    max over its devices.
+    """
+    def __init__(
+        self,
+        predictor: Predictor,
+        devices_per_node: int = 8,
+        topology: Optional[Dict[int, List[int]]] = None,
+        inter_node_penalty_per_mb: float = 0.05,
+        intra_node_penalty_per_mb: float = 0.005,
+        max_move_mb: float = float("inf"),
+        max_threads: Optional[int] = None,
+        quantile: Optional[float] = None
+    ):
+        self.predictor = predictor
+        self.devices_per_node = devices_per_node
+        self.topology = topology
+        self.inter_penalty = inter_node_penalty_per_mb
+        self.intra_penalty = intra_node_penalty_per_mb
+        self.max_move_mb = max_move_mb
+        self.max_threads = max_threads
+        self.quantile = quantile
+
+    @property
+    def penalty(self) -> float:
+        """Per-MB penalty of the cheapest move, as the runtime's rebalance gate expects."""
+        return min(self.inter_penalty, self.intra_penalty)
+
+    def nodes(self, workers: List[int]) -> Dict[int, List[int]]:
+        """Node id -> device (worker) ids, restricted to ``workers``."""
+        present = set(workers)
+        if self.topology is not None:
+            return {
+                node: [w for w in devices if w in present]
+                for node, devices in self.topology.items()
+                if any(w in present for w in devices)
+            }
+        nodes: Dict[int, List[int]] = {}
+        for w in workers:
+            nodes.setdefault(w // self.devices_per_node, []).append(w)
+        return nodes
+
+    def plan(
+        self,
+        current_map: Dict[int, List[int]],
+        worker_states: Dict[int, Dict[str, Any]],
+        shard_states: Dict[int, Dict[str, Any]]
+    ) -> Dict[int, List[int]]:
+        nodes = self.nodes(list(current_map))
+
+        # Level 1: nodes as aggregated workers
+        node_map = {node: [sid for w in devices for sid in current_map[w]] for node, devices in nodes.items()}
+        node_states = {node: self._node_state(devices, worker_states) for node, devices in nodes.items()}
+        node_index = ShardLocationIndex(node_map, shard_states, node_states)
+        if len(node_index):
+            node_cost = self.predictor.predict_matrix(list(node_states.values()), list(shard_states.values()))
+            device_counts = np.array([len(devices) for devices in nodes.values()], dtype=np.float32)
+            node_cost = node_cost / device_counts[:, None]
+            LPTResharder(self.predictor, self.inter_penalty, self.max_move_mb).place(node_cost, node_index)
+        new_node_map = node_index.to_map()
+
+        # Level 2: devices within each node, nodes in parallel
+        jobs = []
+        for node, devices in nodes.items():
+            on_node = set(new_node_map[node])
+            kept = {w: [sid for sid in current_map[w] if sid in on_node] for w in devices}
+            staying = {sid for sids in kept.values() for sid in sids}
+            incoming = [sid for sid in new_node_map[node] if sid not in staying]
+            node_shards = {sid: shard_states[sid] for w in devices for sid in kept[w]}
+            node_shards.update({sid: shard_states[sid] for sid in incoming})
+            cost = self.predictor.predict_matrix(
+                [worker_states[w] for w in devices], list(node_shards.values()), quantile=self.quantile
+            )
+            jobs.append((devices, kept, incoming, node_shards, cost))
+
+        new_map: Dict[int, List[int]] = {}
+        with ThreadPoolExecutor(max_workers=self.max_threads) as pool:
+            for result in pool.map(lambda job: self._plan_node(*job, worker_states), jobs):
+                new_map.update(result)
+        # Workers outside the topology keep their shards untouched
+        return {w: new_map.get(w, list(current_map[w])) for w in current_map}
+
+    def _node_state(self, devices: List[int], worker_states: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+        states = [worker_states[w] for w in devices]
+        resident: Dict[int, float] = {}
+        for state in states:
+            for sid, warmth in state.get("resident_shards", {}).items():
+                resident[sid] = max(resident.get(sid, 0.0), warmth)
+        return {
+            "worker_id": devices[0],
+            "io_read_mb_s": float(np.mean([s["io_read_mb_s"] for s in states])),
+            "cpu_util": float(np.mean([s["cpu_util"] for s in states])),
+            "net_rtt_ms": float(np.mean([s.get("net_rtt_ms", 0.0) for s in states])),
+            "cache_hit_rate": _mean_reported([s.get("cache_hit_rate") for s in states]),
+            "resident_shards": resident,
+        }
+
+    def _plan_node(
+        self,
+        devices: List[int],
+        kept: Dict[int, List[int]],
+        incoming: List[int],
+        node_shards: Dict[int, Dict[str, Any]],
+        cost: np.ndarray,
+        worker_states: Dict[int, Dict[str, Any]]
+    ) -> Dict[int, List[int]]:
+        column = {sid: j for j, sid in enumerate(node_shards)}
+
+        # Arriving shards have no device yet: longest first onto the earliest finisher
+        loads = np.array(
+            [sum(float(cost[d, column[sid]]) for sid in kept[w]) for d, w in enumerate(devices)]
+        )
+        start = {w: list(sids) for w, sids in kept.items()}
+        for sid in sorted(incoming, key=lambda sid: -float(cost[:, column[sid]].min())):
+            d = int(np.argmin(loads + cost[:, column[sid]]))
+            loads[d] += cost[d, column[sid]]
+            start[devices[d]].append(sid)
+
+        index = ShardLocationIndex(start, node_shards, {w: worker_states[w] for w in devices})
+        if len(devices) > 1 and len(index):
+            LPTResharder(self.predictor, self.intra_penalty).place(cost, index)
+        return index.to_map()
@@ -0,0 +1,251 @@
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shardsense.model.predictor import Predictor
+from shardsense.planner.cost import ShardLocationIndex
+from shardsense.planner.solver import LPTResharder
+
+# (objective, kind, shards leaving the straggler, shards coming back, partner worker)
+_Candidate = Tuple[float, str, List[int], List[int], int]
+
+
+class LocalSearchResharder:
+    """
+    Anytime local search over shard placements.
+
+    Each step looks at the straggler and evaluates
+      * moving one of its shards to any less-loaded worker,
+      * 1-for-1 swaps with a few partner workers,
+      * 2-for-1 swaps (two of its shards for one of the partner's),
+    then applies the best candidate. By default the search starts from the
+    ``LPTResharder`` placement and polishes it. With ``anneal=True`` a random candidate
+    may be accepted even if it is worse (simulated annealing), which lets the
+    search leave local optima. The best plan seen is returned once
+    ``time_budget_s`` (or ``max_iters``) is spent.
+    ``quantile`` plans against upper-quantile predictions, as in ``GreedyResharder``.
+    """
+    def __init__(
+        self,
+        predictor: Predictor,
+        movement_penalty_per_mb: float = 0.05,
+        time_budget_s: float = 0.2,
+        max_move_mb: float = float("inf"),
+        swap_partners: int = 4,
+        pair_samples: int = 64,
+        anneal: bool = False,
+        initial_temperature: Optional[float] = None,
+        cooling: float = 0.995,
+        patience: int = 10,
+        max_iters: Optional[int] = None,
+        warm_start: bool = True,
+        seed: int = 0,
+        quantile: Optional[float] = None
+    ):
+        self.predictor = predictor
+        self.penalty = movement_penalty_per_mb
+        self.time_budget_s = time_budget_s
+        self.max_move_mb = max_move_mb
+        self.swap_partners = swap_partners
+        self.pair_samples = pair_samples
+        self.anneal = anneal
+        self.initial_temperature = initial_temperature
+        self.cooling = cooling
+        self.patience = patience
+        self.max_iters = max_iters
+        self.warm_start = warm_start
+        self.seed = seed
+        self.quantile = quantile
+
+    def plan(
+        self,
+        current_map: Dict[int, List[int]],
+        worker_states: Dict[int, Dict[str, Any]],
+        shard_states: Dict[int, Dict[str, Any]]
+    ) -> Dict[int, List[int]]:
+        deadline = time.perf_counter() + self.time_budget_s
+        rng = np.random.default_rng(self.seed)
+
+        index = ShardLocationIndex(current_map, shard_states, worker_states)
+        n_workers = len(index.workers)
+        if n_workers < 2 or not len(index):
+            return index.to_map()
+
+        cost_matrix = self.predictor.predict_matrix(
+            [worker_states[wid] for wid in index.workers],
+            list(shard_states.values()),
+            quantile=self.quantile
+        )
+        cols = index.cols
+
+        # The untouched input map is the reference point
+        objective = float(np.bincount(index.owner, weights=cost_matrix[index.owner, cols], minlength=n_workers).max())
+        best_objective = objective
+        best_location = index.location.copy()
+        if self.warm_start:
+            LPTResharder(self.predictor, self.penalty, self.max_move_mb).place(cost_matrix, index)
+        loads = np.bincount(
+            index.location, weights=cost_matrix[index.location, cols].astype(np.float64), minlength=n_workers
+        )
+        if self.warm_start:
+            objective = float(loads.max()) + self.penalty * index.move_cost
+            if objective < best_objective:
+                best_objective = objective
+                best_location = index.location.copy()
+        temperature = self.initial_temperature
+        if temperature is None:
+            temperature = 0.01 * objective
+        stale = 0
+        iters = 0
+
+        while time.perf_counter() < deadline:
+            if self.max_iters is not None and iters >= self.max_iters:
+                break
+            iters += 1
+
+            candidates = self._neighborhood(rng, cost_matrix, index, loads)
+            if not candidates:
+                break
+            best = min(candidates, key=lambda c: c[0])
+            chosen: Optional[_Candidate] = None
+            if best[0] < objective:
+                chosen = best
+            elif self.anneal:
+                trial = candidates[int(rng.integers(len(candidates)))]
+                if trial[0] < objective or rng.random() < math.exp(-(trial[0] - objective) / max(temperature, 1e-12)):
+                    chosen = trial
+            temperature *= self.cooling
+
+            if chosen is None:
+                stale += 1
+                if stale >= self.patience:
+                    break
+                continue
+            stale = 0
+
+            objective, _, leaving, coming, partner = chosen
+            s = int(np.argmax(loads))
+            for i in leaving:
+                index.move(i, partner)
+                loads[s] -= cost_matrix[s, cols[i]]
+                loads[partner] += cost_matrix[partner, cols[i]]
+            for i in coming:
+                index.move(i, s)
+                loads[partner] -= cost_matrix[partner, cols[i]]
+                loads[s] += cost_matrix[s, cols[i]]
+
+            if objective < best_objective:
+                best_objective = objective
+                best_location = index.location.copy()
+
+        index.restore(best_location)
+        return index.to_map()
+
+    def _neighborhood(
+        self,
+        rng: np.random.Generator,
+        cost_matrix: np.ndarray,
+        index: ShardLocationIndex,
+        loads: np.ndarray
+    ) -> List[_Candidate]:
+        """Best candidate of each neighborhood kind around the current straggler."""
+        n_workers = len(loads)
+        top = np.argsort(-loads, kind="stable")[:3]
+        s = int(top[0])
+        cols = index.cols
+        moved_mb = index.moved_mb
+        move_cost = index.move_cost
+        on_s = index.shards_on(s)
+        if len(on_s) == 0:
+            return []
+
+        def rest_max(w: int) -> float:
+            # Largest load among workers other than the straggler and ``w``
+            for t in top[1:]:
+                if t != w:
+                    return float(loads[t])
+            return -math.inf
+
+        def score(makespan: np.ndarray, delta_mb: np.ndarray, delta_cost: np.ndarray) -> np.ndarray:
+            # Locality-aware penalty; the MB budget counts raw bytes
+            obj = makespan + self.penalty * (move_cost + delta_cost)
+            obj[moved_mb + delta_mb > self.max_move_mb] = np.inf
+            return obj
+
+        cs = cost_matrix[s, cols[on_s]].astype(np.float64)
+        candidates: List[_Candidate] = []
+
+        # Move: any straggler shard to any less-loaded worker
+        receivers = np.flatnonzero(loads < loads[s])
+        if len(receivers):
+            sub = cost_matrix[receivers[:, None], cols[on_s][None, :]].astype(np.float64)
+            rest = np.full(len(receivers), rest_max(-1))
+            if len(top) > 1:
+                rest[receivers == top[1]] = rest_max(int(top[1]))
+            makespan = np.maximum(np.maximum(loads[receivers, None] + sub, (loads[s] - cs)[None, :]), rest[:, None])
+            obj = score(
+                makespan,
+                index.move_deltas(on_s, receivers[:, None]),
+                index.move_cost_deltas(on_s, receivers[:, None])
+            )
+            r, j = divmod(int(np.argmin(obj)), len(on_s))
+            candidates.append((float(obj[r, j]), "move", [int(on_s[j])], [], int(receivers[r])))
+
+        # Swap partners: the least-loaded workers plus a random one
+        order = np.argsort(loads, kind="stable")
+        partners = [int(w) for w in order[:self.swap_partners] if w != s]
+        if n_workers > 2:
+            extra = int(rng.integers(n_workers))
+            if extra != s and extra not in partners:
+                partners.append(extra)
+
+        # Straggler shard pairs for 2-for-1 swaps (all of them, or a random sample)
+        n_s = len(on_s)
+        if n_s * (n_s - 1) // 2 <= self.pair_samples:
+            pa, pb = np.triu_indices(n_s, 1)
+        else:
+            a = rng.integers(0, n_s, self.pair_samples)
+            b = rng.integers(0, n_s - 1, self.pair_samples)
+            b += b >= a
+            pairs = np.unique(np.minimum(a, b) * n_s + np.maximum(a, b))
+            pa, pb = pairs // n_s, pairs % n_s
+
+        for p in partners:
+            on_p = index.shards_on(p)
+            if len(on_p) == 0:
+                continue
+            rest_p = rest_max(p)
+            cp_own = cost_matrix[p, cols[on_p]].astype(np.float64)  # partner's shards on partner
+            cs_p = cost_matrix[s, cols[on_p]].astype(np.float64)    # partner's shards on straggler
+            cp_s = cost_matrix[p, cols[on_s]].astype(np.float64)    # straggler's shards on partner
+            d_out = index.move_deltas(on_s, p)
+            d_in = index.move_deltas(on_p, s)
+            c_out = index.move_cost_deltas(on_s, p)
+            c_in = index.move_cost_deltas(on_p, s)
+
+            # 1-for-1: straggler shard i <-> partner shard j
+            new_s = loads[s] - cs[:, None] + cs_p[None, :]
+            new_p = loads[p] - cp_own[None, :] + cp_s[:, None]
+            makespan = np.maximum(np.maximum(new_s, new_p), rest_p)
+            obj = score(makespan, d_out[:, None] + d_in[None, :], c_out[:, None] + c_in[None, :])
+            i, j = divmod(int(np.argmin(obj)), len(on_p))
+            candidates.append((float(obj[i, j]), "swap", [int(on_s[i])], [int(on_p[j])], p))
+
+            # 2-for-1: straggler shards (a, b) <-> partner shard j
+            if len(pa):
+                new_s = loads[s] - (cs[pa] + cs[pb])[:, None] + cs_p[None, :]
+                new_p = loads[p] - cp_own[None, :] + (cp_s[pa] + cp_s[pb])[:, None]
+                makespan = np.maximum(np.maximum(new_s, new_p), rest_p)
+                obj = score(
+                    makespan,
+                    (d_out[pa] + d_out[pb])[:, None] + d_in[None, :],
+                    (c_out[pa] + c_out[pb])[:, None] + c_in[None, :]
+                )
+                pair, j = divmod(int(np.argmin(obj)), len(on_p))
+                candidates.append(
+                    (float(obj[pair, j]), "swap2", [int(on_s[pa[pair]]), int(on_s[pb[pair]])], [int(on_p[j])], p)
+                )
+
+        return [c for c in candidates if math.isfinite(c[0])]
@@ -1,106 +1,295 @@
-import copy
-from typing import Any, Dict, List
+import heapq
+from typing import Any, Dict, List, Optional, Tuple
 
-from shardsense.model.predictor import RuntimePredictor
-from shardsense.planner.cost import calculate_movement_cost
+import numpy as np
+
+from shardsense.model.predictor import Predictor
+from shardsense.planner.cost import ShardLocationIndex
+
+
+class _LoadHeap:
+    """
+    Lazy-deletion heap over per-worker loads.
+    Entries carry the worker's insertion index so ties resolve exactly like
+    ``max``/``min`` over the assignment dict (first worker wins).
+    """
+    def __init__(self, loads: Dict[int, float], order: Dict[int, int], largest: bool):
+        self.sign = -1.0 if largest else 1.0
+        self.order = order
+        self.version = {wid: 0 for wid in loads}
+        self.heap: List[Tuple[float, int, int, int]] = [
+            (self.sign * load, order[wid], wid, 0) for wid, load in loads.items()
+        ]
+        heapq.heapify(self.heap)
+
+    def update(self, wid: int, load: float):
+        self.version[wid] += 1
+        heapq.heappush(self.heap, (self.sign * load, self.order[wid], wid, self.version[wid]))
+
+    def _prune(self):
+        while self.heap and self.heap[0][3] != self.version[self.heap[0][2]]:
+            heapq.heappop(self.heap)
+
+    def top(self) -> int:
+        self._prune()
+        return self.heap[0][2]
+
+    def top_excluding(self, excluded: Tuple[int, ...]) -> Optional[float]:
+        """Best load among workers not in ``excluded`` (None if there are none)."""
+        popped = []
+        result = None
+        self._prune()
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            if entry[3] != self.version[entry[2]]:
+                continue
+            popped.append(entry)
+            if entry[2] not in excluded:
+                result = self.sign * entry[0]
+                break
+        for entry in popped:
+            heapq.heappush(self.heap, entry)
+        return result
 
 
 class GreedyResharder:
     """
     Iteratively moves shards from the slowest worker to the fastest worker
     until the cost (Time + MovementPenalty) stops improving.
+
+    Predictions come from a single ``predict_matrix`` call and worker loads are
+    kept as running totals, so each trial move is evaluated in O(1) from
+    deltas instead of re-predicting the whole assignment map.
+
+    With ``quantile`` set (e.g. 0.95) loads are built from the predictor's
+    upper-quantile estimates, so the plan minimizes the tail makespan and
+    noisy workers get less work.
     """
-    def __init__(self, predictor: RuntimePredictor, movement_penalty_per_mb: float = 0.05):
+    def __init__(
+        self,
+        predictor: Predictor,
+        movement_penalty_per_mb: float = 0.05,
+        quantile: Optional[float] = None
+    ):
         self.predictor = predictor
         self.penalty = movement_penalty_per_mb
+        self.quantile = quantile
 
     def plan(
-        self, 
-        current_map: Dict[int, List[int]], 
+        self,
+        current_map: Dict[int, List[int]],
         worker_states: Dict[int, Dict[str, Any]], # info needed for prediction
         shard_states: Dict[int, Dict[str, Any]]
     ) -> Dict[int, List[int]]:
-        
-        # 1. Deep copy current map to start modifying
-        best_map = copy.deepcopy(current_map)
-        
-        # Helper to calc expected time for a mapping
-        def evaluate_map(assignment_map: Dict[int, List[int]]) -> Dict[int, float]:
-            times = {}
-            for wid, sids in assignment_map.items():
-                w_time = 0.0
-                for sid in sids:
-                    # Model prediction
-                    w_time += self.predictor.predict_batch_time(
-                        worker_states[wid], 
-                        shard_states[sid]
-                    )  # type: ignore
-                times[wid] = w_time
-            return times
-
-        current_times = evaluate_map(best_map)
+
+        # 1. Copy current map to start modifying
+        best_map = {wid: list(sids) for wid, sids in current_map.items()}
+        if not best_map:
+            return best_map
+
+        # All (worker, shard) predictions in one model call.
+        # Movement is measured against the ORIGINAL input map.
+        index = ShardLocationIndex(current_map, shard_states, worker_states)
+        w_index = index.worker_index
+        cost_matrix = self.predictor.predict_matrix(
+            [worker_states[wid] for wid in best_map],
+            list(shard_states.values()),
+            quantile=self.quantile
+        )
+
+        def cost(wid: int, sid: int) -> float:
+            return float(cost_matrix[w_index[wid], index.cols[index.row[sid]]])
+
+        def worker_load(wid: int) -> float:
+            w_time = 0.0
+            for sid in best_map[wid]:
+                w_time += cost(wid, sid)
+            return w_time
+
+        current_times = {wid: worker_load(wid) for wid in best_map}
+        max_heap = _LoadHeap(current_times, w_index, largest=True)
+        min_heap = _LoadHeap(current_times, w_index, largest=False)
         best_objective = max(current_times.values()) # Baseline: just time (no movement)
-        
+
         # Iteration limit to prevent infinite loops
         for _ in range(50):
             # Identify straggler (max time) and receiver (min time)
-            slowest_wid = max(current_times, key=current_times.get)
-            fastest_wid = min(current_times, key=current_times.get)
-            
+            slowest_wid = max_heap.top()
+            fastest_wid = min_heap.top()
+
             if slowest_wid == fastest_wid:
                 break
-                
-            # Try moving each shard from slowest to fastest
-            candidate_map = None
-            candidate_objective = float('inf')
-            
-            # Simple heuristic: try moving the BIGGEST shard first to have impact
-            # Or the SMALLEST if we just need fine tuning? 
-            # Let's try all assigned shards.
+
             source_shards = best_map[slowest_wid]
-            if not source_shards: 
+            if not source_shards:
                 break
 
-            found_improvement = False
-            
-            # Sort by predicted cost (descending) to aggressively fix straggler
-            # But we need expensive calculation for that. Just try all.
+            # Loads of the untouched workers do not change within this pass
+            rest_max = max_heap.top_excluding((slowest_wid, fastest_wid))
+            slow_load = current_times[slowest_wid]
+            fast_load = current_times[fastest_wid]
+
+            # Try moving each shard from slowest to fastest; keep the BEST move
+            # (first one wins on ties) to avoid oscillations.
+            fast_idx = w_index[fastest_wid]
+            candidate_sid = None
             for sid in source_shards:
-                # Create trial map
-                trial_map = copy.deepcopy(best_map)
-                trial_map[slowest_wid].remove(sid)
-                trial_map[fastest_wid].append(sid)
-                
-                # Evaluate
-                times = evaluate_map(trial_map)
-                max_t = max(times.values())
-                
-                # Movement penalty
-                # We calculate delta from ORIGINAL input map, not previous step
-                move_cost = calculate_movement_cost(
-                    current_map, 
-                    trial_map, 
-                    {s: float(d['size_mb']) for s, d in shard_states.items()}
-                )
-                
-                total_obj = max_t + (move_cost * self.penalty)
-                
+                max_t = max(slow_load - cost(slowest_wid, sid), fast_load + cost(fastest_wid, sid))
+                if rest_max is not None and rest_max > max_t:
+                    max_t = rest_max
+
+                trial_cost = index.move_cost + index.move_cost_delta(index.row[sid], fast_idx)
+                total_obj = max_t + (trial_cost * self.penalty)
+
                 if total_obj < best_objective:
                     best_objective = total_obj
-                    candidate_map = trial_map
-                    found_improvement = True
-                    # Greedy: take first improvement or best? 
-                    # Let's take best to avoid oscillations, but for speed first is okay.
-                    # We will keep searching this worker's shards to find BEST move.
-                    if total_obj < candidate_objective:
-                        candidate_objective = total_obj
-                        candidate_map = trial_map
-
-            if found_improvement and candidate_map:
-                best_map = candidate_map
-                current_times = evaluate_map(best_map)
-            else:
+                    candidate_sid = sid
+
+            if candidate_sid is None:
                 # No single move improves the objective
                 break
-                
+
+            best_map[slowest_wid].remove(candidate_sid)
+            best_map[fastest_wid].append(candidate_sid)
+            index.move(index.row[candidate_sid], fast_idx)
+            # Re-sum the two touched workers so float drift never accumulates
+            for wid in (slowest_wid, fastest_wid):
+                current_times[wid] = worker_load(wid)
+                max_heap.update(wid, current_times[wid])
+                min_heap.update(wid, current_times[wid])
+
         return best_map
+
+
+class LPTResharder:
+    """
+    Min-makespan planner for unrelated workers (per-pair predicted costs).
+
+    1. Shed: overloaded workers give up their most expensive shards until
+       they fall to the mean load.
+    2. Place: shed shards are re-inserted Longest-Processing-Time first on
+       the worker where they finish earliest (their owner is always a
+       candidate and never pays the movement penalty).
+    3. Refine: the straggler repeatedly hands one shard to whichever of the
+       ``refine_receivers`` least-loaded workers (or the shard's owner)
+       lowers its time the most.
+
+    Total MB placed away from the input map never exceeds ``max_move_mb``.
+    ``quantile`` plans against upper-quantile predictions, as in ``GreedyResharder``.
+    """
+    def __init__(
+        self,
+        predictor: Predictor,
+        movement_penalty_per_mb: float = 0.05,
+        max_move_mb: float = float("inf"),
+        refine_iters: int = 200,
+        refine_receivers: int = 32,
+        quantile: Optional[float] = None
+    ):
+        self.predictor = predictor
+        self.penalty = movement_penalty_per_mb
+        self.max_move_mb = max_move_mb
+        self.refine_iters = refine_iters
+        self.refine_receivers = refine_receivers
+        self.quantile = quantile
+
+    def plan(
+        self,
+        current_map: Dict[int, List[int]],
+        worker_states: Dict[int, Dict[str, Any]],
+        shard_states: Dict[int, Dict[str, Any]]
+    ) -> Dict[int, List[int]]:
+        index = ShardLocationIndex(current_map, shard_states, worker_states)
+        if not len(index):
+            return index.to_map()
+
+        cost_matrix = self.predictor.predict_matrix(
+            [worker_states[wid] for wid in index.workers],
+            list(shard_states.values()),
+            quantile=self.quantile
+        )
+        self.place(cost_matrix, index)
+        return index.to_map()
+
+    def place(self, cost_matrix: np.ndarray, index: ShardLocationIndex):
+        """
+        Core solver on array inputs: rebalances ``index`` in place against a
+        ``workers x shards`` cost matrix (columns per ``index.cols``).
+        """
+        owner, cols, sizes = index.owner, index.cols, index.sizes
+        n_workers = cost_matrix.shape[0]
+        own_cost = cost_matrix[owner, cols].astype(np.float64)
+        loads = np.bincount(owner, weights=own_cost, minlength=n_workers)
+        # 1. Shed from overloaded workers, most expensive shard first
+        target = loads.mean()
+        by_owner = np.lexsort((-own_cost, owner))
+        by_owner = by_owner[loads[owner[by_owner]] > target]
+        owner_l = owner.tolist()
+        cost_l = own_cost.tolist()
+        remaining = loads.tolist()
+        pool = []
+        for i in by_owner.tolist():
+            w = owner_l[i]
+            if remaining[w] > target:
+                remaining[w] -= cost_l[i]
+                pool.append(i)
+        loads = np.array(remaining)
+
+        # 2. Longest-Processing-Time placement on the earliest-finishing worker
+        if pool:
+            pool_idx = np.array(pool, dtype=np.int64)
+            pool_idx = pool_idx[np.argsort(-own_cost[pool_idx], kind="stable")]
+            # Once even the smallest remaining shard exceeds the budget, the rest go home
+            pool_sizes = sizes[pool_idx]
+            smallest_left = np.minimum.accumulate(pool_sizes[::-1])[::-1].tolist()
+            pool_sizes_l = pool_sizes.tolist()
+            cols_l = cols.tolist()
+            pen_factor = self.penalty * index.fetch_factor
+            score = np.empty_like(loads)
+            for k, i in enumerate(pool_idx.tolist()):
+                w_own = owner_l[i]
+                if index.moved_mb + smallest_left[k] > self.max_move_mb:
+                    rest = pool_idx[k:]
+                    loads += np.bincount(owner[rest], weights=own_cost[rest], minlength=n_workers)
+                    break
+                col = cost_matrix[:, cols_l[i]]
+                # Finish time plus the penalty for fetching the shard (free at its owner)
+                np.add(loads, col, out=score)
+                score += pool_sizes_l[k] * pen_factor
+                for w, warmth in index.warm_by_row.get(i, ()):
+                    score[w] -= warmth * pool_sizes_l[k] * pen_factor[w]
+                score[w_own] = loads[w_own] + col[w_own]
+                best = int(score.argmin())
+                if best != w_own and index.moved_mb + pool_sizes_l[k] > self.max_move_mb:
+                    best = w_own
+                if best != w_own:
+                    index.move(i, best)
+                loads[best] += col[best]
+
+        # 3. Refine: move one shard off the straggler while it helps.
+        # Receivers are the least-loaded workers plus the shards' owners (reverts).
+        n_receivers = min(n_workers, self.refine_receivers)
+        for _ in range(self.refine_iters):
+            s = int(np.argmax(loads))
+            on_s = index.shards_on(s)
+            if len(on_s) == 0:
+                break
+            receivers = np.argpartition(loads, n_receivers - 1)[:n_receivers]
+            receivers = np.unique(np.concatenate([receivers, owner[on_s]]))
+            receivers = receivers[receivers != s]
+            if len(receivers) == 0:
+                break
+            sub = cost_matrix[receivers[:, None], cols[on_s][None, :]].astype(np.float64)
+            own_sub = cost_matrix[s, cols[on_s]].astype(np.float64)
+            pair_max = np.maximum(loads[receivers, None] + sub, (loads[s] - own_sub)[None, :])
+            # Movement deltas of sending each shard to each receiver (reverts are negative)
+            delta_mb = index.move_deltas(on_s, receivers[:, None])
+            objective = pair_max + self.penalty * index.move_cost_deltas(on_s, receivers[:, None])
+            objective[index.moved_mb + delta_mb > self.max_move_mb] = np.inf
+            r, j = divmod(int(np.argmin(objective)), len(on_s))
+            if not objective[r, j] < loads[s]:
+                break
+            dst = int(receivers[r])
+            loads[s] -= own_sub[j]
+            loads[dst] += sub[r, j]
+            index.move(int(on_s[j]), dst)
@@ -0,0 +1,63 @@
+import json
+import os
+from typing import Any, Dict
+
+import numpy as np
+
+# Bumped when the layout of ShardSenseRuntime.state_dict() changes incompatibly
+CHECKPOINT_VERSION = 2
+
+
+def _pack(obj: Any, arrays: Dict[str, np.ndarray]) -> Any:
+    """JSON-able copy of ``obj``; arrays and raw bytes move to ``arrays``."""
+    if isinstance(obj, np.ndarray):
+        key = f"a{len(arrays)}"
+        arrays[key] = obj
+        return {"__array__": key}
+    if isinstance(obj, (bytes, bytearray)):
+        key = f"a{len(arrays)}"
+        arrays[key] = np.frombuffer(bytes(obj), dtype=np.uint8)
+        return {"__bytes__": key}
+    if isinstance(obj, dict):
+        return {str(k): _pack(v, arrays) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_pack(v, arrays) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _unpack(obj: Any, arrays: Any) -> Any:
+    if isinstance(obj, dict):
+        if "__array__" in obj:
+            return arrays[obj["__array__"]]
+        if "__bytes__" in obj:
+            return arrays[obj["__bytes__"]].tobytes()
+        return {k: _unpack(v, arrays) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_unpack(v, arrays) for v in obj]
+    return obj
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]):
+    """
+    Writes a nested state dict to one ``.npz`` file: the structure as JSON,
+    arrays and bytes as members. The file is replaced atomically.
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    meta = _pack({"version": CHECKPOINT_VERSION, "state": state}, arrays)
+    arrays["__meta__"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)  # type: ignore[arg-type]
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    meta = json.loads(arrays.pop("__meta__").tobytes().decode())
+    if meta.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {meta.get('version')} in {path}")
+    state: Dict[str, Any] = _unpack(meta["state"], arrays)
+    return state
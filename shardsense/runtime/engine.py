@@ -1,61 +1,172 @@
-from typing import Any, Dict, List, Optional
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 from torch.utils.data import DataLoader, Dataset
 
 from shardsense.data.dataset import ShardedDataset
 from shardsense.data.loader import MeasurableDataLoader
+from shardsense.model.online import OnlinePredictor
 from shardsense.model.predictor import RuntimePredictor
-from shardsense.planner.solver import GreedyResharder
+from shardsense.planner.cost import ShardLocationIndex
+from shardsense.planner.hierarchy import HierarchicalResharder
+from shardsense.planner.search import LocalSearchResharder
+from shardsense.planner.solver import GreedyResharder, LPTResharder
+from shardsense.runtime.checkpoint import load_checkpoint, save_checkpoint
 from shardsense.telemetry.collector import MetricsCollector
+from shardsense.telemetry.forecast import WorkerForecaster
+from shardsense.telemetry.residency import ShardResidency
+from shardsense.telemetry.sampler import SystemSampler
 from shardsense.telemetry.schema import ShardMetrics
+from shardsense.telemetry.store import ColumnTable
+
+logger = logging.getLogger(__name__)
+
+# Planner backends selectable by name; all share plan(current_map, worker_states, shard_states)
+PLANNERS: Dict[str, Any] = {
+    "greedy": GreedyResharder,
+    "lpt": LPTResharder,
+    "local_search": LocalSearchResharder,
+    "hierarchical": HierarchicalResharder,
+}
+
+# Batch-time models selectable by name; all implement shardsense.model.predictor.Predictor
+PREDICTORS: Dict[str, Any] = {
+    "xgboost": RuntimePredictor,
+    "online": OnlinePredictor,
+}
+
+# MeasurableDataLoader aggregation window used unless loader_options overrides it
+DEFAULT_LOADER_OPTIONS: Dict[str, Any] = {"window_batches": 64, "window_s": 1.0}
 
 
 class ShardSenseRuntime:
     """
     Real-world Runtime implementation.
     Manages sharding for a PyTorch Dataset.
+
+    With ``async_planning=True`` the epoch boundary only snapshots the
+    telemetry; training and planning run on a background thread and the
+    finished plan is staged in a second buffer. The first ``get_dataloader``
+    call of the next epoch swaps in the newest completed plan, so every
+    worker of an epoch sees the same map. ``stats_hook`` then receives the
+    epoch's stats when that background job finishes, gate fields included.
+    A failed job is logged, recorded under ``"error"`` in its stats and in
+    ``last_plan_error``, and re-raised by the next ``epoch_end`` or ``close``.
+
+    With ``rebalance_min_gain`` set, each boundary is gated. If the observed
+    spread of per-worker epoch times (recent mean batch time x shards held)
+    is below that fraction, training and planning are both skipped. Otherwise
+    the model bounds the achievable makespan gain (at the planner's
+    ``quantile``, if any), and planning is skipped when that bound is below
+    the threshold or below the cheapest single move as the planner prices it. The reason lands in ``boundary_stats`` under ``"skipped"``.
+
+    With ``checkpoint_path`` set, the runtime resumes from that checkpoint if
+    it exists. It then rewrites the checkpoint after every
+    ``checkpoint_every`` planned epochs. The checkpoint holds the assignment
+    map, the trained model, the forecaster and residency state, and a
+    bounded telemetry summary, so a restarted job is balanced from its
+    first epoch.
     """
     def __init__(self, 
                  dataset: Dataset, 
                  num_shards: int,
                  num_workers: int = 1, # For MVP, simple config
                  batch_size: int = 32,
-                 db_path: Optional[str] = None):
+                 db_path: Optional[str] = None,
+                 telemetry_options: Optional[Dict[str, Any]] = None,
+                 loader_options: Optional[Dict[str, Any]] = None,
+                 sampler_options: Optional[Dict[str, Any]] = None,
+                 planner: str = "greedy",
+                 planner_options: Optional[Dict[str, Any]] = None,
+                 predictor: str = "xgboost",
+                 predictor_options: Optional[Dict[str, Any]] = None,
+                 forecaster_options: Optional[Dict[str, Any]] = None,
+                 async_planning: bool = False,
+                 stats_hook: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 rebalance_min_gain: Optional[float] = None,
+                 gate_window: int = 20,
+                 checkpoint_path: Optional[str] = None,
+                 checkpoint_every: int = 1):
         self.dataset = dataset
         self.num_shards = num_shards
         self.num_workers = num_workers
         self.batch_size = batch_size
+        self.async_planning = async_planning
+        self.stats_hook = stats_hook
+        # Relative makespan gain a rebalance must promise (None = always rebalance)
+        self.rebalance_min_gain = rebalance_min_gain
+        self.gate_window = gate_window
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        # One record per epoch_end: how long the caller was blocked at the boundary
+        self.boundary_stats: List[Dict[str, Any]] = []
         
         # Calculate shard size (virtual)
         self.total_samples = len(dataset)
         self.shard_size = (self.total_samples + num_shards - 1) // num_shards
         
-        self.collector = MetricsCollector(db_path=db_path)
-        self.predictor = RuntimePredictor()
-        self.planner = GreedyResharder(self.predictor)
+        self.collector = MetricsCollector(db_path=db_path, **(telemetry_options or {}))
+        # Loaders push one summary record per window rather than one per batch
+        self.loader_options = {**DEFAULT_LOADER_OPTIONS, **(loader_options or {})}
+        # CPU and read throughput from /proc for the loaders' records (None off Linux)
+        self.sampler = SystemSampler(**(sampler_options or {})) if SystemSampler.available() else None
+        # Which shards each worker held recently (warm in page cache / local disk)
+        self.residency = ShardResidency()
+        # Smoothed, trend-aware per-worker capacity from the metrics stream
+        self.forecaster = WorkerForecaster(**(forecaster_options or {}))
+        if predictor not in PREDICTORS:
+            raise ValueError(f"Unknown predictor '{predictor}'. Choose from {sorted(PREDICTORS)}")
+        self.predictor = PREDICTORS[predictor](**(predictor_options or {}))
+        if planner not in PLANNERS:
+            raise ValueError(f"Unknown planner '{planner}'. Choose from {sorted(PLANNERS)}")
+        self.planner = PLANNERS[planner](self.predictor, **(planner_options or {}))
         
         # Initial Round Robin assignments
         self.assignments: Dict[int, List[int]] = {i: [] for i in range(num_workers)}
         for i in range(num_shards):
             worker_id = i % num_workers
             self.assignments[worker_id].append(i)
+
+        # Double buffer for async planning: plans land here, get_dataloader swaps them in
+        self._lock = threading.Lock()
+        self._staged: Optional[Tuple[int, Dict[int, List[int]]]] = None
+        self._pending: Optional[Future] = None
+        self.last_plan_error: Optional[BaseException] = None
+        self._unraised_error: Optional[BaseException] = None
+        self._epoch_open = False
+        self._executor = ThreadPoolExecutor(max_workers=1) if async_planning else None
+        # Forecaster and residency: updated at the boundary, read by a background plan's checkpoint
+        self._state_lock = threading.Lock()
             
-        # Register shards
-        for i in range(num_shards):
-            # approximate size in MB? Hard with generic dataset.
-            # We use "count" as proxy for now or 1.0
-            self.collector.register_shard(ShardMetrics(
-                shard_id=i,
-                size_mb=1.0, 
-                mean_decode_ms=10.0,
-                hotness_score=1.0
-            ))
+        # Register shards (one bulk insert)
+        # approximate size in MB? Hard with generic dataset.
+        # We use "count" as proxy for now or 1.0
+        self.collector.register_shards([
+            ShardMetrics(shard_id=i, size_mb=1.0, mean_decode_ms=10.0, hotness_score=1.0)
+            for i in range(num_shards)
+        ])
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.load_checkpoint(checkpoint_path)
 
     def get_dataloader(self, worker_id: int) -> MeasurableDataLoader:
         """
         Returns a DataLoader for the specific worker based on current plan.
         """
-        assigned_shards = self.assignments.get(worker_id, [])
+        with self._lock:
+            if not self._epoch_open:
+                # First loader of the epoch: adopt the newest completed plan
+                if self._staged is not None:
+                    self.assignments = self._staged[1]
+                    self._staged = None
+                self._epoch_open = True
+            assigned_shards = self.assignments.get(worker_id, [])
         sharded_ds = ShardedDataset(self.dataset, assigned_shards, self.shard_size)
         
         # Fix for potential empty dataset with shuffle=True causing crashes
@@ -64,31 +175,245 @@ class ShardSenseRuntime:
             should_shuffle = False
 
         loader = DataLoader(sharded_ds, batch_size=self.batch_size, shuffle=should_shuffle)
-        return MeasurableDataLoader(loader, worker_id, self.collector)
+        return MeasurableDataLoader(loader, worker_id, self.collector, sampler=self.sampler, **self.loader_options)
 
     def epoch_end(self, epoch_id: int):
         """
         Triggered at the end of an epoch to potentially re-shard.
         """
+        self._raise_plan_error()
+        start = time.perf_counter()
+        with self._lock:
+            self._epoch_open = False
+            current_map = {w: list(sids) for w, sids in self.assignments.items()}
+        with self._state_lock:
+            self.residency.record(current_map, epoch_id)
+
+        # Snapshot the telemetry; the model and planner only see these copies
+        self.collector.drain()
+        self.collector.archive(epoch_id)
+        training_data = self.collector.get_training_table()
+        worker_states, shard_states = self._planner_inputs()
+
+        stats: Dict[str, Any] = {"epoch": epoch_id, "mode": "async" if self.async_planning else "sync"}
+        planning: Optional[Future] = None
+        if self.rebalance_min_gain is not None:
+            spread = self._observed_spread(current_map)
+            if spread is not None:
+                stats["observed_spread"] = spread
+                if spread < self.rebalance_min_gain:
+                    stats["skipped"] = "observed_spread_below_threshold"
+
+        if "skipped" in stats:
+            # Steady state: neither the model nor the planner runs
+            if self._pending is None or self._pending.done():
+                self._maybe_checkpoint(epoch_id, current_map)
+        elif self._executor is None:
+            self._train_and_plan(epoch_id, training_data, current_map, worker_states, shard_states, stats)
+        elif self._pending is not None and not self._pending.done():
+            # Previous plan still in flight; don't queue up stale work
+            stats["skipped"] = "planner_busy"
+        else:
+            # Planner-side gate fields are filled into ``stats`` when the job finishes
+            planning = self._pending = self._executor.submit(
+                self._train_and_plan, epoch_id, training_data, current_map, worker_states, shard_states, stats
+            )
+
+        stats["boundary_stall_ms"] = (time.perf_counter() - start) * 1000.0
+        self.boundary_stats.append(stats)
+        if planning is not None:
+            # Runs once the job has filled in its gate fields (right away if it already has)
+            planning.add_done_callback(lambda future: self._plan_done(future, stats))
+        else:
+            self._report_stats(stats)
+
+    def _plan_done(self, future: Future, stats: Dict[str, Any]):
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Background planning for epoch %s failed", stats["epoch"], exc_info=exc)
+            stats["error"] = repr(exc)
+            self.last_plan_error = self._unraised_error = exc
+        self._report_stats(stats)
+
+    def _raise_plan_error(self):
+        exc, self._unraised_error = self._unraised_error, None
+        if exc is not None:
+            raise RuntimeError("Background planning failed") from exc
+
+    def _report_stats(self, stats: Dict[str, Any]):
+        if self.stats_hook is not None:
+            self.stats_hook(stats)
+
+    def wait_for_plan(self, timeout: Optional[float] = None):
+        """Blocks until the in-flight background plan (if any) is staged."""
+        pending = self._pending
+        if pending is not None:
+            pending.result(timeout=timeout)
+
+    def close(self):
+        """Waits for background planning and flushes telemetry to disk."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.collector.close()
+        self._raise_plan_error()
+
+    def _train_and_plan(
+        self,
+        epoch_id: int,
+        training_data: ColumnTable,
+        current_map: Dict[int, List[int]],
+        worker_states: Dict[int, Dict[str, Any]],
+        shard_states: Dict[int, Dict[str, Any]],
+        stats: Dict[str, Any]
+    ):
         # Train model
-        training_data = self.collector.get_training_data()
         if len(training_data) > 50:
              self.predictor.train(training_data)
-        
+
+        if self.rebalance_min_gain is not None:
+            reason = self._gate_on_predicted_gain(current_map, worker_states, shard_states, stats)
+            if reason is not None:
+                stats["skipped"] = reason
+                return
+
         # Re-plan
-        self._rebalance()
+        new_map = self.planner.plan(current_map, worker_states, shard_states)
+        with self._lock:
+            if self._executor is None:
+                self.assignments = new_map
+            else:
+                self._staged = (epoch_id, new_map)
+        self._maybe_checkpoint(epoch_id, new_map)
+        # In distributed setting, we would broadcast this map.
+        # Here we just update local state since we generate dataloaders on demand.
+
+    def state_dict(self, assignments: Optional[Dict[int, List[int]]] = None) -> Dict[str, Any]:
+        """Everything a restarted runtime needs to pick up where this one left off."""
+        if assignments is None:
+            assignments = self.assignments
+        return {
+            "num_shards": self.num_shards,
+            "num_workers": self.num_workers,
+            "assignments": [{"worker_id": w, "shards": list(sids)} for w, sids in assignments.items()],
+            "predictor": self.predictor.state_dict(),
+            **self._locked_state(),
+            "collector": self.collector.state_dict(),
+        }
+
+    def _locked_state(self) -> Dict[str, Any]:
+        # A background plan checkpoints while the training thread may be updating these
+        with self._state_lock:
+            return {"forecaster": self.forecaster.state_dict(), "residency": self.residency.state_dict()}
+
+    def load_state_dict(self, state: Dict[str, Any]):
+        if (state["num_shards"], state["num_workers"]) != (self.num_shards, self.num_workers):
+            raise ValueError(
+                f"Checkpoint is for {state['num_shards']} shards / {state['num_workers']} workers, "
+                f"runtime has {self.num_shards} / {self.num_workers}"
+            )
+        if state["predictor"]["kind"] != self.predictor.kind:
+            raise ValueError(f"Checkpoint holds a '{state['predictor']['kind']}' predictor")
+        self.collector.load_state_dict(state["collector"])
+        # The predictor trained on the training table, which leaves out logs of unregistered shards
+        self.predictor.load_state_dict(state["predictor"], rows_seen=len(self.collector.get_training_table()))
+        with self._state_lock:
+            self.forecaster.load_state_dict(
+                state["forecaster"], consumed={w: h.total for w, h in self.collector.worker_history.items()}
+            )
+            self.residency.load_state_dict(state["residency"])
+        with self._lock:
+            self.assignments = {a["worker_id"]: list(a["shards"]) for a in state["assignments"]}
+            self._staged = None
+
+    def save_checkpoint(self, path: str, assignments: Optional[Dict[int, List[int]]] = None):
+        save_checkpoint(path, self.state_dict(assignments))
+
+    def load_checkpoint(self, path: str):
+        self.load_state_dict(load_checkpoint(path))
+
+    def _maybe_checkpoint(self, epoch_id: int, assignments: Dict[int, List[int]]):
+        if self.checkpoint_path and (epoch_id + 1) % self.checkpoint_every == 0:
+            self.save_checkpoint(self.checkpoint_path, assignments)
+
+    def _observed_spread(self, current_map: Dict[int, List[int]]) -> Optional[float]:
+        """
+        Relative gap between the slowest and the average worker, estimated as
+        recent mean batch time x shards held. None until two workers report.
+        """
+        epoch_times = []
+        for w, sids in current_map.items():
+            history = self.collector.worker_history.get(w)
+            if history:
+                epoch_times.append(history.mean("batch_time_ms", self.gate_window) * len(sids))
+        if len(epoch_times) < 2 or max(epoch_times) <= 0:
+            return None
+        return 1.0 - (sum(epoch_times) / len(epoch_times)) / max(epoch_times)
+
+    def _gate_on_predicted_gain(
+        self,
+        current_map: Dict[int, List[int]],
+        worker_states: Dict[int, Dict[str, Any]],
+        shard_states: Dict[int, Dict[str, Any]],
+        stats: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        Skip reason if the model says no plan can beat the current map by
+        enough. Uses the planner's ``quantile`` and prices moves with the
+        same locality-aware ``ShardLocationIndex`` cost the planners charge.
+        """
+        workers = list(current_map)
+        shard_ids = list(shard_states)
+        if len(workers) < 2 or not shard_ids:
+            return "nothing_to_balance"
+        cost = self.predictor.predict_matrix(
+            [worker_states[w] for w in workers], list(shard_states.values()),
+            quantile=getattr(self.planner, "quantile", None)
+        ).astype(np.float64)
+        column = {sid: j for j, sid in enumerate(shard_ids)}
+        makespan = max(sum(cost[r, column[sid]] for sid in current_map[w]) for r, w in enumerate(workers))
+        if makespan <= 0:
+            return "nothing_to_balance"
+        # No placement beats perfect balance of each shard's cheapest cost, nor its longest shard
+        cheapest = cost.min(axis=0)
+        lower_bound = max(cheapest.sum() / len(workers), cheapest.max())
+        gain = max(makespan - lower_bound, 0.0)
+        stats["predicted_gain"] = gain / makespan
+
+        if gain < self.rebalance_min_gain * makespan:
+            return "predicted_gain_below_threshold"
+        # Every built-in planner exposes its per-MB penalty; custom planners may not
+        penalty = getattr(self.planner, "penalty", 0.0)
+        index = ShardLocationIndex(current_map, shard_states, worker_states)
+        if not len(index):
+            return "nothing_to_balance"
+        # Cheapest single move: any shard to any worker other than its owner
+        receivers = np.arange(len(index.workers))[:, None]
+        fetch = index.fetch_costs(np.arange(len(index))[None, :], receivers)
+        fetch[receivers == index.owner[None, :]] = np.inf
+        if gain <= penalty * float(fetch.min()):
+            return "predicted_gain_below_movement_cost"
+        return None
 
-    def _rebalance(self):
+    def _planner_inputs(self) -> Tuple[Dict[int, Dict[str, Any]], Dict[int, Dict[str, Any]]]:
         # Construct state for planner
         worker_states: Dict[int, Dict[str, Any]] = {}
+        # Plan against where each worker is heading, not its last (possibly noisy) batch
+        with self._state_lock:
+            self.forecaster.observe(self.collector.worker_history)
+            forecasts = {w: self.forecaster.forecast(w) for w in range(self.num_workers)}
+            warmth = {w: self.residency.warmth(w) for w in range(self.num_workers)}
         for w in range(self.num_workers):
             # In real distributed system, we'd query the worker's metrics from the collector
-            # aggregate recent history to get 'current' capabilities
-            history = self.collector.worker_history.get(w, [])
-            if history:
-                 last = history[-1]
-                 io = last.io_read_mb_s if last.io_read_mb_s > 0 else 100.0
-                 cpu = last.cpu_util
+            forecast = forecasts[w]
+            rtt = 0.0
+            hit_rate = math.nan  # not reported
+            if forecast:
+                 io = forecast["io_read_mb_s"] if forecast["io_read_mb_s"] > 0 else 100.0
+                 cpu = forecast["cpu_util"]
+                 rtt = forecast["net_rtt_ms"]
+                 hit_rate = forecast["cache_hit_rate"]
             else:
                  io = 100.0
                  cpu = 0.5
@@ -96,7 +421,11 @@ class ShardSenseRuntime:
             worker_states[w] = {
                 "worker_id": w,
                 "io_read_mb_s": io,
-                "cpu_util": cpu
+                "cpu_util": cpu,
+                # Locality inputs for the planner's movement cost
+                "net_rtt_ms": rtt,
+                "cache_hit_rate": hit_rate,
+                "resident_shards": warmth[w]
             }
             
         shard_states: Dict[int, Dict[str, Any]] = {}
@@ -106,13 +435,4 @@ class ShardSenseRuntime:
                 "size_mb": 1.0, # Placeholder
                 "mean_decode_ms": 10.0 # Placeholder
             }
-
-        new_map = self.planner.plan(
-            self.assignments,
-            worker_states,
-            shard_states
-        )
-        
-        self.assignments = new_map
-        # In distributed setting, we would broadcast this map.
-        # Here we just update local state since we generate dataloaders on demand.
+        return worker_states, shard_states
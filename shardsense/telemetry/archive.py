@@ -0,0 +1,226 @@
+import glob
+import os
+import re
+from dataclasses import fields
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from shardsense.telemetry.history import WORKER_FIELDS
+from shardsense.telemetry.schema import ShardMetrics
+from shardsense.telemetry.store import ColumnTable
+
+if TYPE_CHECKING:
+    from shardsense.model.features import FeatureBuilder
+    from shardsense.telemetry.collector import MetricsCollector
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.ipc as ipc  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+ARCHIVE_FORMATS = ("parquet", "arrow")
+_SUFFIX = {"parquet": ".parquet", "arrow": ".arrow"}
+_PART = re.compile(r"epoch=(-?\d+)[/\\]part-(\d+)\.(parquet|arrow)$")
+
+
+def _require_arrow():
+    if not HAS_ARROW:
+        raise ImportError("Columnar telemetry archives need pyarrow (pip install pyarrow)")
+
+
+class TelemetryArchiver:
+    """
+    Streams a collector's telemetry into epoch-partitioned columnar files:
+
+        <root>/assignments/epoch=<e>/part-<n>.<fmt>     joined assignment logs
+        <root>/worker_metrics/epoch=<e>/part-<n>.<fmt>  worker samples
+        <root>/shards.<fmt>                             shard registry
+
+    Each ``write(collector, epoch)`` call adds only the rows that arrived
+    since the previous call. Assignment rows go to the partition of their
+    own epoch. Worker samples go to the ``epoch`` passed in. Part numbers
+    continue after files already under ``root``, so a restarted job
+    appends rather than overwrites.
+
+    ``"parquet"`` files are compressed (``compression``, zstd by default)
+    and suit long-term storage. ``"arrow"`` writes uncompressed Arrow IPC
+    files, which the readers below memory-map with no copy. The shard
+    registry is rewritten only when it changes.
+
+    ``write`` is ``snapshot`` (copy the new rows out of the collector)
+    followed by ``write_parts`` (the file writes), so the slow half can run
+    on another thread while the collector keeps ingesting.
+    """
+    def __init__(self, root: str, fmt: str = "parquet", compression: str = "zstd"):
+        _require_arrow()
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format '{fmt}'. Choose from {ARCHIVE_FORMATS}")
+        self.root = root
+        self.fmt = fmt
+        self.compression = compression
+        self._assignment_rows = 0
+        self._worker_totals: Dict[int, int] = {}
+        self._shards: List[ShardMetrics] = []
+        parts = [int(m.group(2)) for m in map(_PART.search, glob.glob(os.path.join(root, "*", "epoch=*", "part-*")))
+                 if m]
+        self._part = max(parts, default=-1) + 1
+
+    def mark_archived(self, collector: "MetricsCollector"):
+        """Treats everything ``collector`` holds now as already written (e.g. restored from a checkpoint)."""
+        self._assignment_rows = len(collector.assignments)
+        self._worker_totals = {wid: h.total for wid, h in collector.worker_history.items()}
+
+    def _write(self, columns: Dict[str, np.ndarray], path: str) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.table(columns)
+        tmp = f"{path}.tmp"
+        if self.fmt == "parquet":
+            pq.write_table(table, tmp, compression=self.compression)
+        else:
+            with pa.OSFile(tmp, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        return path
+
+    def _part_path(self, kind: str, epoch: int) -> str:
+        return os.path.join(self.root, kind, f"epoch={epoch}", f"part-{self._part:06d}{_SUFFIX[self.fmt]}")
+
+    def snapshot(self, collector: "MetricsCollector", epoch: int) -> List[Tuple[Dict[str, np.ndarray], str]]:
+        """
+        Copies of the telemetry added since the previous call, each paired
+        with the file it goes to. The rows count as archived from here on.
+        """
+        parts = []
+        # Only joined logs; one appended during this call waits for the next
+        logs = collector.joined_assignments()
+        new = logs[self._assignment_rows:]
+        self._assignment_rows = len(logs)
+        if len(new):
+            epochs = new["epoch"]
+            for e in np.unique(epochs).tolist():
+                mask = epochs == e
+                parts.append(({name: col[mask] for name, col in new.columns.items()}, self._part_path("assignments", e)))
+
+        samples = []
+        for wid, history in list(collector.worker_history.items()):
+            total = history.total
+            fresh = min(total - self._worker_totals.get(wid, 0), len(history))
+            self._worker_totals[wid] = total
+            if fresh > 0:
+                samples.append(history.last(fresh))
+        if samples:
+            rows = np.concatenate(samples)
+            parts.append(({name: rows[name] for name in WORKER_FIELDS}, self._part_path("worker_metrics", epoch)))
+
+        shards = list(collector.shard_registry.values())
+        if shards and shards != self._shards:
+            self._shards = shards
+            parts.append((
+                {f.name: np.array([getattr(s, f.name) for s in shards]) for f in fields(ShardMetrics)},
+                os.path.join(self.root, f"shards{_SUFFIX[self.fmt]}")
+            ))
+        if parts:
+            self._part += 1
+        return parts
+
+    def write_parts(self, parts: List[Tuple[Dict[str, np.ndarray], str]]) -> List[str]:
+        """Writes the output of ``snapshot``; returns the files written."""
+        return [self._write(columns, path) for columns, path in parts]
+
+    def write(self, collector: "MetricsCollector", epoch: int) -> List[str]:
+        """Writes telemetry added since the previous call; returns the files written."""
+        return self.write_parts(self.snapshot(collector, epoch))
+
+
+def _read(path: str) -> "pa.Table":
+    if path.endswith(".arrow"):
+        # Buffers point into the mapping; nothing is read until a column is touched
+        return ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return pq.read_table(path, memory_map=True)
+
+
+def _to_table(table: "pa.Table") -> ColumnTable:
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if column.num_chunks == 1 and column.null_count == 0:
+            # Views of the Arrow buffers (of the mapped file, for IPC files)
+            columns[name] = column.chunk(0).to_numpy(zero_copy_only=False)
+        else:
+            columns[name] = column.to_numpy()
+    return ColumnTable(columns)
+
+
+def archived_parts(root: str, kind: str = "assignments", epochs: Optional[Sequence[int]] = None) -> List[str]:
+    """Part files of ``kind`` under ``root``, ordered by epoch then part number."""
+    found: List[Tuple[int, int, str]] = []
+    for path in glob.glob(os.path.join(root, kind, "epoch=*", "part-*")):
+        m = _PART.search(path)
+        if m and (epochs is None or int(m.group(1)) in epochs):
+            found.append((int(m.group(1)), int(m.group(2)), path))
+    return [path for _, _, path in sorted(found)]
+
+
+def iter_archived_tables(
+    root: str, kind: str = "assignments", epochs: Optional[Sequence[int]] = None
+) -> Iterator[ColumnTable]:
+    """One ``ColumnTable`` per part file; zero-copy for Arrow IPC parts."""
+    _require_arrow()
+    for path in archived_parts(root, kind, epochs):
+        yield _to_table(_read(path))
+
+
+def load_archived_table(root: str, kind: str = "assignments", epochs: Optional[Sequence[int]] = None) -> ColumnTable:
+    """
+    All parts of ``kind`` as one ``ColumnTable``. A single part is returned
+    as-is. Several parts are concatenated, which copies once.
+    """
+    tables = list(iter_archived_tables(root, kind, epochs))
+    if len(tables) == 1:
+        return tables[0]
+    if not tables:
+        return ColumnTable({})
+    return ColumnTable({name: np.concatenate([t[name] for t in tables]) for name in tables[0].columns})
+
+
+def load_shard_registry(root: str) -> List[ShardMetrics]:
+    _require_arrow()
+    for fmt in ARCHIVE_FORMATS:
+        path = os.path.join(root, f"shards{_SUFFIX[fmt]}")
+        if os.path.exists(path):
+            table = _to_table(_read(path))
+            names = [f.name for f in fields(ShardMetrics)]
+            return [ShardMetrics(*values) for values in zip(*(table[n].tolist() for n in names))]
+    return []
+
+
+def load_training_arrays(
+    root: str, features: Optional["FeatureBuilder"] = None, epochs: Optional[Sequence[int]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Feature matrix and labels for every archived assignment, the same rows
+    as ``MetricsCollector.get_training_table`` (logs of unregistered shards
+    dropped). Each part is written straight into one preallocated matrix,
+    so Arrow IPC archives go from the mapped file to ``X`` in a single copy.
+    """
+    from shardsense.model.features import FeatureBuilder
+
+    features = features or FeatureBuilder()
+    parts = []
+    for table in iter_archived_tables(root, "assignments", epochs):
+        known = ~np.isnan(table["shard_size"])
+        parts.append(table if known.all() else ColumnTable({n: c[known] for n, c in table.columns.items()}))
+    n = sum(len(t) for t in parts)
+    X = np.empty((n, len(features.feature_columns)), dtype=np.float32)
+    y = np.empty(n, dtype=np.float64)
+    start = 0
+    for table in parts:
+        end = start + len(table)
+        features.build_features(table, out=X[start:end])
+        y[start:end] = features.build_labels(table)
+        start = end
+    return X, y
@@ -1,27 +1,361 @@
+import queue
 import sqlite3
-from typing import Any, Dict, List, Optional
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
+
+from shardsense.telemetry.archive import TelemetryArchiver
+from shardsense.telemetry.history import WORKER_FIELDS, WorkerHistory
 from shardsense.telemetry.schema import AssignmentLog, ShardMetrics, WorkerMetrics
+from shardsense.telemetry.store import ColumnStore, ColumnTable
+
+# Columns kept per assignment log
+ASSIGNMENT_SCHEMA: Dict[str, type] = {
+    "epoch": np.int64,
+    "worker_id": np.int64,
+    "shard_id": np.int64,
+    "start_time": np.float64,
+    "end_time": np.float64,
+    "target_batch_time": np.float64,
+}
+# Worker and shard features, filled in by the incremental join
+JOINED_SCHEMA: Dict[str, type] = {
+    "worker_io": np.float64,
+    "worker_cpu": np.float64,
+    "shard_size": np.float64,
+    "shard_difficulty": np.float64,
+}
+TRAINING_COLUMNS = (
+    "epoch", "worker_id", "shard_id", "target_batch_time",
+    "worker_io", "worker_cpu", "shard_size", "shard_difficulty",
+)
+_UNJOINED = {name: np.nan for name in JOINED_SCHEMA}
+
+
+_INSERT_WORKER = (
+    'INSERT INTO worker_metrics (timestamp, worker_id, cpu_util, io_read_mb_s, batch_time_ms, '
+    'batch_count, batch_p50_ms, batch_p95_ms, batch_p99_ms, bytes_per_batch) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+# Columns added to worker_metrics after the first release
+_ADDED_WORKER_COLUMNS = (
+    ("batch_count", "INTEGER DEFAULT 1"),
+    ("batch_p50_ms", "REAL"),
+    ("batch_p95_ms", "REAL"),
+    ("batch_p99_ms", "REAL"),
+    ("bytes_per_batch", "REAL"),
+)
+_INSERT_ASSIGNMENT = 'INSERT INTO assignments (epoch, worker_id, shard_id, batch_time_ms) VALUES (?, ?, ?, ?)'
+_UPSERT_SHARD = 'INSERT OR REPLACE INTO shard_metadata (shard_id, size_mb, hotness) VALUES (?, ?, ?)'
+
+# Rollups, folded in with every flush; they outlive the raw rows that compaction deletes
+_UPSERT_MINUTE = (
+    'INSERT INTO worker_metrics_minute (minute, worker_id, records, batches, batch_time_ms_sum, '
+    'batch_p99_ms_max, cpu_util_sum, io_read_mb_s_sum) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT (minute, worker_id) DO UPDATE SET '
+    'records = records + excluded.records, batches = batches + excluded.batches, '
+    'batch_time_ms_sum = batch_time_ms_sum + excluded.batch_time_ms_sum, '
+    'batch_p99_ms_max = MAX(IFNULL(batch_p99_ms_max, 0), IFNULL(excluded.batch_p99_ms_max, 0)), '
+    'cpu_util_sum = cpu_util_sum + excluded.cpu_util_sum, '
+    'io_read_mb_s_sum = io_read_mb_s_sum + excluded.io_read_mb_s_sum'
+)
+_UPSERT_EPOCH = (
+    'INSERT INTO assignment_epochs (epoch, worker_id, shards, batch_time_ms_sum) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT (epoch, worker_id) DO UPDATE SET shards = shards + excluded.shards, '
+    'batch_time_ms_sum = batch_time_ms_sum + excluded.batch_time_ms_sum'
+)
+# Rebuild a rollup from raw rows that predate it (databases from older versions)
+_BACKFILL_MINUTE = (
+    'INSERT INTO worker_metrics_minute SELECT CAST(timestamp / 60 AS INTEGER), worker_id, COUNT(*), '
+    'SUM(IFNULL(batch_count, 1)), SUM(batch_time_ms * IFNULL(batch_count, 1)), MAX(IFNULL(batch_p99_ms, batch_time_ms)), '
+    'SUM(cpu_util), SUM(io_read_mb_s) FROM worker_metrics GROUP BY 1, 2'
+)
+_BACKFILL_EPOCH = (
+    'INSERT INTO assignment_epochs SELECT epoch, worker_id, COUNT(*), SUM(batch_time_ms) '
+    'FROM assignments GROUP BY epoch, worker_id'
+)
+
+BACKPRESSURE_POLICIES = ("drop", "sample", "block")
+# Tells the writer thread to exit
+_STOP = object()
+
+
+def _rollup_rows(pending: Dict[str, List[Tuple[Any, ...]]]) -> Dict[str, List[Tuple[Any, ...]]]:
+    """Pre-aggregates buffered rows into one upsert per (minute, worker) and per (epoch, worker)."""
+    minutes: Dict[Tuple[int, int], List[float]] = {}
+    for ts, wid, cpu, io, batch_time, count, _p50, _p95, p99, _bytes in pending[_INSERT_WORKER]:
+        acc = minutes.setdefault((int(ts // 60), wid), [0, 0, 0.0, 0.0, 0.0, 0.0])
+        acc[0] += 1
+        acc[1] += count
+        acc[2] += batch_time * count
+        acc[3] = max(acc[3], p99)
+        acc[4] += cpu
+        acc[5] += io
+    epochs: Dict[Tuple[int, int], List[float]] = {}
+    for epoch, wid, _shard, batch_time in pending[_INSERT_ASSIGNMENT]:
+        acc = epochs.setdefault((epoch, wid), [0, 0.0])
+        acc[0] += 1
+        acc[1] += batch_time
+    return {
+        _UPSERT_MINUTE: [key + tuple(acc) for key, acc in minutes.items()],
+        _UPSERT_EPOCH: [key + tuple(acc) for key, acc in epochs.items()],
+    }
+
+
+def _flush_rows(conn: sqlite3.Connection, pending: Dict[str, List[Tuple[Any, ...]]]):
+    """Writes every buffered row and its rollups in one transaction and empties the buffers."""
+    if not any(pending.values()):
+        return
+    rollups = _rollup_rows(pending)
+    with conn:
+        for sql, rows in [*pending.items(), *rollups.items()]:
+            if rows:
+                conn.executemany(sql, rows)
+    for rows in pending.values():
+        rows.clear()
+
+
+def _window_means(samples: np.ndarray, start: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean io and cpu of the ``samples`` (one worker's structured history)
+    with ``start <= timestamp <= end``, per log. A log with no sample in its
+    window takes the newest sample at or before ``end``, or the oldest
+    retained one if the log predates the history.
+    """
+    ts = samples["timestamp"]
+    if np.any(ts[1:] < ts[:-1]):
+        samples = samples[np.argsort(ts, kind="stable")]
+        ts = samples["timestamp"]
+    lo = np.searchsorted(ts, start, side="left")
+    hi = np.searchsorted(ts, end, side="right")
+    count = hi - lo
+    asof = np.clip(hi - 1, 0, len(ts) - 1)
+    means = []
+    for name in ("io_read_mb_s", "cpu_util"):
+        col = samples[name]
+        csum = np.concatenate(([0.0], np.cumsum(col)))
+        means.append(np.where(count > 0, (csum[hi] - csum[lo]) / np.maximum(count, 1), col[asof]))
+    return means[0], means[1]
+
+
+def _flush_and_close(conn: sqlite3.Connection, pending: Dict[str, List[Tuple[Any, ...]]], lock: threading.Lock):
+    with lock:
+        _flush_rows(conn, pending)
+        conn.close()
 
 
 class MetricsCollector:
     """
     Aggregates per-epoch metrics from all workers.
     Supports optional SQLite persistence for dashboarding.
+
+    Persistence uses one long-lived WAL-mode connection. Metric and
+    assignment rows are buffered and written with ``executemany`` in a single
+    transaction once ``flush_rows`` rows are pending or ``flush_interval_s``
+    has passed since the last write. ``flush()`` forces a write and
+    ``close()`` flushes and closes the connection. Buffered rows are also
+    flushed if the collector is garbage collected or the interpreter exits.
+
+    With ``async_ingest=True``, ``push_worker_metrics`` and ``log_assignment``
+    only put the record on a bounded queue of ``queue_size`` items. A writer
+    thread applies queued records to memory and SQLite. When the queue is
+    full, ``backpressure`` decides what happens:
+      * ``"drop"``: the record is discarded;
+      * ``"sample"``: once the queue is half full only every
+        ``sample_every``-th record is admitted, and records are dropped
+        when it is full;
+      * ``"block"``: the producer waits.
+    ``ingest_stats()`` reports the counters. A record that fails to apply
+    is counted in ``errors`` (the exception is kept in ``last_error``) and
+    the thread moves on. Readers call ``drain()`` to see every record
+    pushed so far, and ``close()`` must be called to stop the thread.
+
+    Every flush also folds its rows into two rollup tables:
+    ``worker_metrics_minute`` (per minute and worker) and
+    ``assignment_epochs`` (per epoch and worker). ``compact()`` deletes raw
+    rows past their retention. That covers ``worker_metrics`` older than
+    ``raw_ttl_s`` before the newest sample, ``assignments`` more than
+    ``assignment_ttl_epochs`` epochs behind the newest, and minute rollups
+    older than ``rollup_ttl_s``. Their rollups keep the summary. Freed
+    pages go back to the filesystem. With any TTL set, compaction also runs
+    with the flush every ``compact_every_s``. Long jobs thus keep a bounded
+    database while the dashboard still sees the whole run.
+
+    With ``archive_path`` set, ``archive(epoch)`` appends the new telemetry
+    to epoch-partitioned Parquet or Arrow files (``archive_format``) for
+    offline training. ``shardsense.telemetry.archive`` reads them back. The
+    caller only copies out the new rows; the files are written on a
+    background thread. A failed write is counted in
+    ``ingest_stats()['archive_errors']`` (the exception is kept in
+    ``last_archive_error``) and its rows are skipped. ``close()`` waits for
+    pending writes.
     """
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        flush_rows: int = 512,
+        flush_interval_s: float = 1.0,
+        async_ingest: bool = False,
+        queue_size: int = 65536,
+        backpressure: str = "drop",
+        sample_every: int = 10,
+        history_capacity: int = 4096,
+        raw_ttl_s: Optional[float] = None,
+        assignment_ttl_epochs: Optional[int] = None,
+        rollup_ttl_s: Optional[float] = None,
+        compact_every_s: float = 300.0,
+        archive_path: Optional[str] = None,
+        archive_format: str = "parquet"
+    ):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{backpressure}'. Choose from {BACKPRESSURE_POLICIES}")
         self.db_path = db_path
-        self.worker_history: Dict[int, List[WorkerMetrics]] = {}
+        # Per-worker ring buffers holding the newest ``history_capacity`` samples
+        self.history_capacity = history_capacity
+        self.worker_history: Dict[int, WorkerHistory] = {}
         self.shard_registry: Dict[int, ShardMetrics] = {}
-        self.assignment_logs: List[AssignmentLog] = []
+        self.assignments = ColumnStore({**ASSIGNMENT_SCHEMA, **JOINED_SCHEMA})
+        # Logs [0, _joined) already carry their joined features
+        self._joined = 0
+        # Joined logs of registered shards only; created once a log of an unregistered shard is joined
+        self._training: Optional[ColumnStore] = None
+        self._join_lock = threading.Lock()
+
+        self.flush_rows = flush_rows
+        self.flush_interval_s = flush_interval_s
+        self._db_lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[Any, ...]]] = {_INSERT_WORKER: [], _INSERT_ASSIGNMENT: []}
+        self._n_pending = 0
+        self._last_flush = time.monotonic()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.raw_ttl_s = raw_ttl_s
+        self.assignment_ttl_epochs = assignment_ttl_epochs
+        self.rollup_ttl_s = rollup_ttl_s
+        self.compact_every_s = compact_every_s
+        self._last_compact = time.monotonic()
+        # Columnar copy of the telemetry for offline training (needs pyarrow)
+        self._archiver = TelemetryArchiver(archive_path, archive_format) if archive_path else None
+        self._archive_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="shardsense-archive") if archive_path else None
+        )
+        self.last_archive_error: Optional[BaseException] = None
         
         if self.db_path:
             self._init_db()
 
+        self.backpressure = backpressure
+        self.sample_every = sample_every
+        self._counters = {
+            "queued": 0, "dropped": 0, "sampled_out": 0, "applied": 0, "errors": 0, "archive_errors": 0
+        }
+        self._counter_lock = threading.Lock()
+        self._sample_tick = 0
+        self._queue: Optional["queue.Queue[Any]"] = None
+        self._writer: Optional[threading.Thread] = None
+        self.last_error: Optional[BaseException] = None
+        if async_ingest:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._writer = threading.Thread(target=self._writer_loop, name="shardsense-telemetry", daemon=True)
+            self._writer.start()
+
+    def _count(self, name: str):
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    def _check_writer(self):
+        """Raises instead of queueing for (or waiting on) a writer thread that has died."""
+        if self._writer is not None and not self._writer.is_alive():
+            raise RuntimeError("Telemetry writer thread has stopped") from self.last_error
+
+    def _submit(self, item: Tuple[str, Any]):
+        q = self._queue
+        assert q is not None
+        self._check_writer()
+        if self.backpressure == "block":
+            q.put(item)
+        else:
+            if self.backpressure == "sample" and q.qsize() >= q.maxsize // 2:
+                self._sample_tick += 1
+                if self._sample_tick % self.sample_every:
+                    self._count("sampled_out")
+                    return
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                self._count("dropped")
+                return
+        self._count("queued")
+
+    def _apply(self, item: Tuple[str, Any]):
+        kind, record = item
+        if kind == "worker":
+            self._ingest_worker_metrics(record)
+        else:
+            self._ingest_assignment(record)
+
+    def _writer_loop(self):
+        q = self._queue
+        assert q is not None
+        while True:
+            try:
+                item = q.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                # Idle: still honour the time-based flush
+                if self._conn is not None:
+                    try:
+                        with self._db_lock:
+                            if self._n_pending:
+                                self._flush_locked()
+                    except Exception as exc:
+                        self._fail(exc)
+                continue
+            try:
+                if item is _STOP:
+                    return
+                self._apply(item)
+                self._count("applied")
+            except Exception as exc:
+                # One bad record (or failed flush) must not stop ingestion
+                self._fail(exc)
+            finally:
+                q.task_done()
+
+    def _fail(self, exc: BaseException):
+        self.last_error = exc
+        self._count("errors")
+
+    def drain(self):
+        """Blocks until every queued record has been applied (no-op without async ingest)."""
+        q = self._queue
+        if q is None:
+            return
+        with q.all_tasks_done:
+            while q.unfinished_tasks:
+                # Re-checks the writer now and then rather than waiting forever on a dead thread
+                self._check_writer()
+                q.all_tasks_done.wait(timeout=0.1)
+
+    def ingest_stats(self) -> Dict[str, int]:
+        with self._counter_lock:
+            stats = dict(self._counters)
+        stats["backlog"] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
     def _init_db(self):
         if not self.db_path:
             return
-        conn = sqlite3.connect(self.db_path)
+        # Shared by loader threads and the planner thread; every use holds _db_lock
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # Lets compaction hand freed pages back; only takes effect on a new database
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL + NORMAL: commits don't fsync; a power loss can drop the last few, never corrupt
+        conn.execute('PRAGMA synchronous=NORMAL')
         c = conn.cursor()
         
         # Worker Metrics Table
@@ -32,6 +366,11 @@ class MetricsCollector:
             io_read_mb_s REAL,
             batch_time_ms REAL
         )''')
+        # Databases written by older versions lack the added columns
+        existing = {row[1] for row in c.execute('PRAGMA table_info(worker_metrics)')}
+        for name, decl in _ADDED_WORKER_COLUMNS:
+            if name not in existing:
+                c.execute(f'ALTER TABLE worker_metrics ADD COLUMN {name} {decl}')
         
         # Shard Registry
         c.execute('''CREATE TABLE IF NOT EXISTS shard_metadata (
@@ -47,83 +386,322 @@ class MetricsCollector:
             shard_id INTEGER,
             batch_time_ms REAL
         )''')
+
+        # Indexes behind the dashboard's recent-window and per-epoch queries
+        c.execute('CREATE INDEX IF NOT EXISTS worker_metrics_by_time ON worker_metrics (timestamp)')
+        c.execute('CREATE INDEX IF NOT EXISTS assignments_by_epoch_worker ON assignments (epoch, worker_id)')
+
+        tables = {row[0] for row in c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        c.execute('''CREATE TABLE IF NOT EXISTS worker_metrics_minute (
+            minute INTEGER,
+            worker_id INTEGER,
+            records INTEGER,
+            batches INTEGER,
+            batch_time_ms_sum REAL,
+            batch_p99_ms_max REAL,
+            cpu_util_sum REAL,
+            io_read_mb_s_sum REAL,
+            PRIMARY KEY (minute, worker_id)
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS assignment_epochs (
+            epoch INTEGER,
+            worker_id INTEGER,
+            shards INTEGER,
+            batch_time_ms_sum REAL,
+            PRIMARY KEY (epoch, worker_id)
+        )''')
+        if 'worker_metrics_minute' not in tables:
+            c.execute(_BACKFILL_MINUTE)
+        if 'assignment_epochs' not in tables:
+            c.execute(_BACKFILL_EPOCH)
         
         conn.commit()
-        conn.close()
+        self._conn = conn
+        self._finalizer = weakref.finalize(self, _flush_and_close, conn, self._pending, self._db_lock)
+
+    def _enqueue(self, sql: str, row: Tuple[Any, ...]):
+        with self._db_lock:
+            self._pending[sql].append(row)
+            self._n_pending += 1
+            due = time.monotonic() - self._last_flush >= self.flush_interval_s
+            if self._n_pending >= self.flush_rows or due:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._conn is not None:
+            _flush_rows(self._conn, self._pending)
+            retention = (self.raw_ttl_s, self.assignment_ttl_epochs, self.rollup_ttl_s)
+            if any(ttl is not None for ttl in retention) and (
+                time.monotonic() - self._last_compact >= self.compact_every_s
+            ):
+                self._compact_locked()
+        self._n_pending = 0
+        self._last_flush = time.monotonic()
+
+    def _compact_locked(self) -> Dict[str, int]:
+        conn = self._conn
+        assert conn is not None
+        deleted = {"worker_metrics": 0, "assignments": 0, "worker_metrics_minute": 0}
+        with conn:
+            if self.raw_ttl_s is not None:
+                deleted["worker_metrics"] = conn.execute(
+                    'DELETE FROM worker_metrics WHERE timestamp < (SELECT MAX(timestamp) FROM worker_metrics) - ?',
+                    (self.raw_ttl_s,)
+                ).rowcount
+            if self.assignment_ttl_epochs is not None:
+                deleted["assignments"] = conn.execute(
+                    'DELETE FROM assignments WHERE epoch < (SELECT MAX(epoch) FROM assignments) - ?',
+                    (self.assignment_ttl_epochs,)
+                ).rowcount
+            if self.rollup_ttl_s is not None:
+                deleted["worker_metrics_minute"] = conn.execute(
+                    'DELETE FROM worker_metrics_minute '
+                    'WHERE minute < (SELECT MAX(minute) FROM worker_metrics_minute) - ?',
+                    (int(self.rollup_ttl_s // 60),)
+                ).rowcount
+        conn.execute('PRAGMA incremental_vacuum').fetchall()
+        self._last_compact = time.monotonic()
+        return deleted
+
+    def archive(self, epoch: int) -> "Future[List[str]]":
+        """
+        Appends telemetry added since the last call to the columnar archive
+        (see ``TelemetryArchiver``). Returns at once with a future of the
+        files written; an already finished empty one without ``archive_path``.
+        """
+        done: "Future[List[str]]" = Future()
+        if self._archiver is None or self._archive_executor is None:
+            done.set_result([])
+            return done
+        self.drain()
+        parts = self._archiver.snapshot(self, epoch)
+        if not parts:
+            done.set_result([])
+            return done
+        return self._archive_executor.submit(self._write_archive, self._archiver, parts)
+
+    def _write_archive(self, archiver: TelemetryArchiver, parts: List[Tuple[Dict[str, np.ndarray], str]]) -> List[str]:
+        try:
+            return archiver.write_parts(parts)
+        except Exception as exc:
+            # A full disk or bad path must not surface in the training loop
+            self.last_archive_error = exc
+            self._count("archive_errors")
+            return []
+
+    def compact(self) -> Dict[str, int]:
+        """Flushes, then applies the retention settings now. Returns rows deleted per table."""
+        if self._conn is None:
+            return {}
+        self.drain()
+        with self._db_lock:
+            self._flush_locked()
+            return self._compact_locked()
+
+    def flush(self):
+        """Applies queued records and writes all buffered rows now."""
+        self.drain()
+        with self._db_lock:
+            self._flush_locked()
+
+    def close(self):
+        """Stops the writer thread, flushes buffered rows and closes the database connection."""
+        if self._writer is not None:
+            assert self._queue is not None
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+        if self._archive_executor is not None:
+            self._archive_executor.shutdown(wait=True)
+            self._archive_executor = None
+        if self._conn is not None:
+            self._finalizer()
+            self._conn = None
+
+    def __enter__(self) -> "MetricsCollector":
+        return self
+
+    def __exit__(self, *exc: Any):
+        self.close()
 
     def register_shard(self, shard: ShardMetrics):
-        self.shard_registry[shard.shard_id] = shard
-        db_path = self.db_path
-        if db_path:
-            with sqlite3.connect(db_path) as conn:
-                conn.execute(
-                    'INSERT OR REPLACE INTO shard_metadata (shard_id, size_mb, hotness) VALUES (?, ?, ?)',
-                    (shard.shard_id, shard.size_mb, shard.hotness_score)
+        self.register_shards([shard])
+
+    def register_shards(self, shards: List[ShardMetrics]):
+        """Registers many shards with one bulk insert, committed immediately."""
+        for shard in shards:
+            self.shard_registry[shard.shard_id] = shard
+        if self._conn is not None:
+            with self._db_lock, self._conn:
+                self._conn.executemany(
+                    _UPSERT_SHARD, [(s.shard_id, s.size_mb, s.hotness_score) for s in shards]
                 )
 
     def push_worker_metrics(self, metrics: WorkerMetrics):
+        if self._writer is not None:
+            self._submit(("worker", metrics))
+        else:
+            self._ingest_worker_metrics(metrics)
+
+    def _ingest_worker_metrics(self, metrics: WorkerMetrics):
         # 1. In-memory buffer for Model
         if metrics.worker_id not in self.worker_history:
-            self.worker_history[metrics.worker_id] = []
+            self.worker_history[metrics.worker_id] = WorkerHistory(self.history_capacity)
         self.worker_history[metrics.worker_id].append(metrics)
         
         # 2. Persistence for Dashboard
-        if self.db_path:
-            # Type narrowing via local assignment if needed, but simple check usually works. 
-            # Doing safe cast just in case.
-            path = self.db_path
-            with sqlite3.connect(path) as conn:
-                conn.execute(
-                    'INSERT INTO worker_metrics '
-                    '(timestamp, worker_id, cpu_util, io_read_mb_s, batch_time_ms) '
-                    'VALUES (?, ?, ?, ?, ?)',
-                    (
-                        metrics.timestamp, metrics.worker_id, metrics.cpu_util, 
-                        metrics.io_read_mb_s, metrics.batch_time_ms
-                    )
-                )
+        if self._conn is not None:
+            self._enqueue(_INSERT_WORKER, (
+                metrics.timestamp, metrics.worker_id, metrics.cpu_util,
+                metrics.io_read_mb_s, metrics.batch_time_ms, metrics.batch_count,
+                metrics.batch_p50_ms, metrics.batch_p95_ms, metrics.batch_p99_ms, metrics.bytes_per_batch
+            ))
 
     def log_assignment(self, log: AssignmentLog):
-        self.assignment_logs.append(log)
-        if self.db_path:
-             path = self.db_path
-             with sqlite3.connect(path) as conn:
-                conn.execute(
-                    'INSERT INTO assignments (epoch, worker_id, shard_id, batch_time_ms) '
-                    'VALUES (?, ?, ?, ?)',
-                    (log.epoch, log.worker_id, log.shard_id, log.mean_batch_time_ms)
-                )
+        if self._writer is not None:
+            self._submit(("assignment", log))
+        else:
+            self._ingest_assignment(log)
+
+    def _ingest_assignment(self, log: AssignmentLog):
+        with self._join_lock:
+            self.assignments.append(
+                epoch=log.epoch,
+                worker_id=log.worker_id,
+                shard_id=log.shard_id,
+                start_time=log.start_time,
+                end_time=log.end_time,
+                target_batch_time=log.mean_batch_time_ms,
+                **_UNJOINED
+            )
+        if self._conn is not None:
+            self._enqueue(_INSERT_ASSIGNMENT, (log.epoch, log.worker_id, log.shard_id, log.mean_batch_time_ms))
+
+    def _join_new(self):
+        """
+        Joins logs appended since the last call (caller holds ``_join_lock``).
+        Each log gets its worker's metrics averaged over the log's own
+        ``start_time``..``end_time`` window (see ``_window_means``) and the
+        shard metadata registered at join time. The cost is O(new logs) plus
+        a pass over the bounded histories of the workers involved.
+        """
+        n = len(self.assignments)
+        if self._joined == n:
+            return
+        new = self.assignments.snapshot()[self._joined:]
+        worker_io = np.full(len(new), 100.0)
+        worker_cpu = np.full(len(new), 0.5)
+        for wid in np.unique(new["worker_id"]).tolist():
+            history = self.worker_history.get(wid)
+            if not history:
+                continue
+            rows = np.flatnonzero(new["worker_id"] == wid)
+            worker_io[rows], worker_cpu[rows] = _window_means(
+                history.last(), new["start_time"][rows], new["end_time"][rows]
+            )
+
+        shard_ids, shard_pos = np.unique(new["shard_id"], return_inverse=True)
+        metas = [self.shard_registry.get(int(s)) for s in shard_ids]
+        shard_size = np.array([m.size_mb if m else np.nan for m in metas], dtype=np.float64)[shard_pos]
+        shard_diff = np.array([m.mean_decode_ms if m else np.nan for m in metas], dtype=np.float64)[shard_pos]
+
+        self.assignments.fill(
+            self._joined, worker_io=worker_io, worker_cpu=worker_cpu,
+            shard_size=shard_size, shard_difficulty=shard_diff
+        )
+        unknown = np.isnan(shard_size)
+        if self._training is None and unknown.any():
+            # Every earlier log had a registered shard, so copy them over once
+            self._training = self._training_store(self.assignments.snapshot()[:self._joined])
+        if self._training is not None:
+            joined = self.assignments.snapshot()[self._joined:n]
+            self._training.extend(**{name: joined[name][~unknown] for name in TRAINING_COLUMNS})
+        self._joined = n
+
+    def _training_store(self, logs: ColumnTable) -> ColumnStore:
+        """A store of the training columns of ``logs`` whose shard was registered."""
+        store = ColumnStore({name: self.assignments.schema[name] for name in TRAINING_COLUMNS})
+        known = ~np.isnan(logs["shard_size"])
+        store.extend(**{name: logs[name][known] for name in TRAINING_COLUMNS})
+        return store
+
+    def get_training_table(self) -> ColumnTable:
+        """
+        Assignment logs joined with shard metadata and the worker metrics
+        observed during each log, as columns. Only logs added since the last
+        call are joined; earlier rows are served from the cache. Logs of
+        shards that were unregistered when joined are dropped as they are
+        joined, so repeat calls cost O(new logs) either way.
+        """
+        with self._join_lock:
+            self._join_new()
+            if self._training is not None:
+                return self._training.snapshot()
+            logs = self.assignments.snapshot()
+        return ColumnTable({name: logs[name] for name in TRAINING_COLUMNS})
+
+    def joined_assignments(self) -> ColumnTable:
+        """
+        Every assignment log with its joined features, as views. Joining and
+        snapshotting happen under one lock, so a log appended meanwhile is
+        left for the next call instead of showing up unjoined.
+        """
+        with self._join_lock:
+            self._join_new()
+            return self.assignments.snapshot()[:self._joined]
 
     def get_training_data(self) -> List[Dict[str, Any]]:
         """
         Joins assignment logs with worker/shard stats to create training rows.
+        Row-dict view of ``get_training_table``.
         """
-        data = []
-        for log in self.assignment_logs:
-            shard_meta = self.shard_registry.get(log.shard_id)
-            if not shard_meta: 
-                continue
-                
-            worker_metrics_list = self.worker_history.get(log.worker_id, [])
-            last_wm = worker_metrics_list[-1] if worker_metrics_list else None
-            
-            row = {
-                "worker_id": log.worker_id,
-                "shard_id": log.shard_id,
-                "target_batch_time": log.mean_batch_time_ms,
-                "shard_size": shard_meta.size_mb,
-                "shard_difficulty": shard_meta.mean_decode_ms,
-            }
-            
-            if last_wm:
-                row.update({
-                    "worker_io": last_wm.io_read_mb_s,
-                    "worker_cpu": last_wm.cpu_util
-                })
-            else:
-                row.update({
-                    "worker_io": 100.0,
-                    "worker_cpu": 0.5
-                })
-            data.append(row)
-        return data
+        return self.get_training_table().to_rows()
+
+    def state_dict(self, max_worker_samples: int = 256, max_assignment_rows: int = 50_000) -> Dict[str, Any]:
+        """
+        Bounded in-memory telemetry summary for checkpoints: the newest
+        samples per worker, the shard registry and the newest assignment rows.
+        Safe to call from another thread (a background plan's checkpoint)
+        while loaders keep pushing.
+        """
+        workers = []
+        # list() copies in one step, so a worker or shard registered meanwhile can't break the iteration
+        for history in list(self.worker_history.values()):
+            recent = history.last(max_worker_samples)
+            workers.append({name: recent[name] for name in WORKER_FIELDS})
+        registry = list(self.shard_registry.values())
+        shard_fields = [f.name for f in fields(ShardMetrics)]
+        shards = {name: np.array([getattr(m, name) for m in registry]) for name in shard_fields}
+        logs = self.joined_assignments()
+        logs = logs[max(0, len(logs) - max_assignment_rows):]
+        return {"workers": workers, "shards": shards, "assignments": dict(logs.columns)}
+
+    def load_state_dict(self, state: Dict[str, Any]):
+        """Restores memory only; the SQLite database already holds everything persisted earlier."""
+        self.worker_history = {}
+        for columns in state["workers"]:
+            n = len(columns["timestamp"])
+            # Fields added since the checkpoint was written take their defaults
+            worker_columns = [
+                columns[f.name] if f.name in columns else np.full(n, f.default) for f in fields(WorkerMetrics)
+            ]
+            for values in zip(*(col.tolist() for col in worker_columns)):
+                m = WorkerMetrics(*values)
+                if m.worker_id not in self.worker_history:
+                    self.worker_history[m.worker_id] = WorkerHistory(self.history_capacity)
+                self.worker_history[m.worker_id].append(m)
+        shard_columns = state["shards"]
+        self.shard_registry = {}
+        for values in zip(*(shard_columns[f.name].tolist() for f in fields(ShardMetrics))):
+            shard = ShardMetrics(*values)
+            self.shard_registry[shard.shard_id] = shard
+        self.assignments = ColumnStore({**ASSIGNMENT_SCHEMA, **JOINED_SCHEMA})
+        if len(state["assignments"]["epoch"]):
+            self.assignments.extend(**state["assignments"])
+        # Restored rows keep the features they were joined with
+        self._joined = len(self.assignments)
+        logs = self.assignments.snapshot()
+        self._training = self._training_store(logs) if np.isnan(logs["shard_size"]).any() else None
+        if self._archiver is not None:
+            # The run that wrote the checkpoint already archived these
+            self._archiver.mark_archived(self)
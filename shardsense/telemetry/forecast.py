@@ -0,0 +1,156 @@
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from shardsense.telemetry.history import WorkerHistory
+from shardsense.telemetry.schema import WorkerMetrics
+
+# WorkerMetrics fields that are forecast, with the range each one is clamped to
+FORECAST_FIELDS: Tuple[Tuple[str, float, float], ...] = (
+    ("io_read_mb_s", 0.0, np.inf),
+    ("cpu_util", 0.0, np.inf),
+    ("net_rtt_ms", 0.0, np.inf),
+    ("cache_hit_rate", 0.0, 1.0),
+    ("batch_time_ms", 0.0, np.inf),
+)
+
+
+class _WorkerState:
+    """Damped-Holt state for one worker, one slot per forecast field."""
+    def __init__(self, x: np.ndarray):
+        self.level = x.copy()
+        self.trend = np.zeros_like(x)
+        self.dev = np.zeros_like(x)       # EW mean absolute one-step error
+        self.streak = np.zeros(len(x), dtype=np.int64)  # consecutive outliers, signed
+        self.n = 1
+        self.consumed = 1
+        self.regime_changes = 0
+
+
+class WorkerForecaster:
+    """
+    Turns each worker's ``WorkerMetrics`` stream into a forecast of where
+    it is heading, rather than where its last batch happened to land.
+
+    Every field is smoothed with damped Holt (level + trend, trend damped
+    by ``phi`` per step). A sample whose one-step error exceeds
+    ``outlier_k`` times the running mean absolute error (at least 1% of the
+    level) is clipped to that bound, so one noisy batch barely moves the
+    forecast. ``regime_after``
+    consecutive outliers on the same side are a regime change (thermal
+    throttling, a noisy neighbour, a recovered node). The level then jumps
+    to the new value and the trend is reset.
+    """
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        beta: float = 0.05,
+        phi: float = 0.9,
+        horizon: int = 50,
+        outlier_k: float = 4.0,
+        regime_after: int = 3,
+        warmup: int = 5
+    ):
+        self.alpha = alpha
+        self.beta = beta
+        self.phi = phi
+        self.horizon = horizon
+        self.outlier_k = outlier_k
+        self.regime_after = regime_after
+        self.warmup = warmup
+        self.states: Dict[int, _WorkerState] = {}
+        lows, highs = zip(*[(lo, hi) for _, lo, hi in FORECAST_FIELDS])
+        self._low = np.array(lows)
+        self._high = np.array(highs)
+
+    @staticmethod
+    def _vector(m: WorkerMetrics) -> np.ndarray:
+        return np.array([getattr(m, name) for name, _, _ in FORECAST_FIELDS], dtype=np.float64)
+
+    def update(self, worker_id: int, m: WorkerMetrics):
+        x = self._vector(m)
+        st = self.states.get(worker_id)
+        if st is None:
+            self.states[worker_id] = _WorkerState(x)
+            return
+        st.consumed += 1
+
+        pred = st.level + self.phi * st.trend
+        # An unreported field (NaN) carries no information; one reported for the first time starts at its value
+        x = np.where(np.isnan(x), pred, x)
+        pred = np.where(np.isnan(pred), x, pred)
+        err = np.nan_to_num(x - pred)
+        # 1% of the level as a floor, so a step on a perfectly flat series still counts
+        bound = self.outlier_k * np.maximum(st.dev, 0.01 * np.abs(pred))
+        outlier = (st.n >= self.warmup) & (np.abs(err) > bound) & (bound > 0)
+
+        side = np.sign(err).astype(np.int64)
+        same_side = np.sign(st.streak) == side
+        st.streak = np.where(outlier, np.where(same_side, st.streak + side, side), 0)
+        regime = np.abs(st.streak) >= self.regime_after
+        if regime.any():
+            st.regime_changes += 1
+        x_used = np.where(outlier & ~regime, pred + np.sign(err) * bound, x)
+
+        level = self.alpha * x_used + (1 - self.alpha) * pred
+        trend = self.beta * (level - st.level) + (1 - self.beta) * self.phi * st.trend
+        st.dev = np.nan_to_num(np.where(regime, st.dev, 0.2 * np.abs(x_used - pred) + 0.8 * st.dev))
+        # A new regime starts from its own level with no trend
+        st.level = np.where(regime, x, level)
+        st.trend = np.where(regime, 0.0, np.nan_to_num(trend))
+        st.streak = np.where(regime, 0, st.streak)
+        st.n += 1
+
+    def observe(self, worker_history: Mapping[int, Union[Sequence[WorkerMetrics], WorkerHistory]]):
+        """
+        Feeds every sample appended to ``worker_history`` since the last call.
+        Histories are plain lists or ``WorkerHistory`` ring buffers. For a
+        ring, ``total`` counts samples already overwritten, so positions stay
+        aligned after it wraps.
+        """
+        for wid, history in worker_history.items():
+            st = self.states.get(wid)
+            total = getattr(history, "total", len(history))
+            new = total - (st.consumed if st is not None else 0)
+            for m in history[len(history) - min(new, len(history)):]:
+                self.update(wid, m)
+            if wid in self.states:
+                self.states[wid].consumed = total
+
+    def forecast(self, worker_id: int) -> Optional[Dict[str, float]]:
+        """Expected metrics ``horizon`` samples ahead (None before any sample)."""
+        st = self.states.get(worker_id)
+        if st is None:
+            return None
+        steps = self.phi * (1 - self.phi ** self.horizon) / (1 - self.phi) if self.phi < 1 else self.horizon
+        value = np.clip(st.level + steps * st.trend, self._low, self._high)
+        return {name: float(v) for (name, _, _), v in zip(FORECAST_FIELDS, value)}
+
+    def regime_changes(self, worker_id: int) -> int:
+        st = self.states.get(worker_id)
+        return st.regime_changes if st is not None else 0
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {
+            "workers": [
+                {
+                    "worker_id": wid, "level": st.level, "trend": st.trend, "dev": st.dev,
+                    "streak": st.streak, "n": st.n, "regime_changes": st.regime_changes,
+                }
+                for wid, st in self.states.items()
+            ]
+        }
+
+    def load_state_dict(self, state: Dict[str, Any], consumed: Optional[Dict[int, int]] = None):
+        """``consumed``: per worker, how many samples of the restored history are already folded in."""
+        consumed = consumed or {}
+        self.states = {}
+        for w in state["workers"]:
+            st = _WorkerState(np.asarray(w["level"], dtype=np.float64))
+            st.trend = np.asarray(w["trend"], dtype=np.float64)
+            st.dev = np.asarray(w["dev"], dtype=np.float64)
+            st.streak = np.asarray(w["streak"], dtype=np.int64)
+            st.n = w["n"]
+            st.regime_changes = w["regime_changes"]
+            st.consumed = consumed.get(w["worker_id"], 0)
+            self.states[w["worker_id"]] = st
@@ -0,0 +1,89 @@
+from dataclasses import fields
+from typing import Iterator, List, Optional, Union, overload
+
+import numpy as np
+
+from shardsense.telemetry.schema import WorkerMetrics
+
+WORKER_FIELDS = tuple(f.name for f in fields(WorkerMetrics))
+# One packed record per WorkerMetrics: 8 bytes per field instead of a few hundred for the dataclass
+WORKER_DTYPE = np.dtype([
+    (name, np.int64 if name in ("worker_id", "batch_count") else np.float64) for name in WORKER_FIELDS
+])
+
+
+class WorkerHistory:
+    """
+    Fixed-capacity ring buffer of one worker's metrics, backed by a NumPy
+    structured array.
+
+    Appends are O(1). Once ``capacity`` samples are held, each append
+    overwrites the oldest one. It keeps the list-style access the rest of
+    the code uses: ``len``, truthiness, ``h[-1]``, ``h[0]`` and ``h[a:b]``
+    (oldest retained sample first) return ``WorkerMetrics``. Window queries
+    (``last``, ``between``, ``mean``, ``quantile``) work on whole columns.
+    ``total`` counts every sample ever appended, including overwritten ones.
+    """
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=WORKER_DTYPE)
+        self.start = 0
+        self.size = 0
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, m: WorkerMetrics):
+        pos = (self.start + self.size) % self.capacity
+        self.data[pos] = tuple(getattr(m, name) for name in WORKER_FIELDS)
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+        self.total += 1
+
+    def _positions(self, lo: int, hi: int) -> np.ndarray:
+        return (self.start + np.arange(lo, hi)) % self.capacity
+
+    @staticmethod
+    def _record(row: np.void) -> WorkerMetrics:
+        return WorkerMetrics(*row.tolist())
+
+    @overload
+    def __getitem__(self, key: int) -> WorkerMetrics: ...
+
+    @overload
+    def __getitem__(self, key: slice) -> List[WorkerMetrics]: ...
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[WorkerMetrics, List[WorkerMetrics]]:
+        if isinstance(key, slice):
+            lo, hi, step = key.indices(self.size)
+            return [self._record(row) for row in self.data[self._positions(lo, hi)][::step]]
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError("worker history index out of range")
+        return self._record(self.data[(self.start + key) % self.capacity])
+
+    def __iter__(self) -> Iterator[WorkerMetrics]:
+        return iter(self[:])
+
+    def last(self, n: Optional[int] = None) -> np.ndarray:
+        """The newest ``n`` samples (all retained if None) as a structured array, oldest first."""
+        n = self.size if n is None else min(n, self.size)
+        window: np.ndarray = self.data[self._positions(self.size - n, self.size)]
+        return window
+
+    def between(self, t0: float, t1: float) -> np.ndarray:
+        """Samples with ``t0 <= timestamp < t1``, oldest first."""
+        window = self.last()
+        ts = window["timestamp"]
+        selected: np.ndarray = window[(ts >= t0) & (ts < t1)]
+        return selected
+
+    def mean(self, field: str, n: Optional[int] = None) -> float:
+        return float(self.last(n)[field].mean()) if self.size else float("nan")
+
+    def quantile(self, field: str, q: float, n: Optional[int] = None) -> float:
+        return float(np.quantile(self.last(n)[field], q)) if self.size else float("nan")
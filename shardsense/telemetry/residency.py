@@ -0,0 +1,46 @@
+from typing import Any, Dict, List
+
+
+class ShardResidency:
+    """
+    Remembers which shards each worker held in recent epochs.
+    A shard last held ``k`` epochs ago is ``decay ** k`` warm (likely still in
+    page cache or on local NVMe); after ``horizon_epochs`` it is cold again.
+    """
+    def __init__(self, horizon_epochs: int = 3, decay: float = 0.5):
+        self.horizon_epochs = horizon_epochs
+        self.decay = decay
+        self.epoch = -1
+        # worker_id -> {shard_id: last epoch held}
+        self.last_held: Dict[int, Dict[int, int]] = {}
+
+    def record(self, assignments: Dict[int, List[int]], epoch: int):
+        """Marks every shard in ``assignments`` as held during ``epoch``."""
+        self.epoch = max(self.epoch, epoch)
+        for wid, sids in assignments.items():
+            held = self.last_held.setdefault(wid, {})
+            for sid in sids:
+                held[sid] = epoch
+
+        cutoff = self.epoch - self.horizon_epochs
+        for held in self.last_held.values():
+            for sid in [sid for sid, e in held.items() if e <= cutoff]:
+                del held[sid]
+
+    def warmth(self, worker_id: int) -> Dict[int, float]:
+        """Shard -> warmth in (0, 1] for shards this worker held recently."""
+        held = self.last_held.get(worker_id, {})
+        return {sid: self.decay ** (self.epoch - e) for sid, e in held.items()}
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {
+            "epoch": self.epoch,
+            "workers": [
+                {"worker_id": wid, "shards": list(held), "epochs": list(held.values())}
+                for wid, held in self.last_held.items()
+            ],
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]):
+        self.epoch = state["epoch"]
+        self.last_held = {w["worker_id"]: dict(zip(w["shards"], w["epochs"])) for w in state["workers"]}
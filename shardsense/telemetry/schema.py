@@ -1,3 +1,4 @@
+import math
 from dataclasses import dataclass
 
 
@@ -10,6 +11,17 @@ class WorkerMetrics:
     net_rtt_ms: float
     cache_hit_rate: float
     batch_time_ms: float # P50 or mean for the reporting window
+    # Window summary; a single-batch record leaves these at their defaults
+    batch_count: int = 1
+    batch_p50_ms: float = math.nan
+    batch_p95_ms: float = math.nan
+    batch_p99_ms: float = math.nan
+    bytes_per_batch: float = 0.0
+
+    def __post_init__(self):
+        for name in ("batch_p50_ms", "batch_p95_ms", "batch_p99_ms"):
+            if math.isnan(getattr(self, name)):
+                setattr(self, name, self.batch_time_ms)
 
 @dataclass
 class ShardMetrics:
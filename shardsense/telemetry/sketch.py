@@ -0,0 +1,69 @@
+import math
+from typing import Dict
+
+
+class DDSketch:
+    """
+    Streaming quantile sketch with a relative-error guarantee (DDSketch).
+
+    Each value goes into a logarithmic bucket. Bucket ``k`` covers
+    ``(gamma**(k-1), gamma**k]`` with ``gamma = (1 + a) / (1 - a)``, so any
+    quantile comes back within relative error ``a`` of the exact value.
+    Memory grows with log(max / min) of the values, not with their count.
+    Values at or below ``min_value`` share one zero bucket.
+    """
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.clear()
+
+    def clear(self):
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.count += 1
+        self.sum += x
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if x <= self.min_value:
+            self.zero_count += 1
+            return
+        k = math.ceil(math.log(x) / self._log_gamma)
+        self.bins[k] = self.bins.get(k, 0) + 1
+
+    def merge(self, other: "DDSketch"):
+        """Folds ``other`` (built with the same accuracy) into this sketch."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for k, n in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return self.min
+        seen = self.zero_count
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                # Midpoint (in relative terms) of the bucket, never outside the observed range
+                return min(max(2 * self.gamma ** k / (self.gamma + 1), self.min), self.max)
+        return self.max
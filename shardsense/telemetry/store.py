@@ -0,0 +1,84 @@
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+
+
+class ColumnTable:
+    """
+    Read-only set of equal-length NumPy columns.
+    Slicing with ``table[a:b]`` returns another table of views (no copies);
+    ``table["name"]`` returns one column.
+    """
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        self._len = len(next(iter(columns.values()))) if columns else 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, key: Union[str, slice]):
+        if isinstance(key, str):
+            return self.columns[key]
+        return ColumnTable({name: col[key] for name, col in self.columns.items()})
+
+    def with_columns(self, **extra: np.ndarray) -> "ColumnTable":
+        return ColumnTable({**self.columns, **extra})
+
+    def to_rows(self) -> List[Dict[str, Union[int, float]]]:
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*(self.columns[n].tolist() for n in names))]
+
+    def __iter__(self) -> Iterator[Dict[str, Union[int, float]]]:
+        return iter(self.to_rows())
+
+
+class ColumnStore:
+    """
+    Append-only columnar buffer. Each column is one preallocated NumPy array
+    (doubled when full) instead of a list of per-row Python objects.
+    ``snapshot()`` hands out views of the filled prefix. Later appends never
+    write into that prefix, so a snapshot stays valid while appends continue.
+    """
+    def __init__(self, schema: Dict[str, type], capacity: int = 1024):
+        self.schema = schema
+        self._size = 0
+        self._data: Dict[str, np.ndarray] = {name: np.empty(capacity, dtype=dtype) for name, dtype in schema.items()}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = len(next(iter(self._data.values())))
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity = max(2 * capacity, 1)
+        for name, col in self._data.items():
+            grown = np.empty(capacity, dtype=col.dtype)
+            grown[:self._size] = col[:self._size]
+            self._data[name] = grown
+
+    def append(self, **values: Union[int, float]):
+        self._reserve(1)
+        for name, col in self._data.items():
+            col[self._size] = values[name]
+        self._size += 1
+
+    def extend(self, **values: np.ndarray):
+        n = len(next(iter(values.values())))
+        self._reserve(n)
+        for name, col in self._data.items():
+            col[self._size:self._size + n] = values[name]
+        self._size += n
+
+    def fill(self, start: int, **values: np.ndarray):
+        """
+        Overwrites the named columns from row ``start`` onward, in place.
+        For columns computed after the rows were appended, such as joined features.
+        """
+        for name, col in values.items():
+            self._data[name][start:start + len(col)] = col
+
+    def snapshot(self) -> ColumnTable:
+        return ColumnTable({name: col[:self._size] for name, col in self._data.items()})
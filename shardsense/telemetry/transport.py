@@ -0,0 +1,392 @@
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+from dataclasses import fields
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Protocol, Tuple, Union
+
+import numpy as np
+
+from shardsense.telemetry.history import WORKER_DTYPE, WORKER_FIELDS
+from shardsense.telemetry.schema import AssignmentLog, WorkerMetrics
+
+# Wire records are fixed little-endian layouts, so frames decode on any host
+WIRE_WORKER_DTYPE = WORKER_DTYPE.newbyteorder("<")
+ASSIGNMENT_FIELDS = tuple(f.name for f in fields(AssignmentLog))
+WIRE_ASSIGNMENT_DTYPE = np.dtype([
+    (name, "<i8" if name in ("epoch", "worker_id", "shard_id") else "<f8") for name in ASSIGNMENT_FIELDS
+])
+
+KIND_WORKER = 1
+KIND_ASSIGNMENT = 2
+_DTYPES = {KIND_WORKER: WIRE_WORKER_DTYPE, KIND_ASSIGNMENT: WIRE_ASSIGNMENT_DTYPE}
+_FIELDS = {KIND_WORKER: WORKER_FIELDS, KIND_ASSIGNMENT: ASSIGNMENT_FIELDS}
+
+# Frame header: magic, record kind, record count
+_FRAME = struct.Struct("<4sBI")
+_MAGIC = b"SSTM"
+
+# Ring header: write index, read index, slot count, slot size, dropped (int64 each)
+_RING_HEADER = 64
+_SLOT_SIZE = 8 + max(WIRE_WORKER_DTYPE.itemsize, WIRE_ASSIGNMENT_DTYPE.itemsize)
+
+Address = Union[str, Tuple[str, int]]
+
+
+class TelemetrySink(Protocol):
+    """Anything loaders can report to: a ``MetricsCollector`` or a transport sender."""
+    def push_worker_metrics(self, metrics: WorkerMetrics): ...
+
+    def log_assignment(self, log: AssignmentLog): ...
+
+
+def _kind_of(record: Union[WorkerMetrics, AssignmentLog]) -> int:
+    return KIND_WORKER if isinstance(record, WorkerMetrics) else KIND_ASSIGNMENT
+
+
+def encode_frame(kind: int, records: List[Any]) -> bytes:
+    """One header plus ``records`` (all of ``kind``) packed as fixed-size binary rows."""
+    names = _FIELDS[kind]
+    rows = np.array([tuple(getattr(r, name) for name in names) for r in records], dtype=_DTYPES[kind])
+    return _FRAME.pack(_MAGIC, kind, len(records)) + rows.tobytes()
+
+
+def decode_records(kind: int, payload: Union[bytes, bytearray, memoryview]) -> List[Any]:
+    cls = WorkerMetrics if kind == KIND_WORKER else AssignmentLog
+    return [cls(*row) for row in np.frombuffer(payload, dtype=_DTYPES[kind]).tolist()]
+
+
+def _apply(sink: TelemetrySink, kind: int, records: List[Any]):
+    if kind == KIND_WORKER:
+        for m in records:
+            sink.push_worker_metrics(m)
+    else:
+        for log in records:
+            sink.log_assignment(log)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Opens an existing segment and drops the resource-tracker registration
+    that opening it adds before Python 3.13. Otherwise the tracker would
+    unlink the segment when the attaching process exits, while the owner
+    still uses it. Only this segment's entry is removed.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    return shm
+
+
+class ShmRing:
+    """
+    Single-producer, single-consumer ring of fixed-size binary records in
+    POSIX shared memory, for processes on the same host.
+
+    The consumer creates the ring (``ShmRing(slots=...)``) and hands
+    ``name`` to one producer process, which attaches with
+    ``ShmRing(name=...)``. The producer writes a slot and then advances the
+    write index. The consumer reads up to that index and then advances the
+    read index. Each index has a single writer, so no lock is needed. A
+    full ring drops the record (counted in ``dropped``) rather than block
+    the producer.
+    """
+    def __init__(self, name: Optional[str] = None, slots: int = 4096):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=_RING_HEADER + slots * _SLOT_SIZE)
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+        self.name = self.shm.name
+        self._header = np.ndarray((5,), dtype=np.int64, buffer=self.shm.buf)
+        if self.owner:
+            self._header[:] = (0, 0, slots, _SLOT_SIZE, 0)
+        self.slots = int(self._header[2])
+        self.slot_size = int(self._header[3])
+
+    @property
+    def dropped(self) -> int:
+        return int(self._header[4])
+
+    def __len__(self) -> int:
+        return int(self._header[0] - self._header[1])
+
+    def _slot(self, index: int) -> memoryview:
+        start = _RING_HEADER + (index % self.slots) * self.slot_size
+        buf = self.shm.buf
+        assert buf is not None
+        return buf[start:start + self.slot_size]
+
+    def push(self, record: Union[WorkerMetrics, AssignmentLog]) -> bool:
+        write = int(self._header[0])
+        if write - int(self._header[1]) >= self.slots:
+            self._header[4] += 1
+            return False
+        kind = _kind_of(record)
+        row = np.array(tuple(getattr(record, name) for name in _FIELDS[kind]), dtype=_DTYPES[kind])
+        slot = self._slot(write)
+        slot[0] = kind
+        slot[8:8 + row.nbytes] = row.tobytes()
+        # Publish only after the slot is fully written
+        self._header[0] = write + 1
+        return True
+
+    def push_worker_metrics(self, metrics: WorkerMetrics):
+        self.push(metrics)
+
+    def log_assignment(self, log: AssignmentLog):
+        self.push(log)
+
+    def drain_into(self, sink: TelemetrySink) -> int:
+        """Applies every published record to ``sink``; returns how many."""
+        read, write = int(self._header[1]), int(self._header[0])
+        for index in range(read, write):
+            slot = self._slot(index)
+            kind = slot[0]
+            _apply(sink, kind, decode_records(kind, slot[8:8 + _DTYPES[kind].itemsize]))
+        self._header[1] = write
+        return write - read
+
+    def close(self):
+        self._header = np.zeros(5, dtype=np.int64)
+        self.shm.close()
+        if self.owner:
+            if sys.version_info < (3, 13):
+                # An attacher sharing this process's tracker (forked producer) dropped the entry unlink() removes
+                resource_tracker.register(self.shm._name, "shared_memory")  # type: ignore[attr-defined]
+            self.shm.unlink()
+
+
+class SocketSender:
+    """
+    Sends telemetry to a ``TelemetryAggregator`` over TCP (``(host, port)``)
+    or a Unix socket (a path), for ranks on other hosts.
+
+    ``push_worker_metrics`` and ``log_assignment`` only append to a local
+    buffer. A sender thread ships the buffer as one binary frame per record
+    kind once ``batch_records`` are pending or ``flush_interval_s`` has
+    passed. Beyond ``max_pending`` buffered records, new ones are dropped
+    (counted in ``dropped``), so a slow or missing aggregator never stalls
+    the training step. A batch that fails to send is dropped, and the
+    connection is retried on the next batch. Create the sender in the
+    process that uses it.
+    """
+    def __init__(
+        self,
+        address: Address,
+        batch_records: int = 256,
+        flush_interval_s: float = 0.2,
+        max_pending: int = 65536
+    ):
+        self.address = address
+        self.batch_records = batch_records
+        self.flush_interval_s = flush_interval_s
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.sent = 0
+        self._pending: List[Union[WorkerMetrics, AssignmentLog]] = []
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._closing = False
+        self._sock: Optional[socket.socket] = None
+        self._thread = threading.Thread(target=self._run, name="shardsense-telemetry-sender", daemon=True)
+        self._thread.start()
+
+    def _submit(self, record: Union[WorkerMetrics, AssignmentLog]):
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_records:
+                self._cond.notify()
+
+    def push_worker_metrics(self, metrics: WorkerMetrics):
+        self._submit(metrics)
+
+    def log_assignment(self, log: AssignmentLog):
+        self._submit(log)
+
+    def _connect(self) -> socket.socket:
+        if isinstance(self.address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.connect(self.address)
+        return sock
+
+    def _send(self, batch: List[Union[WorkerMetrics, AssignmentLog]]):
+        by_kind: Dict[int, List[Any]] = {}
+        for record in batch:
+            by_kind.setdefault(_kind_of(record), []).append(record)
+        data = b"".join(encode_frame(kind, records) for kind, records in by_kind.items())
+        try:
+            if self._sock is None:
+                self._sock = self._connect()
+            self._sock.sendall(data)
+            self.sent += len(batch)
+        except OSError:
+            self.dropped += len(batch)
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closing and len(self._pending) < self.batch_records:
+                    self._cond.wait(self.flush_interval_s)
+                batch, self._pending = self._pending, []
+                self._in_flight = len(batch)
+                closing = self._closing
+            if batch:
+                self._send(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+            if closing and not batch:
+                return
+
+    def flush(self):
+        """Blocks until every record pushed so far has been sent (or dropped)."""
+        with self._cond:
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._pending and not self._in_flight)
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytearray]:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:])
+        if not k:
+            return None
+        got += k
+    return buf
+
+
+class _FrameHandler(socketserver.BaseRequestHandler):
+    server: Any
+
+    def handle(self):
+        aggregator: TelemetryAggregator = self.server.aggregator
+        while True:
+            header = _recv_exact(self.request, _FRAME.size)
+            if header is None:
+                return
+            magic, kind, count = _FRAME.unpack(header)
+            if magic != _MAGIC or kind not in _DTYPES:
+                return  # Not our protocol; drop the connection
+            payload = _recv_exact(self.request, count * _DTYPES[kind].itemsize)
+            if payload is None:
+                return
+            aggregator._deliver(kind, decode_records(kind, payload))
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    aggregator: "TelemetryAggregator"
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    aggregator: "TelemetryAggregator"
+
+
+class TelemetryAggregator:
+    """
+    Feeds telemetry from other processes into one ``MetricsCollector`` (or
+    any sink), next to the planner.
+
+    * Same host: ``add_ring()`` creates a ``ShmRing`` and returns its name
+      for one producer process. A poller thread drains the rings every
+      ``poll_interval_s``. ``poll()`` drains them right away, for example
+      before ``epoch_end``.
+    * Other hosts: ``serve(address)`` accepts ``SocketSender`` connections
+      on TCP or a Unix socket and returns the bound address (port 0 picks a
+      free port).
+
+    Records from either path go through ``sink.push_worker_metrics`` /
+    ``log_assignment``. ``received`` counts them.
+    """
+    def __init__(self, sink: TelemetrySink, poll_interval_s: float = 0.05):
+        self.sink = sink
+        self.poll_interval_s = poll_interval_s
+        self.received = 0
+        self.rings: List[ShmRing] = []
+        self._lock = threading.Lock()
+        self._servers: List[Union[_TCPServer, _UnixServer]] = []
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    def _deliver(self, kind: int, records: List[Any]):
+        with self._lock:
+            _apply(self.sink, kind, records)
+            self.received += len(records)
+
+    def add_ring(self, slots: int = 4096) -> str:
+        ring = ShmRing(slots=slots)
+        with self._lock:
+            self.rings.append(ring)
+        if self._poller is None:
+            self._poller = threading.Thread(target=self._poll_loop, name="shardsense-telemetry-poller", daemon=True)
+            self._poller.start()
+        return ring.name
+
+    def poll(self) -> int:
+        with self._lock:
+            n = sum(ring.drain_into(self.sink) for ring in self.rings)
+            self.received += n
+        return n
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval_s):
+            self.poll()
+
+    def serve(self, address: Address) -> Address:
+        server: Union[_TCPServer, _UnixServer]
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            server = _UnixServer(address, _FrameHandler)
+        else:
+            server = _TCPServer(address, _FrameHandler)
+        server.aggregator = self
+        self._servers.append(server)
+        threading.Thread(target=server.serve_forever, name="shardsense-telemetry-server", daemon=True).start()
+        bound: Address = server.server_address  # type: ignore[assignment]
+        return bound
+
+    def close(self):
+        """Stops the servers and the poller, drains the rings one last time and frees them."""
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+            if isinstance(server, _UnixServer):
+                os.unlink(server.server_address)  # type: ignore[arg-type]
+        self._servers = []
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+        self.poll()
+        for ring in self.rings:
+            ring.close()
+        self.rings = []
@@ -60,3 +60,25 @@ def test_measurable_loader():
         assert collector.last_metric.batch_time_ms >= 0.0
         
     assert batches == 5
+
+class RecordingCollector(MetricsCollector):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def push_worker_metrics(self, metrics):
+        self.records.append(metrics)
+
+def test_measurable_loader_aggregates_windows():
+    data = torch.randn(10, 1)
+    loader = DataLoader(TensorDataset(data), batch_size=1)
+
+    collector = RecordingCollector()
+    batches = sum(1 for _ in MeasurableDataLoader(loader, worker_id=3, collector=collector, window_batches=4))
+
+    assert batches == 10
+    # Two full windows and the partial last one
+    assert [m.batch_count for m in collector.records] == [4, 4, 2]
+    for m in collector.records:
+        assert m.worker_id == 3
+        assert 0.0 <= m.batch_p50_ms <= m.batch_p95_ms <= m.batch_p99_ms
@@ -0,0 +1,212 @@
+import random
+
+import numpy as np
+import pytest
+
+from shardsense.model.cache import PredictionCache
+from shardsense.model.features import FeatureBuilder
+from shardsense.model.online import OnlinePredictor
+from shardsense.model.predictor import HAS_XGB, RuntimePredictor
+
+
+def _states(num_workers=4, num_shards=6, seed=0):
+    rng = random.Random(seed)
+    worker_states = [
+        {"worker_id": w, "io_read_mb_s": rng.uniform(20, 200), "cpu_util": rng.uniform(0, 1)}
+        for w in range(num_workers)
+    ]
+    shard_states = [
+        {"shard_id": s, "size_mb": rng.uniform(10, 200), "mean_decode_ms": rng.uniform(1, 20)}
+        for s in range(num_shards)
+    ]
+    return worker_states, shard_states
+
+def _training_rows(n=200, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        io = rng.uniform(20, 200)
+        size = rng.uniform(10, 200)
+        diff = rng.uniform(1, 20)
+        rows.append({
+            "worker_id": rng.randrange(4),
+            "shard_id": rng.randrange(6),
+            "worker_io": io,
+            "worker_cpu": rng.uniform(0, 1),
+            "shard_size": size,
+            "shard_difficulty": diff,
+            "target_batch_time": size / io * 1000 + 10 * diff,
+        })
+    return rows
+
+def _pairwise(predictor, worker_states, shard_states):
+    return np.array(
+        [[predictor.predict_batch_time(w, s) for s in shard_states] for w in worker_states],
+        dtype=np.float32
+    )
+
+def test_predict_matrix_matches_pairwise_untrained():
+    predictor = RuntimePredictor()
+    worker_states, shard_states = _states()
+
+    matrix = predictor.predict_matrix(worker_states, shard_states)
+
+    assert matrix.shape == (4, 6)
+    assert matrix.dtype == np.float32
+    np.testing.assert_array_equal(matrix, _pairwise(predictor, worker_states, shard_states))
+
+def test_predict_matrix_matches_pairwise_trained():
+    predictor = RuntimePredictor()
+    predictor.train(_training_rows())
+    assert predictor.is_trained == HAS_XGB
+    worker_states, shard_states = _states()
+
+    matrix = predictor.predict_matrix(worker_states, shard_states)
+
+    np.testing.assert_array_equal(matrix, _pairwise(predictor, worker_states, shard_states))
+
+@pytest.mark.skipif(not HAS_XGB, reason="xgboost not installed")
+def test_incremental_training_adds_rounds_on_new_rows_only():
+    predictor = RuntimePredictor(incremental=True, incremental_rounds=5, full_refit_every=2)
+    rows = _training_rows(n=300)
+
+    predictor.train(rows[:100])
+    assert predictor.last_fit == {"mode": "full", "rows": 100}
+    assert predictor.model.get_booster().num_boosted_rounds() == 100
+
+    predictor.train(rows[:160])
+    assert predictor.last_fit == {"mode": "incremental", "rows": 60}
+    assert predictor.model.get_booster().num_boosted_rounds() == 105
+
+    predictor.train(rows[:220])
+    assert predictor.last_fit == {"mode": "incremental", "rows": 60}
+
+    # Periodic full refit starts over from a fresh booster
+    predictor.train(rows)
+    assert predictor.last_fit == {"mode": "full", "rows": 300}
+    assert predictor.model.get_booster().num_boosted_rounds() == 100
+
+@pytest.mark.skipif(not HAS_XGB, reason="xgboost not installed")
+def test_full_refit_uses_window_and_decay():
+    predictor = RuntimePredictor(window=120, sample_decay=0.5)
+    rows = _training_rows(n=200)
+
+    predictor.train(rows[:100])
+    predictor.train(rows)
+
+    assert predictor.last_fit == {"mode": "full", "rows": 120}
+    assert predictor.is_trained
+    worker_states, shard_states = _states()
+    assert np.all(predictor.predict_matrix(worker_states, shard_states) >= 1.0)
+
+@pytest.mark.skipif(not HAS_XGB, reason="xgboost not installed")
+def test_prediction_cache_hits_without_changing_results():
+    rows = _training_rows()
+    cached = RuntimePredictor()
+    uncached = RuntimePredictor(cache_max_bytes=0)
+    cached.train(rows)
+    uncached.train(rows)
+    worker_states, shard_states = _states()
+
+    first = cached.predict_matrix(worker_states, shard_states)
+    second = cached.predict_matrix(worker_states, shard_states)
+    np.testing.assert_array_equal(first, uncached.predict_matrix(worker_states, shard_states))
+    np.testing.assert_array_equal(second, first)
+    assert cached.cache.hits == 4 and cached.cache.misses == 4
+
+    pair = cached.predict_batch_time(worker_states[0], shard_states[0])
+    assert cached.predict_batch_time(worker_states[0], shard_states[0]) == pair
+    assert pair == uncached.predict_batch_time(worker_states[0], shard_states[0])
+
+    # A new model version starts from an empty cache
+    cached.train(rows)
+    assert len(cached.cache) == 0
+    cached.predict_matrix(worker_states, shard_states)
+    assert cached.cache.misses == 9
+
+def test_prediction_cache_evicts_least_recently_used():
+    cache = PredictionCache(max_bytes=3 * PredictionCache.ENTRY_OVERHEAD_BYTES)
+    for key in "abc":
+        cache.put(key, 1.0)
+    cache.get("a")
+    cache.put("d", 2.0)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1.0
+    assert cache.stats()["evictions"] == 1
+
+def test_online_predictor_starts_at_heuristic_and_learns():
+    worker_states, shard_states = _states()
+    online = OnlinePredictor()
+    np.testing.assert_allclose(
+        online.predict_matrix(worker_states, shard_states),
+        RuntimePredictor().predict_matrix(worker_states, shard_states),
+        rtol=1e-5
+    )
+
+    # Targets use 10 * difficulty instead of the heuristic's 100 * difficulty
+    rows = _training_rows(n=300)
+    online.train(rows[:200])
+    online.train(rows)
+    assert online.n_updates == 300
+
+    matrix = online.predict_matrix(worker_states, shard_states)
+    truth = np.array(
+        [[s["size_mb"] / w["io_read_mb_s"] * 1000 + 10 * s["mean_decode_ms"] for s in shard_states]
+         for w in worker_states]
+    )
+    np.testing.assert_allclose(matrix, truth, rtol=1e-2)
+    np.testing.assert_allclose(matrix, _pairwise(online, worker_states, shard_states), rtol=1e-6)
+
+def test_build_features_from_columns_matches_rows():
+    from shardsense.telemetry.store import ColumnTable
+
+    rows = _training_rows(n=20)
+    table = ColumnTable({name: np.array([r[name] for r in rows]) for name in rows[0]})
+    features = FeatureBuilder()
+
+    X = features.build_features(table)
+    assert X.dtype == np.float32 and X.flags["C_CONTIGUOUS"]
+    np.testing.assert_array_equal(X, features.build_features(rows))
+    np.testing.assert_array_equal(features.build_labels(table), features.build_labels(rows))
+
+def test_quantile_predictions_penalize_noisy_workers():
+    rng = random.Random(3)
+    rows = []
+    for i in range(400):
+        row = _training_rows(n=1, seed=i)[0]
+        row["worker_id"] = i % 2
+        # Worker 1 is 1.5x slow on a third of its batches
+        if row["worker_id"] == 1 and rng.random() < 1 / 3:
+            row["target_batch_time"] *= 1.5
+        rows.append(row)
+    worker_states, shard_states = _states(num_workers=2)
+
+    for predictor in (RuntimePredictor(), OnlinePredictor()):
+        # The second call scores the newer half against the model fitted on the first
+        predictor.train(rows[:200])
+        predictor.train(rows)
+        mean = predictor.predict_matrix(worker_states, shard_states)
+        tail = predictor.predict_matrix(worker_states, shard_states, quantile=0.95)
+        ratio = tail / mean
+        assert np.all(ratio >= 1.0)
+        assert ratio[1].min() > ratio[0].max() + 0.1
+
+@pytest.mark.skipif(not HAS_XGB, reason="xgboost not installed")
+def test_tail_factors_come_from_rows_the_model_has_not_seen():
+    rng = random.Random(4)
+    rows = []
+    for i in range(400):
+        row = _training_rows(n=1, seed=i)[0]
+        row["worker_id"] = i % 2
+        # Multiplicative noise whose 0.95 quantile is exp(1.645 * 0.3) ~ 1.64
+        row["target_batch_time"] *= rng.lognormvariate(0, 0.3)
+        rows.append(row)
+
+    predictor = RuntimePredictor()
+    predictor.train(rows[:200])
+    # A fresh fit has no rows it hasn't trained on yet
+    assert predictor.tails.factors([0, 1], 0.95).tolist() == [1.0, 1.0]
+    predictor.train(rows)
+    # In-sample residuals of the refit model would put this near 1.3
+    assert np.all(predictor.tails.factors([0, 1], 0.95) > 1.4)
@@ -1,5 +1,7 @@
+import numpy as np
+
 from shardsense.model.predictor import RuntimePredictor
-from shardsense.planner.solver import GreedyResharder
+from shardsense.planner.solver import GreedyResharder, LPTResharder
 
 
 class MockPredictor(RuntimePredictor):
@@ -7,6 +9,12 @@ class MockPredictor(RuntimePredictor):
         # Heuristic: Worker IO * Shard Difficulty
         return (100.0 / w_state["io_read_mb_s"]) * s_state["mean_decode_ms"]
 
+    def predict_matrix(self, worker_states, shard_states, quantile=None):
+        return np.array(
+            [[self.predict_batch_time(w, s) for s in shard_states] for w in worker_states],
+            dtype=np.float32
+        )
+
 def test_greedy_resharder_basic():
     predictor = MockPredictor()
     planner = GreedyResharder(predictor)
@@ -32,3 +40,273 @@ def test_greedy_resharder_basic():
     # Expectation: Should move at least one shard to Worker 0
     assert len(new_map[0]) > 0
     assert len(new_map[1]) < 2
+
+def _reference_greedy_plan(predictor, penalty, current_map, worker_states, shard_states):
+    """Original deep-copy/re-evaluate greedy loop, kept to pin the optimized planner."""
+    import copy
+
+    from shardsense.planner.cost import calculate_movement_cost
+
+    def evaluate_map(assignment_map):
+        return {
+            wid: sum(predictor.predict_batch_time(worker_states[wid], shard_states[sid]) for sid in sids)
+            for wid, sids in assignment_map.items()
+        }
+
+    sizes = {s: float(d["size_mb"]) for s, d in shard_states.items()}
+    best_map = copy.deepcopy(current_map)
+    current_times = evaluate_map(best_map)
+    best_objective = max(current_times.values())
+    for _ in range(50):
+        slowest = max(current_times, key=current_times.get)
+        fastest = min(current_times, key=current_times.get)
+        if slowest == fastest or not best_map[slowest]:
+            break
+        candidate_map = None
+        for sid in best_map[slowest]:
+            trial_map = copy.deepcopy(best_map)
+            trial_map[slowest].remove(sid)
+            trial_map[fastest].append(sid)
+            obj = max(evaluate_map(trial_map).values())
+            obj += calculate_movement_cost(current_map, trial_map, sizes) * penalty
+            if obj < best_objective:
+                best_objective = obj
+                candidate_map = trial_map
+        if candidate_map is None:
+            break
+        best_map = candidate_map
+        current_times = evaluate_map(best_map)
+    return best_map
+
+def test_greedy_resharder_matches_reference():
+    import random
+
+    rng = random.Random(7)
+    predictor = MockPredictor()
+    for trial in range(20):
+        num_workers = rng.randint(2, 8)
+        num_shards = rng.randint(num_workers, 60)
+        worker_states = {
+            w: {"worker_id": w, "io_read_mb_s": rng.choice([10.0, 50.0, 100.0, 200.0]), "cpu_util": 0.5}
+            for w in range(num_workers)
+        }
+        shard_states = {
+            s: {"shard_id": s, "size_mb": rng.uniform(1, 200), "mean_decode_ms": rng.choice([1.0, 2.0, 3.5])}
+            for s in range(num_shards)
+        }
+        current_map = {w: [] for w in range(num_workers)}
+        for s in range(num_shards):
+            current_map[rng.randrange(num_workers)].append(s)
+
+        penalty = rng.choice([0.0, 0.01, 0.05])
+        planner = GreedyResharder(predictor, movement_penalty_per_mb=penalty)
+        expected = _reference_greedy_plan(predictor, penalty, current_map, worker_states, shard_states)
+        assert planner.plan(current_map, worker_states, shard_states) == expected
+
+def _straggler_case(num_workers=4, num_shards=40):
+    # Worker 0 is 4x slower than the rest; shards start round-robin.
+    worker_states = {
+        w: {"worker_id": w, "io_read_mb_s": 25.0 if w == 0 else 100.0, "cpu_util": 0.5}
+        for w in range(num_workers)
+    }
+    shard_states = {
+        s: {"shard_id": s, "size_mb": 10.0 + s, "mean_decode_ms": 1.0 + (s % 3)}
+        for s in range(num_shards)
+    }
+    current_map = {w: [s for s in range(num_shards) if s % num_workers == w] for w in range(num_workers)}
+    return current_map, worker_states, shard_states
+
+def _makespan(predictor, assignment_map, worker_states, shard_states):
+    return max(
+        sum(predictor.predict_batch_time(worker_states[w], shard_states[s]) for s in sids)
+        for w, sids in assignment_map.items()
+    )
+
+def test_lpt_resharder_relieves_straggler():
+    predictor = MockPredictor()
+    current_map, worker_states, shard_states = _straggler_case()
+    planner = LPTResharder(predictor, movement_penalty_per_mb=0.0)
+
+    new_map = planner.plan(current_map, worker_states, shard_states)
+
+    assert sorted(s for sids in new_map.values() for s in sids) == sorted(shard_states)
+    assert len(new_map[0]) < len(current_map[0])
+    before = _makespan(predictor, current_map, worker_states, shard_states)
+    after = _makespan(predictor, new_map, worker_states, shard_states)
+    # Perfect balance for 4x/1x/1x/1x speeds is 4/13 of the slow worker's time
+    assert after < 0.5 * before
+
+def test_lpt_resharder_respects_movement_budget():
+    from shardsense.planner.cost import calculate_movement_cost
+
+    predictor = MockPredictor()
+    current_map, worker_states, shard_states = _straggler_case()
+    sizes = {s: d["size_mb"] for s, d in shard_states.items()}
+
+    for budget in [0.0, 30.0, 100.0]:
+        planner = LPTResharder(predictor, movement_penalty_per_mb=0.0, max_move_mb=budget)
+        new_map = planner.plan(current_map, worker_states, shard_states)
+        assert calculate_movement_cost(current_map, new_map, sizes) <= budget
+    assert new_map != current_map
+
+def test_local_search_escapes_move_only_optimum():
+    from shardsense.planner.search import LocalSearchResharder
+
+    predictor = MockPredictor()
+    # Equal workers; loads 6 vs 4. Any single move makes things worse, a swap balances 5/5.
+    worker_states = {w: {"worker_id": w, "io_read_mb_s": 100.0, "cpu_util": 0.5} for w in range(2)}
+    shard_states = {
+        s: {"shard_id": s, "size_mb": 1.0, "mean_decode_ms": d}
+        for s, d in enumerate([3.0, 3.0, 2.0, 2.0])
+    }
+    current_map = {0: [0, 1], 1: [2, 3]}
+
+    greedy_map = GreedyResharder(predictor, movement_penalty_per_mb=0.0).plan(
+        current_map, worker_states, shard_states
+    )
+    assert greedy_map == current_map
+
+    planner = LocalSearchResharder(
+        predictor, movement_penalty_per_mb=0.0, time_budget_s=1.0, max_iters=20, warm_start=False
+    )
+    new_map = planner.plan(current_map, worker_states, shard_states)
+    assert _makespan(predictor, new_map, worker_states, shard_states) == 5.0
+
+def test_local_search_never_worse_than_input():
+    from shardsense.planner.search import LocalSearchResharder
+
+    predictor = MockPredictor()
+    current_map, worker_states, shard_states = _straggler_case(num_workers=6, num_shards=60)
+    before = _makespan(predictor, current_map, worker_states, shard_states)
+
+    for anneal in [False, True]:
+        planner = LocalSearchResharder(
+            predictor, movement_penalty_per_mb=0.0, time_budget_s=0.5, anneal=anneal, max_iters=300
+        )
+        new_map = planner.plan(current_map, worker_states, shard_states)
+        assert sorted(s for sids in new_map.values() for s in sids) == sorted(shard_states)
+        assert _makespan(predictor, new_map, worker_states, shard_states) < before
+
+def test_shard_location_index_tracks_movement_cost():
+    from shardsense.planner.cost import ShardLocationIndex, calculate_movement_cost
+
+    shard_states = {s: {"shard_id": s, "size_mb": float(s + 1), "mean_decode_ms": 1.0} for s in range(6)}
+    sizes = {s: d["size_mb"] for s, d in shard_states.items()}
+    current_map = {10: [0, 1, 2], 20: [3, 4], 30: [5]}
+    index = ShardLocationIndex(current_map, shard_states)
+
+    row = index.row[1]
+    assert index.move_delta(row, index.worker_index[20]) == 2.0
+    index.move(row, index.worker_index[20])
+    index.move(index.row[5], index.worker_index[10])
+    assert index.moved_mb == calculate_movement_cost(current_map, index.to_map(), sizes) == 8.0
+    assert index.to_map() == {10: [0, 2, 5], 20: [3, 4, 1], 30: []}
+
+    # Moving between two non-owners costs nothing extra; going home cancels the cost
+    assert index.move_delta(row, index.worker_index[30]) == 0.0
+    index.move(row, index.worker_index[10])
+    assert index.moved_mb == 6.0
+    assert index.to_map() == {10: [0, 1, 2, 5], 20: [3, 4], 30: []}
+
+def test_measured_zero_hit_rate_gets_no_warmth_discount():
+    from shardsense.planner.cost import ShardLocationIndex
+
+    shard_states = {s: {"shard_id": s, "size_mb": 10.0, "mean_decode_ms": 1.0} for s in range(2)}
+    current_map = {0: [0, 1], 1: []}
+
+    def fetch_cost(**state):
+        workers = {0: {}, 1: {"resident_shards": {0: 1.0}, **state}}
+        index = ShardLocationIndex(current_map, shard_states, workers)
+        return index.fetch_cost(index.row[0], index.worker_index[1])
+
+    # Not reported: residency alone decides
+    assert fetch_cost() == fetch_cost(cache_hit_rate=None) == fetch_cost(cache_hit_rate=float("nan")) == 0.0
+    assert fetch_cost(cache_hit_rate=0.5) == 5.0
+    assert fetch_cost(cache_hit_rate=0.0) == 10.0
+
+def test_lpt_prefers_warm_and_nearby_receivers():
+    predictor = MockPredictor()
+    # Worker 0 is overloaded; workers 1 and 2 are identical and idle.
+    shard_states = {s: {"shard_id": s, "size_mb": 100.0, "mean_decode_ms": 1.0} for s in range(4)}
+    current_map = {0: [0, 1, 2, 3], 1: [], 2: []}
+
+    def states(**extra):
+        base = {w: {"worker_id": w, "io_read_mb_s": 100.0, "cpu_util": 0.5} for w in range(3)}
+        for w, fields in extra.items():
+            base[int(w[1:])].update(fields)
+        return base
+
+    planner = LPTResharder(predictor, movement_penalty_per_mb=0.001)
+
+    # Without locality information the tie between workers 1 and 2 goes to worker 1
+    assert 0 in planner.plan(current_map, states(), shard_states)[1]
+
+    # Shard 0 is still cached on worker 2
+    new_map = planner.plan(current_map, states(w2={"resident_shards": {0: 1.0}}), shard_states)
+    assert 0 in new_map[2]
+
+    # Worker 1 sits far away on the network
+    new_map = planner.plan(current_map, states(w1={"net_rtt_ms": 50.0}), shard_states)
+    assert 0 in new_map[2]
+
+def _two_node_case():
+    # 2 nodes x 2 devices. Node 0's devices are 4x slower; device 1 holds everything on node 0.
+    worker_states = {
+        w: {"worker_id": w, "io_read_mb_s": 25.0 if w < 2 else 100.0, "cpu_util": 0.5}
+        for w in range(4)
+    }
+    shard_states = {s: {"shard_id": s, "size_mb": 10.0, "mean_decode_ms": 1.0} for s in range(16)}
+    current_map = {0: [], 1: list(range(8)), 2: list(range(8, 12)), 3: list(range(12, 16))}
+    return current_map, worker_states, shard_states
+
+def test_hierarchical_resharder_balances_nodes_then_devices():
+    from shardsense.planner.hierarchy import HierarchicalResharder
+
+    predictor = MockPredictor()
+    current_map, worker_states, shard_states = _two_node_case()
+    planner = HierarchicalResharder(predictor, devices_per_node=2, inter_node_penalty_per_mb=0.0,
+                                    intra_node_penalty_per_mb=0.0)
+
+    new_map = planner.plan(current_map, worker_states, shard_states)
+
+    assert sorted(s for sids in new_map.values() for s in sids) == sorted(shard_states)
+    # Work flows to the fast node, and the idle device on node 0 picks up some of the rest
+    assert len(new_map[2]) + len(new_map[3]) > 8
+    assert new_map[0]
+    assert _makespan(predictor, new_map, worker_states, shard_states) < \
+        _makespan(predictor, current_map, worker_states, shard_states) / 2
+
+def test_hierarchical_resharder_budget_only_limits_cross_node_moves():
+    from shardsense.planner.hierarchy import HierarchicalResharder
+
+    predictor = MockPredictor()
+    current_map, worker_states, shard_states = _two_node_case()
+    planner = HierarchicalResharder(predictor, topology={0: [0, 1], 1: [2, 3]}, max_move_mb=0.0,
+                                    intra_node_penalty_per_mb=0.0)
+
+    new_map = planner.plan(current_map, worker_states, shard_states)
+
+    assert sorted(new_map[0] + new_map[1]) == list(range(8))
+    assert new_map[0]
+
+class NoisyWorkerPredictor(MockPredictor):
+    """Worker 1 has a 1.5x upper tail."""
+    def predict_matrix(self, worker_states, shard_states, quantile=None):
+        costs = super().predict_matrix(worker_states, shard_states)
+        if quantile is not None:
+            costs[[w["worker_id"] == 1 for w in worker_states]] *= 1.5
+        return costs
+
+def test_lpt_quantile_objective_unloads_noisy_worker():
+    worker_states = {w: {"worker_id": w, "io_read_mb_s": 100.0, "cpu_util": 0.5} for w in range(2)}
+    shard_states = {s: {"shard_id": s, "size_mb": 1.0, "mean_decode_ms": 10.0} for s in range(10)}
+    current_map = {0: [0, 1, 2, 3, 4], 1: [5, 6, 7, 8, 9]}
+    predictor = NoisyWorkerPredictor()
+
+    mean_plan = LPTResharder(predictor, movement_penalty_per_mb=0.0).plan(current_map, worker_states, shard_states)
+    tail_plan = LPTResharder(predictor, movement_penalty_per_mb=0.0, quantile=0.95).plan(
+        current_map, worker_states, shard_states
+    )
+
+    assert [len(mean_plan[w]) for w in (0, 1)] == [5, 5]
+    assert [len(tail_plan[w]) for w in (0, 1)] == [6, 4]
@@ -0,0 +1,269 @@
+import threading
+
+import numpy as np
+import pytest
+import torch
+from torch.utils.data import TensorDataset
+
+from shardsense.model.online import OnlinePredictor
+from shardsense.runtime.engine import ShardSenseRuntime
+from shardsense.telemetry.schema import WorkerMetrics
+
+
+class SlowPlanner:
+    """Reverses every worker's shard list once released."""
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def plan(self, current_map, worker_states, shard_states):
+        self.release.wait(timeout=5.0)
+        self.calls += 1
+        return {w: list(reversed(sids)) for w, sids in current_map.items()}
+
+class CountingPlanner:
+    def __init__(self):
+        self.calls = 0
+
+    def plan(self, current_map, worker_states, shard_states):
+        self.calls += 1
+        return current_map
+
+def _runtime(**kwargs):
+    ds = TensorDataset(torch.randn(40, 1))
+    return ShardSenseRuntime(ds, num_shards=8, num_workers=2, batch_size=4, **kwargs)
+
+def _report(runtime, worker_id, batch_time_ms, io=100.0, n=5):
+    for _ in range(n):
+        runtime.collector.push_worker_metrics(WorkerMetrics(
+            timestamp=0.0, worker_id=worker_id, cpu_util=0.5, io_read_mb_s=io,
+            net_rtt_ms=0.0, cache_hit_rate=0.0, batch_time_ms=batch_time_ms
+        ))
+
+def test_sync_epoch_end_records_boundary_stats():
+    seen = []
+    runtime = _runtime(stats_hook=seen.append)
+    for batch in runtime.get_dataloader(0):
+        pass
+    runtime.epoch_end(0)
+
+    assert len(runtime.boundary_stats) == 1
+    assert runtime.boundary_stats[0]["mode"] == "sync"
+    assert runtime.boundary_stats[0]["boundary_stall_ms"] >= 0.0
+    assert seen == runtime.boundary_stats
+
+def test_async_plan_is_swapped_in_at_next_epoch_start():
+    runtime = _runtime(async_planning=True)
+    planner = SlowPlanner()
+    runtime.planner = planner
+    before = {w: list(sids) for w, sids in runtime.assignments.items()}
+
+    runtime.get_dataloader(0)
+    runtime.epoch_end(0)
+    # Planner is still blocked: the boundary returned without waiting for it
+    assert planner.calls == 0
+    assert runtime.boundary_stats[-1]["mode"] == "async"
+
+    # A second boundary while the first plan is in flight is skipped, not queued
+    runtime.epoch_end(1)
+    assert runtime.boundary_stats[-1]["skipped"] == "planner_busy"
+
+    planner.release.set()
+    runtime.wait_for_plan(timeout=5.0)
+    # Staged only; the live map changes when the next epoch's first loader is built
+    assert runtime.assignments == before
+    runtime.get_dataloader(1)
+    assert runtime.assignments == {w: list(reversed(sids)) for w, sids in before.items()}
+    assert planner.calls == 1
+    runtime.close()
+
+def test_async_stats_hook_sees_gate_fields():
+    seen = []
+    runtime = _runtime(async_planning=True, rebalance_min_gain=0.05, stats_hook=seen.append)
+    runtime.planner = CountingPlanner()
+    _report(runtime, 0, 100.0, io=1.0)
+    _report(runtime, 1, 10.0, io=100.0)
+    runtime.epoch_end(0)
+    runtime.wait_for_plan(timeout=5.0)
+    runtime.close()
+
+    assert len(seen) == 1
+    assert seen[0]["predicted_gain"] > 0.05
+    assert "boundary_stall_ms" in seen[0]
+
+def test_failed_background_plan_is_reported_and_raised():
+    class FailingPlanner:
+        def plan(self, current_map, worker_states, shard_states):
+            raise RuntimeError("boom")
+
+    seen = []
+    runtime = _runtime(async_planning=True, stats_hook=seen.append)
+    runtime.planner = FailingPlanner()
+    runtime.epoch_end(0)
+    with pytest.raises(RuntimeError):
+        runtime.wait_for_plan(timeout=5.0)
+    runtime._executor.shutdown(wait=True)
+
+    assert "boom" in seen[0]["error"]
+    assert isinstance(runtime.last_plan_error, RuntimeError)
+    with pytest.raises(RuntimeError, match="Background planning failed"):
+        runtime.epoch_end(1)
+    # Raised once, not on every later call
+    runtime.close()
+
+    # Or by close() when no boundary follows
+    runtime = _runtime(async_planning=True)
+    runtime.planner = FailingPlanner()
+    runtime.epoch_end(0)
+    with pytest.raises(RuntimeError, match="Background planning failed"):
+        runtime.close()
+
+def test_gate_skips_balanced_cluster():
+    runtime = _runtime(rebalance_min_gain=0.05)
+    planner = CountingPlanner()
+    runtime.planner = planner
+    _report(runtime, 0, 50.0)
+    _report(runtime, 1, 51.0)
+    runtime.epoch_end(0)
+
+    assert runtime.boundary_stats[-1]["skipped"] == "observed_spread_below_threshold"
+    assert planner.calls == 0
+
+def test_gate_skips_when_model_predicts_no_gain():
+    # Observed times are skewed, but the model sees two identical workers
+    runtime = _runtime(rebalance_min_gain=0.05)
+    planner = CountingPlanner()
+    runtime.planner = planner
+    _report(runtime, 0, 100.0)
+    _report(runtime, 1, 10.0)
+    runtime.epoch_end(0)
+
+    assert runtime.boundary_stats[-1]["skipped"] == "predicted_gain_below_threshold"
+    assert runtime.boundary_stats[-1]["predicted_gain"] == 0.0
+    assert planner.calls == 0
+
+def test_gate_lets_real_imbalance_through():
+    runtime = _runtime(rebalance_min_gain=0.05)
+    planner = CountingPlanner()
+    runtime.planner = planner
+    _report(runtime, 0, 100.0, io=1.0)
+    _report(runtime, 1, 10.0, io=100.0)
+    runtime.epoch_end(0)
+
+    assert "skipped" not in runtime.boundary_stats[-1]
+    assert runtime.boundary_stats[-1]["predicted_gain"] > 0.05
+    assert planner.calls == 1
+
+def test_gate_prices_moves_with_hierarchical_penalties():
+    options = {"inter_node_penalty_per_mb": 1e6, "intra_node_penalty_per_mb": 1e6}
+    runtime = _runtime(rebalance_min_gain=0.05, planner="hierarchical", planner_options=options)
+    _report(runtime, 0, 100.0, io=1.0)
+    _report(runtime, 1, 10.0, io=100.0)
+    before = {w: list(sids) for w, sids in runtime.assignments.items()}
+    runtime.epoch_end(0)
+
+    assert runtime.boundary_stats[-1]["skipped"] == "predicted_gain_below_movement_cost"
+    assert runtime.assignments == before
+
+def test_gate_prices_moves_like_the_planner():
+    runtime = _runtime(rebalance_min_gain=0.0, planner="lpt", planner_options={"quantile": 0.95})
+    worker_states, shard_states = runtime._planner_inputs()
+    worker_states[0]["io_read_mb_s"] = 1.0
+    current_map = {w: list(sids) for w, sids in runtime.assignments.items()}
+    seen = []
+    predict_matrix = runtime.predictor.predict_matrix
+
+    def spy(workers, shards, quantile=None):
+        seen.append(quantile)
+        return predict_matrix(workers, shards, quantile=quantile)
+
+    runtime.predictor.predict_matrix = spy
+    assert runtime._gate_on_predicted_gain(current_map, worker_states, shard_states, {}) is None
+    assert seen == [0.95]
+
+    # Cold fetches over a slow link cost more than the gain...
+    for state in worker_states.values():
+        state["net_rtt_ms"] = 1e9
+    assert (
+        runtime._gate_on_predicted_gain(current_map, worker_states, shard_states, {})
+        == "predicted_gain_below_movement_cost"
+    )
+    # ...unless a receiver still holds one of the other worker's shards
+    worker_states[1]["resident_shards"] = {current_map[0][0]: 1.0}
+    assert runtime._gate_on_predicted_gain(current_map, worker_states, shard_states, {}) is None
+
+def test_runtime_selects_predictor_by_name():
+    assert isinstance(_runtime(predictor="online").predictor, OnlinePredictor)
+    with pytest.raises(ValueError):
+        _runtime(predictor="nope")
+
+def _log_epoch(runtime, epoch):
+    from shardsense.telemetry.schema import AssignmentLog
+
+    for w, sids in runtime.assignments.items():
+        for sid in sids:
+            runtime.collector.log_assignment(AssignmentLog(epoch, w, sid, 0.0, 1.0, 100.0 if w == 0 else 20.0))
+
+@pytest.mark.parametrize("predictor", ["xgboost", "online"])
+def test_checkpoint_restores_plan_model_and_telemetry(tmp_path, predictor):
+    path = str(tmp_path / "runtime.ckpt")
+    runtime = _runtime(planner="lpt", predictor=predictor, checkpoint_path=path)
+    for epoch in range(8):
+        _report(runtime, 0, 100.0, io=10.0)
+        _report(runtime, 1, 20.0, io=100.0)
+        _log_epoch(runtime, epoch)
+        runtime.epoch_end(epoch)
+
+    restored = _runtime(planner="lpt", predictor=predictor, checkpoint_path=path)
+
+    assert restored.assignments == runtime.assignments
+    assert restored.assignments != {0: [0, 2, 4, 6], 1: [1, 3, 5, 7]}
+    assert restored.predictor.is_trained
+    _, shard_states = runtime._planner_inputs()
+    worker_states, _ = restored._planner_inputs()
+    states = [worker_states[w] for w in range(2)]
+    np.testing.assert_array_equal(
+        restored.predictor.predict_matrix(states, list(shard_states.values())),
+        runtime.predictor.predict_matrix(states, list(shard_states.values()))
+    )
+    assert restored.forecaster.forecast(1) == runtime.forecaster.forecast(1)
+    assert restored.residency.warmth(0) == runtime.residency.warmth(0)
+    assert len(restored.collector.get_training_table()) == len(runtime.collector.get_training_table())
+
+    # Restored rows are not learned twice
+    restored.epoch_end(8)
+    if predictor == "online":
+        assert restored.predictor.n_updates == runtime.predictor.n_updates
+
+def test_checkpoint_of_another_predictor_kind_is_rejected(tmp_path):
+    path = str(tmp_path / "runtime.ckpt")
+    runtime = _runtime(predictor="online")
+    runtime.save_checkpoint(path)
+
+    with pytest.raises(ValueError, match="'online' predictor"):
+        _runtime(predictor="xgboost", checkpoint_path=path)
+
+def test_resume_trains_on_new_rows_despite_unregistered_shard_logs(tmp_path):
+    from shardsense.telemetry.schema import AssignmentLog
+
+    path = str(tmp_path / "runtime.ckpt")
+    runtime = _runtime(planner="lpt", predictor="online", checkpoint_path=path)
+    for epoch in range(8):
+        _report(runtime, 0, 100.0, io=10.0)
+        _report(runtime, 1, 20.0, io=100.0)
+        _log_epoch(runtime, epoch)
+        # Shard 99 was never registered, so its logs never reach the training table
+        runtime.collector.log_assignment(AssignmentLog(epoch, 0, 99, 0.0, 1.0, 50.0))
+        runtime.epoch_end(epoch)
+
+    restored = _runtime(planner="lpt", predictor="online", checkpoint_path=path)
+    for rt in (runtime, restored):
+        _log_epoch(rt, 8)
+        rt.epoch_end(8)
+    assert restored.predictor.n_updates == runtime.predictor.n_updates
+
+def test_checkpoint_rejects_other_topology(tmp_path):
+    path = str(tmp_path / "runtime.ckpt")
+    _runtime().save_checkpoint(path)
+    with pytest.raises(ValueError):
+        ShardSenseRuntime(TensorDataset(torch.randn(40, 1)), num_shards=4, num_workers=2, checkpoint_path=path)
@@ -3,19 +3,23 @@ import sqlite3
 
 import pytest
 
-from shardsense.telemetry.collector import MetricsCollector
+from shardsense.telemetry.collector import _STOP, MetricsCollector
 from shardsense.telemetry.schema import ShardMetrics, WorkerMetrics
 
 DB_PATH = "test_metrics.db"
 
+def _remove_db():
+    for path in (DB_PATH, DB_PATH + "-wal", DB_PATH + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
 @pytest.fixture
 def collector():
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+    _remove_db()
     col = MetricsCollector(db_path=DB_PATH)
     yield col
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+    col.close()
+    _remove_db()
 
 def test_collector_in_memory(collector):
     m = WorkerMetrics(1.0, 1, 50.0, 100.0, 10.0, 0.5, 200.0)
@@ -27,6 +31,7 @@ def test_collector_in_memory(collector):
 def test_collector_persistence(collector):
     m = WorkerMetrics(1.0, 1, 50.0, 100.0, 10.0, 0.5, 200.0)
     collector.push_worker_metrics(m)
+    collector.flush()
     
     # Verify DB write
     conn = sqlite3.connect(DB_PATH)
@@ -52,3 +57,546 @@ def test_shard_registration(collector):
     conn.close()
     
     assert row is not None
+
+def test_shard_residency_decays_and_expires():
+    from shardsense.telemetry.residency import ShardResidency
+
+    residency = ShardResidency(horizon_epochs=2, decay=0.5)
+    residency.record({0: [1, 2], 1: [3]}, epoch=0)
+    residency.record({0: [1], 1: [2, 3]}, epoch=1)
+
+    assert residency.warmth(0) == {1: 1.0, 2: 0.5}
+    assert residency.warmth(1) == {2: 1.0, 3: 1.0}
+
+    residency.record({0: [1], 1: [3]}, epoch=2)
+    assert residency.warmth(0) == {1: 1.0}
+    assert residency.warmth(1) == {2: 0.5, 3: 1.0}
+
+def test_column_store_grows_and_snapshots_stay_valid():
+    import numpy as np
+
+    from shardsense.telemetry.store import ColumnStore
+
+    store = ColumnStore({"a": np.int64, "b": np.float64}, capacity=2)
+    store.append(a=1, b=0.5)
+    snap = store.snapshot()
+    store.extend(a=np.arange(2, 6), b=np.ones(4))
+
+    assert len(snap) == 1 and len(store) == 5
+    assert store.snapshot()["a"].tolist() == [1, 2, 3, 4, 5]
+    assert snap[0:1]["b"].tolist() == [0.5]
+
+def test_training_table_joins_metrics_from_each_log_window(collector):
+    import numpy as np
+
+    from shardsense.telemetry.schema import AssignmentLog
+
+    collector.register_shard(ShardMetrics(0, 10.0, 5.0, 0.5))
+    collector.push_worker_metrics(WorkerMetrics(1.0, 1, 0.2, 80.0, 0.0, 0.0, 100.0))
+    collector.push_worker_metrics(WorkerMetrics(2.0, 1, 0.4, 90.0, 0.0, 0.0, 100.0))
+    collector.log_assignment(AssignmentLog(0, 1, 0, 0.0, 1.0, 120.0))
+    collector.log_assignment(AssignmentLog(0, 2, 0, 0.0, 1.0, 150.0))
+    collector.log_assignment(AssignmentLog(0, 1, 7, 0.0, 1.0, 99.0))  # unregistered shard
+
+    rows = collector.get_training_data()
+    assert rows == [
+        {"epoch": 0, "worker_id": 1, "shard_id": 0, "target_batch_time": 120.0,
+         "worker_io": 80.0, "worker_cpu": 0.2, "shard_size": 10.0, "shard_difficulty": 5.0},
+        {"epoch": 0, "worker_id": 2, "shard_id": 0, "target_batch_time": 150.0,
+         "worker_io": 100.0, "worker_cpu": 0.5, "shard_size": 10.0, "shard_difficulty": 5.0},
+    ]
+
+    # Later metrics don't relabel joined rows; new logs use their own window or the newest earlier sample
+    collector.push_worker_metrics(WorkerMetrics(3.0, 1, 0.9, 10.0, 0.0, 0.0, 100.0))
+    collector.log_assignment(AssignmentLog(1, 1, 0, 1.0, 2.0, 130.0))
+    collector.log_assignment(AssignmentLog(1, 1, 0, 2.5, 2.9, 140.0))
+    table = collector.get_training_table()
+    assert len(table) == 4
+    assert table["worker_io"].tolist() == [80.0, 100.0, 85.0, 90.0]
+    np.testing.assert_allclose(table["worker_cpu"], [0.2, 0.5, 0.3, 0.4])
+
+def test_collector_batches_writes_until_flush_or_close():
+    _remove_db()
+    collector = MetricsCollector(db_path=DB_PATH, flush_rows=3, flush_interval_s=3600.0)
+
+    def count():
+        with sqlite3.connect(DB_PATH) as conn:
+            return conn.execute("SELECT COUNT(*) FROM worker_metrics").fetchone()[0]
+
+    try:
+        for t in range(2):
+            collector.push_worker_metrics(WorkerMetrics(float(t), 1, 0.5, 100.0, 0.0, 0.0, 10.0))
+        assert count() == 0
+        collector.push_worker_metrics(WorkerMetrics(2.0, 1, 0.5, 100.0, 0.0, 0.0, 10.0))
+        assert count() == 3
+
+        collector.push_worker_metrics(WorkerMetrics(3.0, 1, 0.5, 100.0, 0.0, 0.0, 10.0))
+        collector.register_shards([ShardMetrics(i, 1.0, 10.0, 1.0) for i in range(100)])
+        collector.close()
+        assert count() == 4
+        with sqlite3.connect(DB_PATH) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM shard_metadata").fetchone()[0] == 100
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        collector.close()
+        _remove_db()
+
+def _metrics(io_values, worker_id=0):
+    return [WorkerMetrics(float(t), worker_id, 0.5, io, 1.0, 0.5, 100.0) for t, io in enumerate(io_values)]
+
+def test_forecaster_rejects_single_outlier():
+    from shardsense.telemetry.forecast import WorkerForecaster
+
+    forecaster = WorkerForecaster()
+    io = [100.0 + (i % 3) for i in range(30)]
+    io[25] = 10.0  # one stalled batch
+    forecaster.observe({0: _metrics(io)})
+
+    assert abs(forecaster.forecast(0)["io_read_mb_s"] - 101.0) < 5.0
+    assert forecaster.regime_changes(0) == 0
+
+def test_forecaster_detects_regime_change_and_trend():
+    from shardsense.telemetry.forecast import WorkerForecaster
+
+    forecaster = WorkerForecaster()
+    history = {0: _metrics([100.0] * 20)}
+    forecaster.observe(history)
+    # Throttled: the step is rejected at first, then adopted as the new level
+    history[0].extend(_metrics([50.0] * 4))
+    forecaster.observe(history)
+    assert forecaster.regime_changes(0) == 1
+    assert abs(forecaster.forecast(0)["io_read_mb_s"] - 50.0) < 2.0
+
+    # A steady decline is extrapolated past the last sample
+    forecaster = WorkerForecaster()
+    forecaster.observe({1: _metrics([100.0 - 0.5 * i for i in range(60)], worker_id=1)})
+    assert forecaster.forecast(1)["io_read_mb_s"] < 100.0 - 0.5 * 59
+    assert forecaster.forecast(1)["cache_hit_rate"] == 0.5
+
+def test_forecaster_keeps_unreported_fields_apart():
+    import math
+
+    from shardsense.telemetry.forecast import WorkerForecaster
+
+    forecaster = WorkerForecaster()
+    for i in range(10):
+        forecaster.update(1, WorkerMetrics(float(i), 1, 0.5, 100.0, 0.0, math.nan, 10.0))
+    forecast = forecaster.forecast(1)
+    assert math.isnan(forecast["cache_hit_rate"])
+    assert forecast["io_read_mb_s"] == pytest.approx(100.0)
+
+    # A field reported for the first time starts at its value
+    forecaster.update(1, WorkerMetrics(10.0, 1, 0.5, 100.0, 0.0, 0.0, 10.0))
+    assert forecaster.forecast(1)["cache_hit_rate"] == 0.0
+
+def test_async_ingest_applies_in_background_and_counts_drops():
+    import threading
+
+    collector = MetricsCollector(async_ingest=True, queue_size=2, backpressure="drop")
+    release = threading.Event()
+    apply = collector._apply
+
+    def slow_apply(item):
+        release.wait(timeout=5.0)
+        apply(item)
+
+    collector._apply = slow_apply
+    try:
+        # The writer holds one record; two more fill the queue; the rest are dropped
+        for t in range(6):
+            collector.push_worker_metrics(WorkerMetrics(float(t), 1, 0.5, 100.0, 0.0, 0.0, 10.0))
+        stats = collector.ingest_stats()
+        assert stats["queued"] + stats["dropped"] == 6
+        assert stats["dropped"] >= 3
+        assert collector.worker_history == {}
+
+        release.set()
+        collector.drain()
+        assert len(collector.worker_history[1]) == stats["queued"]
+        assert collector.ingest_stats()["applied"] == stats["queued"]
+    finally:
+        release.set()
+        collector.close()
+
+def test_async_ingest_survives_bad_record():
+    from shardsense.telemetry.schema import AssignmentLog
+
+    collector = MetricsCollector(async_ingest=True)
+    try:
+        # worker_id=None can't be stored in the int64 column
+        collector.log_assignment(AssignmentLog(0, None, 2, 0.0, 1.0, 5.0))  # type: ignore[arg-type]
+        collector.log_assignment(AssignmentLog(0, 1, 2, 0.0, 1.0, 5.0))
+        collector.drain()
+        stats = collector.ingest_stats()
+        assert stats["errors"] == 1 and stats["applied"] == 1 and stats["backlog"] == 0
+        assert isinstance(collector.last_error, TypeError)
+        assert len(collector.assignments) == 1
+
+        # A writer that died anyway is reported instead of waited on
+        collector._queue.put(_STOP)
+        collector._writer.join(timeout=5.0)
+        collector._queue.put(("worker", WorkerMetrics(0.0, 1, 0.5, 100.0, 0.0, 0.0, 10.0)))
+        with pytest.raises(RuntimeError):
+            collector.drain()
+        with pytest.raises(RuntimeError):
+            collector.push_worker_metrics(WorkerMetrics(0.0, 1, 0.5, 100.0, 0.0, 0.0, 10.0))
+    finally:
+        collector._writer = None
+        collector.close()
+
+def test_async_ingest_block_policy_keeps_everything():
+    _remove_db()
+    collector = MetricsCollector(db_path=DB_PATH, async_ingest=True, queue_size=4, backpressure="block")
+    try:
+        for t in range(100):
+            collector.push_worker_metrics(WorkerMetrics(float(t), t % 2, 0.5, 100.0, 0.0, 0.0, 10.0))
+        collector.close()
+        assert collector.ingest_stats()["dropped"] == 0
+        assert len(collector.worker_history[0]) == 50
+        with sqlite3.connect(DB_PATH) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM worker_metrics").fetchone()[0] == 100
+    finally:
+        collector.close()
+        _remove_db()
+
+def test_worker_history_ring_wraps():
+    from shardsense.telemetry.forecast import WorkerForecaster
+    from shardsense.telemetry.history import WorkerHistory
+
+    history = WorkerHistory(capacity=8)
+    forecaster = WorkerForecaster()
+    reference = WorkerForecaster()
+    samples = _metrics([100.0 + t for t in range(20)])
+    for chunk in (samples[:5], samples[5:17], samples[17:]):
+        for m in chunk:
+            history.append(m)
+        forecaster.observe({0: history})
+    # Samples 5..8 were overwritten before the second observe and are never seen
+    for m in samples[:5] + samples[9:]:
+        reference.update(0, m)
+
+    assert len(history) == 8 and history.total == 20
+    assert history[0].timestamp == 12.0 and history[-1].timestamp == 19.0
+    assert [m.timestamp for m in history[2:4]] == [14.0, 15.0]
+    assert history.last(3)["io_read_mb_s"].tolist() == [117.0, 118.0, 119.0]
+    assert history.between(13.0, 15.0)["timestamp"].tolist() == [13.0, 14.0]
+    assert history.mean("io_read_mb_s", 2) == 118.5
+    assert history.quantile("io_read_mb_s", 1.0) == 119.0
+    assert forecaster.forecast(0) == reference.forecast(0)
+    with pytest.raises(IndexError):
+        history[8]
+
+def test_ddsketch_quantiles_within_relative_accuracy():
+    import numpy as np
+
+    from shardsense.telemetry.sketch import DDSketch
+
+    values = np.random.default_rng(0).lognormal(3.0, 1.0, 20_000)
+    sketch, other = DDSketch(0.01), DDSketch(0.01)
+    for x in values[:15_000].tolist():
+        sketch.add(x)
+    for x in values[15_000:].tolist():
+        other.add(x)
+    sketch.merge(other)
+
+    assert sketch.count == 20_000 and abs(sketch.mean - values.mean()) < 1e-6
+    # Far fewer buckets than values
+    assert len(sketch.bins) < 1000
+    for q in (0.5, 0.95, 0.99):
+        exact = np.quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) / exact < 0.02
+    assert sketch.quantile(0.0) >= values.min() and sketch.quantile(1.0) <= values.max()
+
+def _sampler_child(sampler, path, out):
+    sampler.snapshot()
+    with open(path, "rb") as f:
+        f.read()
+    out.put(sampler.snapshot(refresh=True)["read_bytes"])
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs Linux /proc")
+def test_system_sampler_reads_proc_and_survives_fork(tmp_path):
+    import multiprocessing
+    import time
+
+    from shardsense.telemetry.sampler import SystemSampler
+
+    path = tmp_path / "blob"
+    path.write_bytes(os.urandom(4 << 20))
+    sampler = SystemSampler(interval_s=60.0)
+    sampler.snapshot()
+    deadline = time.process_time() + 0.2
+    while time.process_time() < deadline:
+        pass
+    with open(path, "rb") as f:
+        f.read()
+    stats = sampler.snapshot(refresh=True)
+    assert stats["read_bytes"] >= 4 << 20
+    assert stats["io_read_mb_s"] > 0.0
+    assert 0.0 < stats["cpu_util"] <= 1.0
+
+    # A forked child starts its own sampler and only sees its own reads
+    ctx = multiprocessing.get_context("fork")
+    out = ctx.Queue()
+    child = ctx.Process(target=_sampler_child, args=(sampler, str(path), out))
+    child.start()
+    child_bytes = out.get(timeout=30)
+    child.join()
+    sampler.stop()
+    assert 4 << 20 <= child_bytes < 8 << 20
+
+def test_frame_encoding_round_trips_records():
+    from shardsense.telemetry.schema import AssignmentLog
+    from shardsense.telemetry.transport import _FRAME, KIND_ASSIGNMENT, KIND_WORKER, decode_records, encode_frame
+
+    metrics = [WorkerMetrics(1.5, 3, 0.25, 80.0, 1.0, 0.5, 12.0, batch_count=4, batch_p99_ms=20.0)]
+    logs = [AssignmentLog(2, 3, 7, 1.0, 2.0, 11.0), AssignmentLog(2, 4, 8, 1.0, 2.5, 13.0)]
+    for kind, records in ((KIND_WORKER, metrics), (KIND_ASSIGNMENT, logs)):
+        frame = encode_frame(kind, records)
+        assert decode_records(kind, frame[_FRAME.size:]) == records
+
+def _ring_producer(name, n):
+    from shardsense.telemetry.transport import ShmRing
+
+    ring = ShmRing(name=name)
+    for t in range(n):
+        ring.push_worker_metrics(WorkerMetrics(float(t), 5, 0.5, 100.0, 0.0, 0.0, 10.0))
+    ring.close()
+
+def _socket_producer(address, n):
+    from shardsense.telemetry.schema import AssignmentLog
+    from shardsense.telemetry.transport import SocketSender
+
+    sender = SocketSender(address, batch_records=16)
+    for t in range(n):
+        sender.push_worker_metrics(WorkerMetrics(float(t), 6, 0.5, 100.0, 0.0, 0.0, 10.0))
+        sender.log_assignment(AssignmentLog(0, 6, t % 4, float(t), float(t) + 1.0, 10.0))
+    sender.flush()
+    sender.close()
+
+def test_shared_memory_ring_carries_records_across_processes():
+    import multiprocessing
+    import multiprocessing.resource_tracker
+
+    from shardsense.telemetry.transport import ShmRing, TelemetryAggregator
+
+    collector = MetricsCollector()
+    aggregator = TelemetryAggregator(collector, poll_interval_s=3600.0)
+    name = aggregator.add_ring(slots=256)
+    child = multiprocessing.get_context("fork").Process(target=_ring_producer, args=(name, 200))
+    child.start()
+    child.join()
+    aggregator.poll()
+    assert len(collector.worker_history[5]) == 200
+    assert collector.worker_history[5][-1].timestamp == 199.0
+
+    # A full ring drops instead of blocking the producer
+    register = multiprocessing.resource_tracker.register
+    ring = ShmRing(name=name)
+    # Attaching leaves the process-wide resource tracker alone
+    assert multiprocessing.resource_tracker.register is register
+    for t in range(300):
+        ring.push_worker_metrics(WorkerMetrics(float(t), 5, 0.5, 100.0, 0.0, 0.0, 10.0))
+    assert ring.dropped == 44
+    ring.close()
+    aggregator.close()
+    assert aggregator.received == 456
+
+@pytest.mark.parametrize("transport", ["tcp", "unix"])
+def test_socket_aggregator_receives_batched_frames(tmp_path, transport):
+    import multiprocessing
+    import time
+
+    from shardsense.telemetry.transport import TelemetryAggregator
+
+    collector = MetricsCollector()
+    aggregator = TelemetryAggregator(collector)
+    address = aggregator.serve(("127.0.0.1", 0) if transport == "tcp" else str(tmp_path / "telemetry.sock"))
+    child = multiprocessing.get_context("fork").Process(target=_socket_producer, args=(address, 100))
+    child.start()
+    child.join()
+    deadline = time.monotonic() + 10.0
+    while aggregator.received < 200 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    aggregator.close()
+
+    assert len(collector.worker_history[6]) == 100
+    assert collector.assignments.snapshot()["shard_id"].tolist() == [t % 4 for t in range(100)]
+
+def test_rollups_indexes_and_ttl_compaction(tmp_path):
+    from shardsense.telemetry.schema import AssignmentLog
+
+    path = str(tmp_path / "metrics.db")
+    collector = MetricsCollector(db_path=path, raw_ttl_s=120.0, assignment_ttl_epochs=1, compact_every_s=3600.0)
+    for t in range(600):  # 10 minutes, one record per second alternating between two workers
+        collector.push_worker_metrics(WorkerMetrics(float(t), t % 2, 0.5, 100.0, 0.0, 0.0, 10.0 + t % 2, batch_count=4))
+    for epoch in range(5):
+        for shard in range(6):
+            collector.log_assignment(AssignmentLog(epoch, shard % 2, shard, 0.0, 1.0, 10.0))
+    deleted = collector.compact()
+    collector.close()
+
+    assert deleted["worker_metrics"] == 479 and deleted["assignments"] == 18
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT MIN(timestamp) FROM worker_metrics").fetchone()[0] == 479.0
+        assert conn.execute("SELECT COUNT(DISTINCT epoch) FROM assignments").fetchone()[0] == 2
+        # Rollups still cover the whole run
+        minutes = conn.execute(
+            "SELECT minute, records, batches, batch_time_ms_sum / batches FROM worker_metrics_minute "
+            "WHERE worker_id = 1 ORDER BY minute"
+        ).fetchall()
+        assert minutes == [(m, 30, 120, 11.0) for m in range(10)]
+        assert conn.execute(
+            "SELECT epoch, shards FROM assignment_epochs WHERE worker_id = 0 ORDER BY epoch"
+        ).fetchall() == [(e, 3) for e in range(5)]
+        for query in (
+            "SELECT * FROM worker_metrics ORDER BY timestamp DESC LIMIT 500",
+            "SELECT epoch, worker_id, COUNT(*) FROM assignments GROUP BY epoch, worker_id",
+        ):
+            plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query))
+            assert "USING" in plan and "INDEX" in plan
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_columnar_archive_round_trips_training_data(tmp_path, fmt):
+    pytest.importorskip("pyarrow")
+    import numpy as np
+
+    from shardsense.model.features import FeatureBuilder
+    from shardsense.telemetry.archive import load_archived_table, load_shard_registry, load_training_arrays
+    from shardsense.telemetry.schema import AssignmentLog
+
+    root = str(tmp_path / "archive")
+    collector = MetricsCollector(archive_path=root, archive_format=fmt)
+    collector.register_shards([ShardMetrics(s, 1.0 + s, 5.0, 0.5) for s in range(4)])
+    for epoch in range(3):
+        for w in range(2):
+            collector.push_worker_metrics(WorkerMetrics(float(epoch), w, 0.5, 50.0 * (w + 1), 0.0, 0.0, 10.0))
+            for s in range(4):
+                collector.log_assignment(AssignmentLog(epoch, w, s, float(epoch), epoch + 1.0, 10.0 + s))
+        collector.log_assignment(AssignmentLog(epoch, 0, 9, float(epoch), epoch + 1.0, 1.0))  # unregistered shard
+        assert collector.archive(epoch).result(timeout=5.0)
+    assert collector.archive(3).result() == []  # nothing new
+
+    expected = collector.get_training_table()
+    X, y = load_training_arrays(root)
+    np.testing.assert_array_equal(X, FeatureBuilder().build_features(expected))
+    np.testing.assert_array_equal(y, expected["target_batch_time"])
+
+    second = load_archived_table(root, epochs=[1])
+    assert set(second["epoch"].tolist()) == {1} and len(second) == 9
+    if fmt == "arrow":
+        # Memory-mapped, not copied
+        assert not second["shard_id"].flags.owndata and not second["shard_id"].flags.writeable
+    assert len(load_archived_table(root, "worker_metrics")) == 6
+    assert load_shard_registry(root) == list(collector.shard_registry.values())
+
+    # A failed write is counted on the archive thread, not raised to the caller
+    collector._archiver.root = os.path.join(root, "shards.parquet" if fmt == "parquet" else "shards.arrow")
+    collector.push_worker_metrics(WorkerMetrics(4.0, 0, 0.5, 50.0, 0.0, 0.0, 10.0))
+    assert collector.archive(4).result(timeout=5.0) == []
+    assert collector.ingest_stats()["archive_errors"] == 1
+    assert isinstance(collector.last_archive_error, OSError)
+    collector.close()
+
+def test_load_state_dict_defaults_fields_missing_from_older_checkpoints():
+    import math
+
+    source = MetricsCollector()
+    source.push_worker_metrics(WorkerMetrics(
+        1.0, 1, 0.5, 100.0, 0.0, 0.0, 20.0, batch_count=8, batch_p99_ms=40.0, bytes_per_batch=4096.0
+    ))
+    state = source.state_dict()
+    # Checkpoints written before the window summary and read volume fields were added
+    for name in ("batch_count", "batch_p50_ms", "batch_p95_ms", "batch_p99_ms", "bytes_per_batch"):
+        del state["workers"][0][name]
+
+    restored = MetricsCollector()
+    restored.load_state_dict(state)
+    m = restored.worker_history[1][-1]
+    assert m.batch_count == 1
+    assert m.batch_p50_ms == m.batch_p99_ms == 20.0
+    assert not math.isnan(m.batch_p95_ms)
+    assert m.bytes_per_batch == 0.0
+
+def test_state_dict_while_new_workers_report():
+    import sys
+    import threading
+
+    collector = MetricsCollector()
+    stop = threading.Event()
+    # Switch threads as often as possible so a push lands mid-iteration
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def report():
+        wid = 0
+        while not stop.is_set():
+            # Cycle through a fixed set of ids so the snapshot cost stays bounded
+            wid = (wid % 64) + 1
+            collector.push_worker_metrics(WorkerMetrics(0.0, wid, 0.5, 100.0, 0.0, 0.0, 10.0))
+            collector.register_shard(ShardMetrics(wid, 1.0, 5.0, 0.5))
+
+    thread = threading.Thread(target=report)
+    thread.start()
+    try:
+        for _ in range(200):
+            state = collector.state_dict()
+            assert len({len(col) for col in state["shards"].values()}) == 1
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+
+def test_training_table_after_unregistered_shard_reuses_filtered_rows():
+    import numpy as np
+
+    from shardsense.telemetry.schema import AssignmentLog
+
+    collector = MetricsCollector()
+    collector.register_shard(ShardMetrics(0, 10.0, 5.0, 0.5))
+    collector.log_assignment(AssignmentLog(0, 1, 0, 0.0, 1.0, 120.0))
+    collector.log_assignment(AssignmentLog(0, 1, 7, 0.0, 1.0, 99.0))  # unregistered shard
+    first = collector.get_training_table()
+    collector.log_assignment(AssignmentLog(1, 1, 0, 1.0, 2.0, 130.0))
+    second = collector.get_training_table()
+
+    assert first["target_batch_time"].tolist() == [120.0]
+    assert second["target_batch_time"].tolist() == [120.0, 130.0]
+    # Served from the filtered store, not re-masked from the full history
+    assert np.shares_memory(first["target_batch_time"], second["target_batch_time"])
+
+    restored = MetricsCollector()
+    restored.load_state_dict(collector.state_dict())
+    assert restored.get_training_table()["target_batch_time"].tolist() == [120.0, 130.0]
+
+def test_archive_skips_log_appended_after_the_join(tmp_path):
+    pytest.importorskip("pyarrow")
+    from shardsense.telemetry.archive import load_archived_table
+    from shardsense.telemetry.collector import _UNJOINED
+    from shardsense.telemetry.schema import AssignmentLog
+
+    root = str(tmp_path / "archive")
+    collector = MetricsCollector(archive_path=root)
+    collector.register_shard(ShardMetrics(0, 1.0, 5.0, 0.5))
+    collector.push_worker_metrics(WorkerMetrics(0.0, 0, 0.5, 50.0, 0.0, 0.0, 10.0))
+    collector.log_assignment(AssignmentLog(0, 0, 0, 0.0, 1.0, 10.0))
+
+    join_new = collector._join_new
+
+    def join_then_append():
+        join_new()
+        # A loader's log landing right after the join, before anything is snapshotted
+        collector.assignments.append(
+            epoch=0, worker_id=0, shard_id=0, start_time=0.0, end_time=1.0, target_batch_time=11.0, **_UNJOINED
+        )
+        collector._join_new = join_new
+
+    collector._join_new = join_then_append
+    collector.archive(0).result(timeout=5.0)
+    assert load_archived_table(root)["target_batch_time"].tolist() == [10.0]
+
+    # The next call archives the late log, joined
+    collector.archive(1).result(timeout=5.0)
+    archived = load_archived_table(root)
+    assert archived["target_batch_time"].tolist() == [10.0, 11.0]
+    assert archived["worker_io"].tolist() == [50.0, 50.0]
+    collector.close()